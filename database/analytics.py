@@ -0,0 +1,224 @@
+from dataclasses import asdict, dataclass
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from database import crud
+from database.models import InformacionGeneralPaciente
+
+VITAL_FIELDS = ("imc", "temp", "satur", "frecuenciac", "frecuenciar")
+""" Signos vitales numéricos que se resumen por cohorte """
+
+NORMAL_RANGES: dict[str, tuple[float, float]] = {
+    "imc": (18.5, 24.9),
+    "temp": (36.0, 37.5),
+    "satur": (95.0, 100.0),
+    "frecuenciac": (60.0, 100.0),
+    "frecuenciar": (12.0, 20.0),
+}
+""" Rango normal (mínimo, máximo) de cada signo vital, en adultos """
+
+GENDERS = ("Masculino", "Femenino", "Sin dato")
+""" Valores de `genero` en el orden de sus códigos (el último agrupa el resto) """
+
+AGE_BANDS = (0, 18, 30, 45, 60, 75)
+""" Límite inferior de cada banda de edad; la última no tiene límite superior """
+
+PERCENTILES = (25, 50, 75, 95)
+
+CHUNK_SIZE = 50_000
+""" Filas leídas de SQLite por cada bloque """
+
+
+@dataclass
+class CohortStat:
+    """
+    Estadísticas de un signo vital para una cohorte (género y banda de edad).
+    """
+
+    genero: str
+    banda: str
+    campo: str
+    pacientes: int
+    """ Pacientes de la cohorte """
+    validos: int
+    """ Pacientes de la cohorte con el signo vital registrado """
+    media: Optional[float]
+    p25: Optional[float]
+    p50: Optional[float]
+    p75: Optional[float]
+    p95: Optional[float]
+    fuera_de_rango: Optional[float]
+    """ Proporción (0 a 1) de valores fuera de NORMAL_RANGES """
+
+
+def band_labels() -> list[str]:
+    labels = [f"{low}-{high - 1}" for low, high in zip(AGE_BANDS, AGE_BANDS[1:])]
+    labels.append(f"{AGE_BANDS[-1]}+")
+    labels.append("Sin edad")
+    return labels
+
+
+def _numeric(column: str) -> str:
+    # Texto u otros tipos escritos a mano se tratan como dato faltante (NaN)
+    return f"""CASE WHEN typeof("{column}") IN ('integer', 'real') THEN "{column}" END"""
+
+
+def _select_query() -> str:
+    genders = " ".join(f"WHEN '{name}' THEN {code}" for code, name in enumerate(GENDERS[:-1]))
+    columns = [
+        f'CASE "genero" {genders} ELSE {len(GENDERS) - 1} END',
+        _numeric("fecha_nacimiento"),
+        _numeric("edad"),
+        *(_numeric(name) for name in VITAL_FIELDS),
+    ]
+    return f'SELECT {", ".join(columns)} FROM "{InformacionGeneralPaciente.__name__}";'
+
+
+def load_columns(
+    database: Optional[str] = None, chunk_size: int = CHUNK_SIZE, today: Optional[date] = None
+) -> dict[str, np.ndarray]:
+    """
+    Lee las columnas necesarias para el análisis directamente a arreglos NumPy, por bloques,
+    sin construir un dataclass por fila.
+
+    Returns:
+        dict[str, np.ndarray]: "genero" (código en GENDERS), "edad" (años, NaN si falta)
+        y un arreglo float64 por cada campo de VITAL_FIELDS (NaN si falta).
+    """
+    conn = crud.connect(database)
+    try:
+        cursor = conn.execute(_select_query())
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            # None se convierte en NaN al crear el arreglo float64
+            chunks.append(np.array(rows, dtype=np.float64))
+    finally:
+        conn.close()
+    width = 3 + len(VITAL_FIELDS)
+    data = np.concatenate(chunks) if chunks else np.empty((0, width))
+
+    today = today or date.today()
+    today_number = today.year * 10000 + today.month * 100 + today.day
+    birth = data[:, 1]
+    # Las fechas se guardan como YYYYMMDD: la diferencia dividida entre 10000 da los años cumplidos
+    age = np.where(np.isnan(birth), data[:, 2], np.floor((today_number - birth) / 10000))
+    columns = {"genero": data[:, 0].astype(np.int64), "edad": age}
+    for i, name in enumerate(VITAL_FIELDS):
+        columns[name] = np.ascontiguousarray(data[:, 3 + i])
+    return columns
+
+
+def cohort_keys(gender: np.ndarray, age: np.ndarray) -> tuple[np.ndarray, int]:
+    """Código de cohorte de cada paciente (género × banda de edad) y cantidad de cohortes."""
+    bands = len(AGE_BANDS) + 1
+    band = np.searchsorted(np.asarray(AGE_BANDS[1:]), age, side="right")
+    band = np.where(np.isnan(age) | (age < 0), bands - 1, band)
+    return gender * bands + band, len(GENDERS) * bands
+
+
+def _stats(
+    values: np.ndarray,
+    keys: np.ndarray,
+    order: np.ndarray,
+    patients: np.ndarray,
+    limits: tuple[float, float],
+):
+    count = len(patients)
+    valid = ~np.isnan(values)
+    clean = np.where(valid, values, 0.0)
+    totals = np.bincount(keys, weights=clean, minlength=count)
+    valids = np.bincount(keys, weights=valid, minlength=count)
+    outside = valid & ((clean < limits[0]) | (clean > limits[1]))
+    outsides = np.bincount(keys, weights=outside, minlength=count)
+
+    # Percentiles: con los pacientes agrupados por cohorte (order), cada cohorte es un segmento contiguo
+    grouped = values[order]
+    ends = np.cumsum(patients)
+    percentiles = np.full((count, len(PERCENTILES)), np.nan)
+    for key in np.flatnonzero(valids):
+        segment = grouped[ends[key] - patients[key] : ends[key]]
+        percentiles[key] = np.percentile(segment[~np.isnan(segment)], PERCENTILES)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return valids, totals / valids, percentiles, outsides / valids
+
+
+def _optional(value) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def cohort_stats(
+    database: Optional[str] = None, columns: Optional[dict[str, np.ndarray]] = None
+) -> list[CohortStat]:
+    """
+    Media, percentiles y proporción fuera de rango de cada signo vital por género y banda de edad.
+
+    Explicación:
+    -----------------------------------------
+    - Las columnas se leen una sola vez como arreglos (ver load_columns).
+    - Cada paciente recibe un código de cohorte y los agregados se calculan para todas
+      las cohortes a la vez con np.bincount, sin recorrer los pacientes en Python.
+    - Solo se devuelven las cohortes que tienen pacientes.
+    - Con un servidor compartido (crud.use_backend) el cálculo se hace en el servidor.
+    """
+    if columns is None and database is None and crud._backend is not None:
+        return crud._backend.cohort_stats()
+    if columns is None:
+        columns = load_columns(database)
+    keys, count = cohort_keys(columns["genero"], columns["edad"])
+    patients = np.bincount(keys, minlength=count)
+    order = np.argsort(keys, kind="stable")
+    labels = band_labels()
+    bands = len(labels)
+
+    result: list[CohortStat] = []
+    per_field = {
+        name: _stats(columns[name], keys, order, patients, NORMAL_RANGES[name])
+        for name in VITAL_FIELDS
+    }
+    for key in np.flatnonzero(patients):
+        for name in VITAL_FIELDS:
+            valids, means, percentiles, outsides = per_field[name]
+            result.append(
+                CohortStat(
+                    GENDERS[key // bands],
+                    labels[key % bands],
+                    name,
+                    int(patients[key]),
+                    int(valids[key]),
+                    _optional(means[key]),
+                    *(_optional(v) for v in percentiles[key]),
+                    _optional(outsides[key]),
+                )
+            )
+    return result
+
+
+def to_rows(stats: list[CohortStat]) -> list[dict]:
+    return [asdict(stat) for stat in stats]
+
+
+def from_rows(rows: list[dict]) -> list[CohortStat]:
+    return [CohortStat(**row) for row in rows]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Estadísticas de signos vitales por cohorte.")
+    parser.add_argument("--database", default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = cohort_stats(args.database)
+    for stat in stats:
+        print(
+            f"{stat.genero:10} {stat.banda:9} {stat.campo:12} n={stat.validos:<8} "
+            f"media={stat.media} p50={stat.p50} p95={stat.p95} fuera={stat.fuera_de_rango}"
+        )
+    print(f"{len(stats)} filas en {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,266 @@
+from datetime import date, timedelta
+import glob
+import os
+import re
+import sqlite3
+from typing import Any, Callable, Optional
+
+from database import crud
+from database.models import MedicalConsultation
+
+ARCHIVE_DIRECTORY = "archive"
+""" Carpeta de los archivos históricos por año """
+
+ARCHIVE_AFTER_DAYS = 3 * 365
+""" Antigüedad por defecto a partir de la cual un registro se archiva """
+
+ARCHIVABLE: dict[type, str] = {
+    MedicalConsultation: "fecha_consulta",
+}
+""" Modelos que pueden archivarse y el campo de fecha que determina su antigüedad """
+
+
+def is_archivable(dataclass_type: type) -> bool:
+    return dataclass_type in ARCHIVABLE
+
+
+def archive_path(dataclass_type: type, year: int, directory: str = ARCHIVE_DIRECTORY) -> str:
+    return os.path.join(directory, f"{dataclass_type.__name__}_{year}.sqlite")
+
+
+def archive_files(dataclass_type: type, directory: str = ARCHIVE_DIRECTORY) -> list[str]:
+    """Archivos históricos existentes del modelo, ordenados por año."""
+    pattern = re.compile(re.escape(dataclass_type.__name__) + r"_(\d{4})\.sqlite$")
+    files = [
+        path
+        for path in glob.glob(os.path.join(directory, f"{dataclass_type.__name__}_*.sqlite"))
+        if pattern.search(path)
+    ]
+    return sorted(files)
+
+
+def _columns(dataclass_type: type) -> str:
+    # Lista explícita: la tabla activa puede tener columnas auxiliares que el archivo no tiene
+    return crud.select_columns(dataclass_type)
+
+
+def archive_older_than(
+    dataclass_type: type = MedicalConsultation,
+    days: int = ARCHIVE_AFTER_DAYS,
+    directory: str = ARCHIVE_DIRECTORY,
+    database: Optional[str] = None,
+) -> dict[int, int]:
+    """
+    Mueve los registros más antiguos que `days` días a un archivo SQLite por año.
+
+    Explicación:
+    -----------------------------------------
+    - El año de cada registro se toma del campo de fecha registrado en ARCHIVABLE.
+    - Cada año se procesa en una sola transacción sobre la base activa y el archivo
+      adjunto (ATTACH): la copia (INSERT ... SELECT) y el borrado se confirman juntos.
+    - Los registros sin fecha permanecen en la base activa.
+
+    Returns:
+        dict[int, int]: Cantidad de registros movidos por año.
+    """
+    if not is_archivable(dataclass_type):
+        raise ValueError(f"{dataclass_type.__name__} no tiene un campo de fecha para archivar.")
+    date_field = ARCHIVABLE[dataclass_type]
+    table_name = dataclass_type.__name__
+    columns = _columns(dataclass_type)
+    cutoff = int((date.today() - timedelta(days=days)).strftime("%Y%m%d"))
+    os.makedirs(directory, exist_ok=True)
+
+    conn = crud.connect(database)
+    conn.isolation_level = None
+    moved: dict[int, int] = {}
+    try:
+        conn.execute(
+            f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{date_field}" ON "{table_name}" ("{date_field}");'
+        )
+        years = [
+            int(row[0])
+            for row in conn.execute(
+                f'SELECT DISTINCT "{date_field}" / 10000 FROM "{table_name}" WHERE "{date_field}" < ? ORDER BY 1;',
+                (cutoff,),
+            )
+        ]
+        for year in years:
+            conn.execute("ATTACH DATABASE ? AS archive_year;", (archive_path(dataclass_type, year, directory),))
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                try:
+                    conn.execute(crud.create_table_sql(dataclass_type, "archive_year"))
+                    crud.migrate_table(conn, dataclass_type, "archive_year")
+                    bounds = (year * 10000, min(cutoff, (year + 1) * 10000))
+                    where = f'"{date_field}" >= ? AND "{date_field}" < ?'
+                    moved[year] = conn.execute(
+                        f'INSERT INTO archive_year."{table_name}" ({columns}) '
+                        f'SELECT {columns} FROM main."{table_name}" WHERE {where};',
+                        bounds,
+                    ).rowcount
+                    conn.execute(f'DELETE FROM main."{table_name}" WHERE {where};', bounds)
+                    conn.execute("COMMIT;")
+                except Exception:
+                    conn.execute("ROLLBACK;")
+                    raise
+            finally:
+                conn.execute("DETACH DATABASE archive_year;")
+    finally:
+        conn.close()
+    return moved
+
+
+VIEW_ORDER = ("__archivo", "__fila")
+""" Columnas extra de la vista de `_select`: número de archivo (0 = base activa) y rowid """
+
+
+def _sources(table_name: str, columns: str, chunk: list[str], first: int) -> list[str]:
+    """SELECT de cada archivo adjunto (archive_0, archive_1...) con las columnas de VIEW_ORDER."""
+    return [
+        f'SELECT {columns}, {first + i} AS "{VIEW_ORDER[0]}", rowid AS "{VIEW_ORDER[1]}" '
+        f'FROM archive_{i}."{table_name}"'
+        for i in range(len(chunk))
+    ]
+
+
+def _select(
+    dataclass_type: type,
+    sql_for: Callable[[str, Optional[int], Optional[int]], tuple[str, list]],
+    emit: Callable[[tuple], None],
+    limit_start: Optional[int],
+    limit_end: Optional[int],
+    directory: str,
+    database: Optional[str],
+) -> None:
+    """
+    Ejecuta la consulta de `sql_for(vista, inicio, cantidad)` sobre la base activa y los
+    archivos históricos del modelo unidos en una vista temporal, y llama a `emit` con
+    cada fila.
+
+    Los archivos se adjuntan (ATTACH) y se unen con UNION ALL; el filtro se evalúa
+    dentro de cada archivo y la paginación sobre el resultado combinado. La vista solo
+    tiene las columnas de los campos (no las normalizadas) y las de VIEW_ORDER, que
+    `database.query` usa como desempate para que las páginas no se solapen.
+    """
+    table_name = dataclass_type.__name__
+    columns = _columns(dataclass_type)
+    files = archive_files(dataclass_type, directory)
+    view = f"{table_name}__archivo"
+    main = f'SELECT {columns}, 0 AS "{VIEW_ORDER[0]}", rowid AS "{VIEW_ORDER[1]}" FROM main."{table_name}"'
+    conn = crud.connect(database)
+    # Sin transacción implícita: DETACH falla mientras haya una abierta (tras el INSERT)
+    conn.isolation_level = None
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    try:
+        if len(files) <= limit:
+            for i, path in enumerate(files):
+                conn.execute(f"ATTACH DATABASE ? AS archive_{i};", (path,))
+            sources = [main, *_sources(table_name, columns, files, 1)]
+            conn.execute(f'CREATE TEMP VIEW "{view}" AS {" UNION ALL ".join(sources)};')
+            try:
+                for row in conn.execute(*sql_for(view, limit_start, limit_end)):
+                    emit(row)
+            finally:
+                conn.execute(f'DROP VIEW temp."{view}";')
+                for i in range(len(files)):
+                    conn.execute(f"DETACH DATABASE archive_{i};")
+            return
+        # Más archivos que el límite de ATTACH: se copian por partes a una tabla temporal
+        # y la consulta (filtro, orden y paginación) se ejecuta una sola vez sobre todos
+        conn.execute(f'CREATE TEMP TABLE "{view}" AS {main};')
+        try:
+            for start in range(0, len(files), limit):
+                chunk = files[start : start + limit]
+                for i, path in enumerate(chunk):
+                    conn.execute(f"ATTACH DATABASE ? AS archive_{i};", (path,))
+                try:
+                    sources = _sources(table_name, columns, chunk, start + 1)
+                    conn.execute(f'INSERT INTO temp."{view}" {" UNION ALL ".join(sources)};')
+                finally:
+                    for i in range(len(chunk)):
+                        conn.execute(f"DETACH DATABASE archive_{i};")
+            for row in conn.execute(*sql_for(view, limit_start, limit_end)):
+                emit(row)
+        finally:
+            conn.execute(f'DROP TABLE temp."{view}";')
+    finally:
+        conn.close()
+
+
+def search(
+    instance: Any,
+    callback: Callable[[Any], None],
+    comparator: str = "=",
+    ignore_primary_int: bool = False,
+    limit_start: Optional[int] = None,
+    limit_end: Optional[int] = None,
+    directory: str = ARCHIVE_DIRECTORY,
+    database: Optional[str] = None,
+    modes: Optional[dict[str, str]] = None,
+) -> None:
+    """
+    Igual que `crud.search`, pero busca en la base activa y en todos los archivos
+    históricos del modelo como si fueran una sola tabla (ver `_select`).
+    """
+    dataclass_type = type(instance)
+
+    def sql_for(view, start, end):
+        return crud.to_select_query(
+            instance,
+            table_name=view,
+            ignore_primary_int=ignore_primary_int,
+            comparator=comparator,
+            limit_start=start,
+            limit_end=end,
+            normalized=False,
+            modes=modes,
+        )
+
+    _select(
+        dataclass_type,
+        sql_for,
+        lambda row: callback(crud.from_row(dataclass_type, row)),
+        limit_start,
+        limit_end,
+        directory,
+        database,
+    )
+
+
+def execute(
+    query,
+    callback: Callable[[Any], None],
+    directory: str = ARCHIVE_DIRECTORY,
+    database: Optional[str] = None,
+) -> None:
+    """Igual que `database.query.execute`, sobre la base activa y los archivos históricos."""
+    from database.query import _emit  # Import local para evitar import circular
+
+    _select(
+        query.model,
+        lambda view, start, end: query.page(start, end).to_sql(view, view=True),
+        _emit(query, callback),
+        query.offset,
+        query.limit,
+        directory,
+        database,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import models
+
+    parser = argparse.ArgumentParser(description="Archiva registros antiguos en archivos por año.")
+    parser.add_argument("--model", default="MedicalConsultation")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--directory", default=ARCHIVE_DIRECTORY)
+    parser.add_argument("--database", default=None)
+    args = parser.parse_args()
+
+    for year, count in archive_older_than(
+        getattr(models, args.model), args.days, args.directory, args.database
+    ).items():
+        print(f"{year}: {count} registros archivados")
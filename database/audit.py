@@ -0,0 +1,228 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, fields
+from datetime import datetime
+import getpass
+import sqlite3
+import threading
+from typing import Any, Optional
+
+from database import crud
+from internal import (
+    InputWidgetType,
+    SQLITE_FLAGS,
+    SQLiteFieldConstraint,
+    flags,
+)
+
+
+@dataclass
+class AuditEntry:
+    """
+    Modelo del registro de auditoría: un cambio de un campo de un registro.
+    La tabla es de solo inserción (los triggers impiden UPDATE y DELETE).
+    """
+
+    seq: int = flags(
+        default=0,
+        sqlite=SQLiteFieldConstraint.PRIMARY_KEY | SQLiteFieldConstraint.AUTOINCREMENT,
+        tcontrol=InputWidgetType.NONE,
+        title="Secuencia",
+        showintable=False,
+    )
+    fecha: Optional[str] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NOT_NULL,
+        tcontrol=InputWidgetType.INPUT_TEXT,
+        title="Fecha",
+        readonly=True,
+    )
+    usuario: Optional[str] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NONE,
+        tcontrol=InputWidgetType.INPUT_TEXT,
+        title="Usuario",
+        readonly=True,
+    )
+    tabla: Optional[str] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NOT_NULL,
+        tcontrol=InputWidgetType.INPUT_TEXT,
+        title="Tabla",
+        readonly=True,
+        showintable=False,
+    )
+    registro: Optional[int] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NONE,
+        tcontrol=InputWidgetType.INPUT_INT,
+        title="Registro",
+        readonly=True,
+        showintable=False,
+    )
+    accion: Optional[str] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NOT_NULL,
+        tcontrol=InputWidgetType.INPUT_TEXT,
+        title="Acción",
+        readonly=True,
+    )
+    campo: Optional[str] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NOT_NULL,
+        tcontrol=InputWidgetType.INPUT_TEXT,
+        title="Campo",
+        readonly=True,
+    )
+    anterior: Optional[str] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NONE,
+        tcontrol=InputWidgetType.INPUT_TEXT_RICH,
+        title="Valor Anterior",
+        readonly=True,
+        compress=True,
+    )
+    nuevo: Optional[str] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NONE,
+        tcontrol=InputWidgetType.INPUT_TEXT_RICH,
+        title="Valor Nuevo",
+        readonly=True,
+        compress=True,
+    )
+
+
+MAX_PENDING = 5000
+""" Cambios acumulados por conexión a partir de los cuales se escriben sin esperar al COMMIT """
+
+_default_user = getpass.getuser()
+_user: ContextVar[Optional[str]] = ContextVar("audit_user", default=None)
+_pending: dict[int, list[list]] = {}
+_lock = threading.Lock()
+_insert_query = crud.to_insert_query(AuditEntry())[0]
+
+
+def current_user() -> str:
+    return _user.get() or _default_user
+
+
+def set_user(name: str) -> None:
+    """Define el usuario que se registra por defecto en este proceso."""
+    global _default_user
+    _default_user = name
+
+
+@contextmanager
+def acting_as(name: Optional[str]):
+    """Registra los cambios hechos dentro del bloque a nombre de `name` (usado por el servidor)."""
+    token = _user.set(name)
+    try:
+        yield
+    finally:
+        _user.reset(token)
+
+
+def _text(value) -> Optional[str]:
+    value = crud.to_sqlite_param(value)
+    return None if value is None else str(value)
+
+
+def _record_id(instance) -> Optional[int]:
+    for f in fields(instance):
+        if SQLiteFieldConstraint.PRIMARY_KEY in f.metadata[SQLITE_FLAGS]:
+            value = getattr(instance, f.name)
+            return value if isinstance(value, int) else None
+    return None
+
+
+def diff(action: str, old: Any, new: Any) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """
+    Calcula los cambios por campo como (campo, anterior, nuevo).
+    Se omiten los separadores (IGNORE) y la columna AUTOINCREMENT, que se guarda como `registro`.
+    """
+    instance = new if new is not None else old
+    changes = []
+    for f in fields(instance):
+        constraint = f.metadata[SQLITE_FLAGS]
+        if SQLiteFieldConstraint.IGNORE in constraint or SQLiteFieldConstraint.AUTOINCREMENT in constraint:
+            continue
+        before = _text(getattr(old, f.name)) if old is not None else None
+        after = _text(getattr(new, f.name)) if new is not None else None
+        if before != after:
+            changes.append((f.name, before, after))
+    return changes
+
+
+def on_write(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    """Hook de crud: acumula en memoria los cambios de la operación."""
+    instance = new if new is not None else old
+    if isinstance(instance, AuditEntry):
+        return
+    stamp = datetime.now().isoformat(sep=" ", timespec="seconds")
+    user = current_user()
+    table = type(instance).__name__
+    record = _record_id(instance)
+    rows = [
+        crud.to_insert_query(AuditEntry(0, stamp, user, table, record, action, name, before, after))[1]
+        for name, before, after in diff(action, old, new)
+    ]
+    with _lock:
+        pending = _pending.setdefault(id(conn), [])
+        pending.extend(rows)
+        full = len(pending) >= MAX_PENDING
+    if full:
+        flush(conn)
+
+
+def flush(conn: sqlite3.Connection) -> None:
+    """Hook de crud: escribe en lote los cambios acumulados, dentro de la transacción actual."""
+    with _lock:
+        rows = _pending.pop(id(conn), None)
+    if rows:
+        conn.executemany(_insert_query, rows)
+
+
+def discard(conn: sqlite3.Connection) -> None:
+    """Hook de crud: olvida los cambios acumulados de una transacción revertida."""
+    with _lock:
+        _pending.pop(id(conn), None)
+
+
+def create_journal(conn: sqlite3.Connection) -> None:
+    """Crea la tabla del registro de auditoría, su índice por registro y los triggers de solo inserción."""
+    conn.execute(crud.create_table_sql(AuditEntry))
+    conn.execute(
+        'CREATE INDEX IF NOT EXISTS "ix_AuditEntry_registro" ON "AuditEntry" ("tabla", "registro", "seq");'
+    )
+    for action in ("UPDATE", "DELETE"):
+        conn.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "AuditEntry_no_{action.lower()}" BEFORE {action} ON "AuditEntry" '
+            "BEGIN SELECT RAISE(ABORT, 'El registro de auditoría es de solo inserción.'); END;"
+        )
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Crea el registro de auditoría (si no existe) y empieza a registrar los cambios hechos con crud."""
+    conn = crud.connect(database)
+    try:
+        with conn:
+            create_journal(conn)
+    finally:
+        conn.close()
+    crud.register_write_hook(on_write, flush, discard)
+
+
+def disable() -> None:
+    crud.unregister_write_hook(on_write, flush, discard)
+
+
+def history(dataclass_type: type, record_id: int) -> list[AuditEntry]:
+    """Historial de cambios de un registro, del más antiguo al más reciente (usa el índice por registro)."""
+    entries: list[AuditEntry] = []
+    crud.search(
+        AuditEntry(seq=0, tabla=dataclass_type.__name__, registro=record_id),
+        entries.append,
+        ignore_primary_int=True,
+    )
+    entries.sort(key=lambda entry: entry.seq)
+    return entries
@@ -0,0 +1,201 @@
+from datetime import datetime
+import glob
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from database import crud
+
+BACKUP_DIRECTORY = "backups"
+""" Carpeta por defecto donde se guardan los respaldos """
+
+BACKUP_PAGES = 64
+""" Páginas copiadas por cada paso del respaldo """
+
+BACKUP_PAUSE = 0.02
+""" Segundos de espera entre pasos para no bloquear las consultas de la interfaz """
+
+
+def snapshot_name(directory: str, when: Optional[datetime] = None) -> str:
+    """Genera la ruta del respaldo: `<directory>/database-AAAAMMDD-HHMMSS.sqlite`."""
+    when = when or datetime.now()
+    return os.path.join(directory, f"database-{when.strftime('%Y%m%d-%H%M%S')}.sqlite")
+
+
+def list_snapshots(directory: str = BACKUP_DIRECTORY) -> list[str]:
+    """Devuelve los respaldos existentes, del más antiguo al más reciente."""
+    return sorted(glob.glob(os.path.join(directory, "database-*.sqlite")))
+
+
+def verify(path: str) -> bool:
+    """Ejecuta `PRAGMA integrity_check` sobre un respaldo y devuelve True si es íntegro."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("PRAGMA integrity_check;").fetchall()
+        return rows == [("ok",)]
+    finally:
+        conn.close()
+
+
+def backup(
+    target: str,
+    pages: int = BACKUP_PAGES,
+    pause: float = BACKUP_PAUSE,
+    database: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> str:
+    """
+    Copia la base de datos en caliente usando la API de respaldo de SQLite.
+
+    Explicación:
+    -----------------------------------------
+    La copia se hace en pasos de `pages` páginas. Entre un paso y otro se espera `pause`
+    segundos sin mantener ningún bloqueo, de modo que la interfaz puede seguir leyendo
+    y escribiendo mientras se realiza el respaldo. Si otra conexión escribe durante la
+    copia, SQLite reinicia los pasos restantes automáticamente.
+
+    El respaldo se escribe primero en un archivo temporal, se verifica con
+    `PRAGMA integrity_check` y solo entonces se renombra al nombre definitivo.
+
+    Args:
+        target: Ruta del archivo de respaldo.
+        pages: Páginas por paso; valores pequeños reducen las pausas visibles en la interfaz.
+        pause: Segundos de espera entre pasos.
+        database: Base de datos de origen, por defecto `crud.DATABASE`.
+        progress: Función opcional que recibe (páginas restantes, páginas totales).
+
+    Raises:
+        sqlite3.DatabaseError: Si el respaldo no supera la verificación de integridad.
+
+    Returns:
+        str: La ruta del respaldo creado.
+    """
+    if pages <= 0:
+        raise ValueError("pages debe ser mayor que cero.")
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = target + ".part"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    def step(status, remaining, total):
+        if progress:
+            progress(remaining, total)
+        if remaining and pause > 0:
+            time.sleep(pause)
+
+    source = crud.connect(database)
+    destination = sqlite3.connect(tmp)
+    try:
+        source.backup(destination, pages=pages, progress=step)
+    finally:
+        destination.close()
+        source.close()
+
+    if not verify(tmp):
+        os.remove(tmp)
+        raise sqlite3.DatabaseError(f"El respaldo {target} no superó la verificación de integridad.")
+    os.replace(tmp, target)
+    return target
+
+
+def rotate(directory: str = BACKUP_DIRECTORY, keep: int = 7) -> list[str]:
+    """Elimina los respaldos más antiguos dejando solo los `keep` más recientes."""
+    snapshots = list_snapshots(directory)
+    removed = snapshots[: max(len(snapshots) - keep, 0)]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+class BackupScheduler:
+    """
+    Crea respaldos periódicos en un hilo en segundo plano y mantiene una rotación
+    de los más recientes.
+    """
+
+    def __init__(
+        self,
+        directory: str = BACKUP_DIRECTORY,
+        interval: float = 3600,
+        keep: int = 7,
+        pages: int = BACKUP_PAGES,
+        pause: float = BACKUP_PAUSE,
+        database: Optional[str] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ):
+        """
+        Args:
+            directory: Carpeta de los respaldos.
+            interval: Segundos entre respaldos.
+            keep: Cantidad de respaldos que se conservan.
+            pages: Páginas por paso (ver `backup`).
+            pause: Segundos de espera entre pasos (ver `backup`).
+            database: Base de datos de origen, por defecto `crud.DATABASE`.
+            on_error: Función que recibe la excepción si un respaldo falla.
+        """
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.pages = pages
+        self.pause = pause
+        self.database = database
+        self.last_snapshot: Optional[str] = None
+        self._on_error = on_error
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> str:
+        """Crea un respaldo inmediatamente y aplica la rotación."""
+        path = backup(
+            snapshot_name(self.directory),
+            pages=self.pages,
+            pause=self.pause,
+            database=self.database,
+        )
+        rotate(self.directory, self.keep)
+        self.last_snapshot = path
+        return path
+
+    def __loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                if self._on_error:
+                    self._on_error(e)
+                else:
+                    print(f"backup: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.__loop, name="backup", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Crea un respaldo en caliente de la base de datos.")
+    parser.add_argument("--directory", default=BACKUP_DIRECTORY)
+    parser.add_argument("--keep", type=int, default=7)
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES)
+    parser.add_argument("--pause", type=float, default=BACKUP_PAUSE)
+    parser.add_argument("--database", default=None)
+    args = parser.parse_args()
+
+    scheduler = BackupScheduler(
+        args.directory, keep=args.keep, pages=args.pages, pause=args.pause, database=args.database
+    )
+    print(scheduler.run_once())
@@ -0,0 +1,226 @@
+import socket
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+from database import audit, crud
+from database.protocol import DEFAULT_HOST, DEFAULT_PORT, recv_message, send_message
+
+
+class CrudClient:
+    """
+    Backend de `database.crud` que envía las operaciones a un CrudServer.
+
+    Se activa con `crud.use_backend(CrudClient(host, port))`; a partir de ahí
+    `crud.insert`, `crud.update`, `crud.delete` y `crud.search` usan el servidor en
+    lugar del archivo SQLite local.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def __connect(self) -> socket.socket:
+        if self._sock is None:
+            self._sock = socket.create_connection((self.host, self.port), self.timeout)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self._sock
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    def request(self, message: dict) -> dict:
+        """
+        Envía una solicitud y espera la respuesta.
+
+        Raises:
+            ConnectionError: Si no hay comunicación con el servidor.
+            ValueError / sqlite3.DatabaseError: El error devuelto por el servidor.
+        """
+        with self._lock:
+            try:
+                sock = self.__connect()
+                send_message(sock, message)
+                response = recv_message(sock)
+            except OSError as e:
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+                raise ConnectionError(f"Sin conexión con el servidor {self.host}:{self.port}: {e}")
+            if response is None:
+                self._sock.close()  # type: ignore
+                self._sock = None
+                raise ConnectionError(f"El servidor {self.host}:{self.port} cerró la conexión.")
+        if not response.get("ok"):
+            if response.get("type") == "ValueError":
+                raise ValueError(response.get("error"))
+            raise sqlite3.DatabaseError(response.get("error"))
+        return response
+
+    def ping(self) -> bool:
+        return self.request({"op": "ping"}).get("result") == "pong"
+
+    def insert(self, instance: Any) -> Optional[int]:
+        rowid = self.request(
+            {
+                "op": "insert",
+                "model": type(instance).__name__,
+                "row": crud.to_row(instance),
+                "user": audit.current_user(),
+            }
+        )["result"]
+        crud.set_autoincrement(instance, rowid)
+        return rowid
+
+    def update(self, old: Any, new: Any) -> int:
+        return self.request(
+            {
+                "op": "update",
+                "model": type(new).__name__,
+                "old": crud.to_row(old),
+                "new": crud.to_row(new),
+                "user": audit.current_user(),
+            }
+        )["result"]
+
+    def delete(self, instance: Any) -> int:
+        return self.request(
+            {
+                "op": "delete",
+                "model": type(instance).__name__,
+                "row": crud.to_row(instance),
+                "user": audit.current_user(),
+            }
+        )["result"]
+
+    def cohort_stats(self) -> list:
+        from database import analytics
+
+        return analytics.from_rows(self.request({"op": "cohort_stats"})["result"])
+
+    def duplicate_candidates(self, instance: Any, threshold: float) -> list:
+        from database import dedup
+
+        response = self.request(
+            {"op": "duplicate_candidates", "row": crud.to_row(instance), "threshold": threshold}
+        )
+        return dedup.from_rows(response["result"])
+
+    def find_duplicates(self, threshold: float, limit: Optional[int] = None) -> list:
+        from database import dedup
+
+        response = self.request({"op": "find_duplicates", "threshold": threshold, "limit": limit})
+        return dedup.from_rows(response["result"])
+
+    def fuzzy_search(
+        self, text: str, callback: Callable[[Any], None], limit: int, min_similarity: float
+    ) -> list:
+        from database.models import InformacionGeneralPaciente
+
+        response = self.request(
+            {"op": "fuzzy_search", "text": text, "limit": limit, "min_similarity": min_similarity}
+        )
+        for row in response["rows"]:
+            callback(crud.from_row(InformacionGeneralPaciente, row))
+        return response["result"]
+
+    def phonetic_search(self, text: str, callback: Callable[[Any], None], limit: Optional[int]) -> None:
+        from database.models import InformacionGeneralPaciente
+
+        response = self.request({"op": "phonetic_search", "text": text, "limit": limit})
+        for row in response["rows"]:
+            callback(crud.from_row(InformacionGeneralPaciente, row))
+
+    def cohort(
+        self, expression: list, callback: Optional[Callable[[Any], None]], offset: int, limit: Optional[int]
+    ) -> int:
+        from database.models import InformacionGeneralPaciente
+
+        response = self.request({"op": "cohort", "expression": expression, "offset": offset, "limit": limit})
+        if callback is not None:
+            for row in response["rows"]:
+                callback(crud.from_row(InformacionGeneralPaciente, row))
+        return response["result"]
+
+    def workload(self, start: Optional[int], end: Optional[int], by_month: bool) -> list:
+        from database import workload
+
+        response = self.request({"op": "workload", "start": start, "end": end, "by_month": by_month})
+        return workload.from_rows(response["result"])
+
+    def recent(self) -> list[int]:
+        return self.request({"op": "recent", "user": audit.current_user()})["result"]
+
+    def recent_open(self, patient_id: int) -> None:
+        self.request({"op": "recent_open", "patient": patient_id, "user": audit.current_user()})
+
+    def summary(self) -> dict:
+        return self.request({"op": "summary"})["result"]
+
+    def vital_series(
+        self,
+        patient_id: int,
+        field: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        resolution: Optional[str] = None,
+    ) -> tuple:
+        import numpy as np
+
+        times, values = self.request(
+            {
+                "op": "vital_series",
+                "patient": patient_id,
+                "field": field,
+                "start": start,
+                "end": end,
+                "resolution": resolution,
+            }
+        )["result"]
+        return np.asarray(times, dtype=np.float64), np.asarray(values, dtype=np.float64)
+
+    def search(
+        self,
+        instance: Any,
+        callback: Callable[[Any], None],
+        comparator: str = "=",
+        ignore_primary_int: bool = False,
+        limit_start: Optional[int] = None,
+        limit_end: Optional[int] = None,
+        include_archive: bool = False,
+        modes: Optional[dict[str, str]] = None,
+    ) -> None:
+        response = self.request(
+            {
+                "op": "search",
+                "model": type(instance).__name__,
+                "row": crud.to_row(instance),
+                "comparator": comparator,
+                "ignore_primary_int": ignore_primary_int,
+                "limit_start": limit_start,
+                "limit_end": limit_end,
+                "include_archive": include_archive,
+                "modes": modes,
+            }
+        )
+        dataclass_type = type(instance)
+        for row in response["rows"]:
+            callback(crud.from_row(dataclass_type, row))
+
+    def query(self, query: Any, callback: Callable[[Any], None], include_archive: bool = False) -> None:
+        response = self.request(
+            {
+                "op": "query",
+                "model": query.model.__name__,
+                "query": query.to_dict(),
+                "include_archive": include_archive,
+            }
+        )
+        for row in response["rows"]:
+            callback(tuple(row) if query.columns else crud.from_row(query.model, row))
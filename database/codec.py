@@ -0,0 +1,38 @@
+import zlib
+from typing import Any
+
+COMPRESS_THRESHOLD = 256
+""" Tamaño mínimo en bytes (UTF-8) a partir del cual se comprime un valor """
+
+COMPRESS_LEVEL = 6
+""" Nivel de compresión zlib; debe ser fijo para que el mismo texto genere el mismo BLOB """
+
+MARKER = b"\x00"
+""" Byte inicial que identifica un valor comprimido (un texto nunca se guarda como BLOB) """
+
+
+def encode(value: Any) -> Any:
+    """
+    Comprime un texto si supera `COMPRESS_THRESHOLD` y la compresión reduce su tamaño.
+
+    Returns:
+        bytes con el formato MARKER + zlib(texto), o el valor original sin cambios.
+    """
+    if not isinstance(value, str):
+        return value
+    raw = value.encode("utf-8")
+    if len(raw) < COMPRESS_THRESHOLD:
+        return value
+    packed = MARKER + zlib.compress(raw, COMPRESS_LEVEL)
+    return packed if len(packed) < len(raw) else value
+
+
+def decode(value: Any) -> Any:
+    """Devuelve el texto original de un valor leído de la base de datos."""
+    if isinstance(value, bytes) and value[:1] == MARKER:
+        return zlib.decompress(value[1:]).decode("utf-8")
+    return value
+
+
+def is_encoded(value: Any) -> bool:
+    return isinstance(value, bytes) and value[:1] == MARKER
@@ -0,0 +1,420 @@
+from dataclasses import fields
+from datetime import date
+import json
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from database import analytics, codec, crud
+from database.models import InformacionGeneralPaciente
+from internal import CONTROL, InputWidgetType
+
+CATEGORICAL = tuple(
+    f.name for f in fields(InformacionGeneralPaciente) if f.metadata.get(CONTROL) == InputWidgetType.COMBO
+)
+""" Campos categóricos (los de tipo COMBO) que tienen un bitmap por valor """
+
+FOLLOWUP = "seguimiento"
+""" Dimensión de los controles programados (`ls_sg`), con un bitmap por mes AAAAMM """
+
+BAND = "banda"
+""" Dimensión de las bandas de edad de analytics.AGE_BANDS """
+
+CHUNK_SIZE = 50_000
+
+
+def eq(field: str, value: Any) -> list:
+    return ["eq", field, value]
+
+
+def age(low: Optional[int] = None, high: Optional[int] = None) -> list:
+    """Edad entre `low` y `high` años cumplidos (ambos incluidos; None = sin límite)."""
+    return ["age", low, high]
+
+
+def band(label: str) -> list:
+    return ["eq", BAND, label]
+
+
+def followup(year: int, month: int) -> list:
+    """Pacientes con un control programado en ese mes."""
+    return ["eq", FOLLOWUP, year * 100 + month]
+
+
+def followup_next_month(today: Optional[date] = None) -> list:
+    today = today or date.today()
+    year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+    return followup(year, month)
+
+
+def all_of(*terms) -> list:
+    return ["and", *terms]
+
+
+def any_of(*terms) -> list:
+    return ["or", *terms]
+
+
+def negate(term) -> list:
+    return ["not", term]
+
+
+def _followup_months(value) -> set[int]:
+    value = codec.decode(value)
+    if not value:
+        return set()
+    try:
+        items = json.loads(value) if isinstance(value, str) else value
+    except ValueError:
+        return set()
+    months = set()
+    for item in items or []:
+        when = item.get("fecha_proximo_control") if isinstance(item, dict) else getattr(item, "fecha_proximo_control", None)
+        when = crud.to_sqlite_param(when)
+        if isinstance(when, str) and when.isdigit():
+            when = int(when)
+        if isinstance(when, int) and when > 10000000:
+            months.add(when // 100)
+    return months
+
+
+class CohortIndex:
+    """
+    Índice en memoria de los pacientes por valores categóricos, como bitmaps: un arreglo
+    de bits empaquetados (NumPy uint8, un bit por id de paciente) por cada valor de los
+    campos CATEGORICAL, por mes de control programado y por banda de edad.
+
+    Explicación:
+    -----------------------------------------
+    - Un bitmap de un millón de pacientes ocupa 125 KB; AND/OR/NOT entre bitmaps son
+      operaciones vectorizadas sobre esos bytes, sin importar cuántos pacientes coincidan.
+    - Los campos de baja selectividad (género, estado civil) no se benefician de un
+      índice B-tree; con bitmaps cualquier combinación cuesta lo mismo.
+    - La edad se calcula con la fecha de nacimiento guardada por id, así que un rango
+      arbitrario ("40 a 60") también se resuelve como bitmap.
+    - Se carga la primera vez que se usa y luego se mantiene con el hook de crud.
+    """
+
+    def __init__(self, database: Optional[str] = None):
+        self.database = database
+        self.loaded = False
+        self.last_id = 0
+        self._lock = threading.RLock()
+        self._bitmaps: dict[tuple[str, Any], np.ndarray] = {}
+        self._alive = np.zeros(0, dtype=np.uint8)
+        self._birth = np.zeros(0, dtype=np.int64)
+        self._bands_day: Optional[date] = None
+
+    # --- mantenimiento -----------------------------------------------------------
+
+    def _grow(self, patient_id: int) -> None:
+        size = (patient_id >> 3) + 1
+        if size <= len(self._alive):
+            return
+        size = max(size, len(self._alive) * 2, 1024)
+        pad = size - len(self._alive)
+        self._alive = np.concatenate([self._alive, np.zeros(pad, dtype=np.uint8)])
+        self._birth = np.concatenate([self._birth, np.zeros(size * 8 - len(self._birth), dtype=np.int64)])
+        for key, bits in self._bitmaps.items():
+            self._bitmaps[key] = np.concatenate([bits, np.zeros(pad, dtype=np.uint8)])
+
+    def _bitmap(self, key: tuple[str, Any]) -> np.ndarray:
+        bits = self._bitmaps.get(key)
+        if bits is None:
+            bits = self._bitmaps[key] = np.zeros(len(self._alive), dtype=np.uint8)
+        return bits
+
+    @staticmethod
+    def _set(bits: np.ndarray, patient_id: int, on: bool) -> None:
+        if on:
+            bits[patient_id >> 3] |= 1 << (patient_id & 7)
+        else:
+            bits[patient_id >> 3] &= ~(1 << (patient_id & 7)) & 0xFF
+
+    @staticmethod
+    def _keys(categories: dict[str, Any], months: set[int]) -> list[tuple[str, Any]]:
+        keys = [(name, value) for name, value in categories.items() if value is not None]
+        return keys + [(FOLLOWUP, month) for month in months]
+
+    def _add(self, patient_id: int, categories: dict[str, Any], birth, months: set[int]) -> None:
+        self._grow(patient_id)
+        self._remove(patient_id)
+        for key in self._keys(categories, months):
+            self._set(self._bitmap(key), patient_id, True)
+        self._set(self._alive, patient_id, True)
+        self._birth[patient_id] = birth if isinstance(birth, int) else 0
+        self._bands_day = None
+        self.last_id = max(self.last_id, patient_id)
+
+    def _remove(self, patient_id: int) -> None:
+        # Se apaga el bit en todos los bitmaps: no hace falta recordar los valores de cada paciente
+        if patient_id >> 3 >= len(self._alive):
+            return
+        for (name, _), bits in self._bitmaps.items():
+            if name != BAND:
+                self._set(bits, patient_id, False)
+        self._set(self._alive, patient_id, False)
+        self._birth[patient_id] = 0
+        self._bands_day = None
+
+    def _load_rows(self, conn: sqlite3.Connection, after: int) -> None:
+        """Carga masiva: agrupa los ids por valor y arma cada bitmap con np.packbits."""
+        table = InformacionGeneralPaciente.__name__
+        columns = ", ".join(f'"{name}"' for name in ("id", *CATEGORICAL, "fecha_nacimiento", "ls_sg"))
+        groups: dict[tuple[str, Any], list[int]] = {}
+        alive: list[int] = []
+        last = after
+        while True:
+            rows = conn.execute(
+                f'SELECT {columns} FROM "{table}" WHERE "id" > ? ORDER BY "id" LIMIT ?;', (last, CHUNK_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last = rows[-1][0]
+            self._grow(last)
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            births = np.fromiter(
+                (row[-2] if isinstance(row[-2], int) else 0 for row in rows), dtype=np.int64, count=len(rows)
+            )
+            self._birth[ids] = births
+            alive.extend(ids.tolist())
+            for row in rows:
+                categories = dict(zip(CATEGORICAL, row[1 : 1 + len(CATEGORICAL)]))
+                months = _followup_months(row[-1]) if row[-1] not in (None, "[]") else set()
+                for key in self._keys(categories, months):
+                    groups.setdefault(key, []).append(row[0])
+        if not alive:
+            return
+        size = len(self._alive) * 8
+        for key, members in [*groups.items(), (None, alive)]:
+            mask = np.zeros(size, dtype=bool)
+            mask[members] = True
+            bits = np.packbits(mask, bitorder="little")
+            if key is None:
+                self._alive |= bits
+            else:
+                self._bitmap(key)[:] |= bits
+        self.last_id = max(self.last_id, last)
+        self._bands_day = None
+
+    def load(self, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Carga el índice desde la base de datos (o agrega los pacientes nuevos)."""
+        with self._lock:
+            own = conn is None
+            conn = conn or crud.connect(self.database)
+            try:
+                if not self.loaded:
+                    self._load_rows(conn, -1)
+                    self.loaded = True
+                    return
+                # Pacientes agregados sin pasar por este proceso (otra estación, otro programa)
+                table = InformacionGeneralPaciente.__name__
+                (last,) = conn.execute(f'SELECT max("id") FROM "{table}";').fetchone()
+                if last is not None and last > self.last_id:
+                    self._load_rows(conn, self.last_id)
+            finally:
+                if own:
+                    conn.close()
+
+    def apply(self, action: str, old: Any, new: Any) -> None:
+        """Aplica una escritura de crud (insert/update/delete de un paciente)."""
+        with self._lock:
+            if not self.loaded:
+                return
+            if action == "delete":
+                self._remove(old.id)
+                return
+            categories = {name: getattr(new, name) for name in CATEGORICAL}
+            birth = crud.to_sqlite_param(new.fecha_nacimiento)
+            self._add(new.id, categories, birth, _followup_months(crud.to_sqlite_param(new.ls_sg)))
+
+    # --- consultas ---------------------------------------------------------------
+
+    def _age_mask(self, low: Optional[int], high: Optional[int], today: date) -> np.ndarray:
+        stamp = today.year * 10000 + today.month * 100 + today.day
+        mask = self._birth > 0
+        if low is not None:
+            mask &= self._birth <= stamp - low * 10000
+        if high is not None:
+            mask &= self._birth > stamp - (high + 1) * 10000
+        return np.packbits(mask, bitorder="little")[: len(self._alive)]
+
+    def _refresh_bands(self) -> None:
+        today = date.today()
+        if self._bands_day == today:
+            return
+        labels = analytics.band_labels()
+        limits = [*analytics.AGE_BANDS, None]
+        for label, low, high in zip(labels, limits, limits[1:]):
+            self._bitmaps[(BAND, label)] = self._age_mask(low, None if high is None else high - 1, today)
+        no_birth = np.packbits(self._birth <= 0, bitorder="little")[: len(self._alive)]
+        self._bitmaps[(BAND, labels[-1])] = no_birth & self._alive
+        self._bands_day = today
+
+    def evaluate(self, expression: list) -> np.ndarray:
+        """Bitmap de los pacientes que cumplen la expresión (ver `eq`, `age`, `all_of`...)."""
+        with self._lock:
+            self._refresh_bands()
+            return self._evaluate(expression) & self._alive
+
+    def _evaluate(self, expression: list) -> np.ndarray:
+        op, *args = expression
+        match op:
+            case "eq":
+                bits = self._bitmaps.get((args[0], args[1]))
+                return bits if bits is not None else np.zeros_like(self._alive)
+            case "age":
+                return self._age_mask(args[0], args[1], date.today())
+            case "and":
+                result = self._alive.copy()
+                for term in args:
+                    result &= self._evaluate(term)
+                return result
+            case "or":
+                result = np.zeros_like(self._alive)
+                for term in args:
+                    result |= self._evaluate(term)
+                return result
+            case "not":
+                return ~self._evaluate(args[0]) & self._alive
+            case "all":
+                return self._alive
+            case _:
+                raise ValueError(f"Operación de cohorte desconocida: {op}")
+
+    def count(self, expression: list) -> int:
+        return int(np.unpackbits(self.evaluate(expression)).sum())
+
+    def ids(self, expression: list, offset: int = 0, limit: Optional[int] = None) -> list[int]:
+        """Ids de los pacientes de la cohorte en orden ascendente, por páginas."""
+        found = np.flatnonzero(np.unpackbits(self.evaluate(expression), bitorder="little"))
+        end = None if limit is None else offset + limit
+        return found[offset:end].tolist()
+
+    def values(self, name: str) -> list:
+        """Valores con bitmap de una dimensión (por ejemplo los meses de FOLLOWUP)."""
+        with self._lock:
+            self._refresh_bands()
+            return sorted((value for dimension, value in self._bitmaps if dimension == name), key=str)
+
+
+_index: Optional[CohortIndex] = None
+_pending: dict[int, list[tuple[str, Any, Any]]] = {}
+""" Escrituras de cada conexión que se aplican a los bitmaps al confirmar (ver `flush`) """
+_pending_lock = threading.Lock()
+
+
+def on_write(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    """Hook de crud: acumula la escritura; los bitmaps cambian en `flush`."""
+    instance = new if new is not None else old
+    if _index is None or not isinstance(instance, InformacionGeneralPaciente) or not instance.id:
+        return
+    with _pending_lock:
+        _pending.setdefault(id(conn), []).append((action, old, new))
+
+
+def flush(conn: sqlite3.Connection) -> None:
+    """Hook de crud: aplica al índice cargado las escrituras de la transacción."""
+    with _pending_lock:
+        writes = _pending.pop(id(conn), None)
+    if writes and _index is not None:
+        for action, old, new in writes:
+            _index.apply(action, old, new)
+
+
+def discard(conn: sqlite3.Connection) -> None:
+    """Hook de crud: olvida las escrituras de una transacción revertida."""
+    with _pending_lock:
+        _pending.pop(id(conn), None)
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Prepara el índice (se carga al primer uso) y registra el hook en crud."""
+    global _index
+    _index = CohortIndex(database)
+    crud.register_write_hook(on_write, flush, discard)
+
+
+def disable() -> None:
+    global _index
+    crud.unregister_write_hook(on_write, flush, discard)
+    _index = None
+    with _pending_lock:
+        _pending.clear()
+
+
+def get_index(database: Optional[str] = None) -> CohortIndex:
+    global _index
+    if _index is None:
+        _index = CohortIndex(database)
+    _index.load()
+    return _index
+
+
+def count(expression: list, database: Optional[str] = None) -> int:
+    """Cantidad de pacientes de la cohorte."""
+    if database is None and crud._backend is not None:
+        return crud._backend.cohort(expression, None, 0, 0)
+    return get_index(database).count(expression)
+
+
+def ids(
+    expression: list, offset: int = 0, limit: Optional[int] = None, database: Optional[str] = None
+) -> list[int]:
+    """Ids de una página de la cohorte, en orden ascendente."""
+    return get_index(database).ids(expression, offset, limit)
+
+
+def search(
+    expression: list,
+    callback: Callable[[Any], None],
+    offset: int = 0,
+    limit: Optional[int] = None,
+    database: Optional[str] = None,
+) -> int:
+    """
+    Llama a `callback` con los pacientes de una página de la cohorte (en orden de id) y
+    devuelve el total, para mostrarlos en una tabla por páginas.
+    """
+    if database is None and crud._backend is not None:
+        return crud._backend.cohort(expression, callback, offset, limit)
+    index = get_index(database)
+    page = index.ids(expression, offset, limit)
+    table = InformacionGeneralPaciente.__name__
+    conn = crud.connect(database)
+    try:
+        for start in range(0, len(page), 500):
+            chunk = page[start : start + 500]
+            crud.execute_select(
+                InformacionGeneralPaciente,
+                f'SELECT {crud.select_columns(InformacionGeneralPaciente)} FROM "{table}" '
+                f'WHERE "id" IN ({", ".join("?" * len(chunk))}) ORDER BY "id";',
+                callback,
+                chunk,
+                conn,
+            )
+    finally:
+        conn.close()
+    return index.count(expression)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Cuenta pacientes de una cohorte (expresión JSON).")
+    parser.add_argument(
+        "expresion",
+        help='por ejemplo: \'["and", ["eq", "genero", "Femenino"], ["age", 40, 60]]\'',
+    )
+    parser.add_argument("--database", default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = get_index(args.database)
+    print(f"índice cargado en {time.perf_counter() - start:.1f} s")
+    start = time.perf_counter()
+    total = index.count(json.loads(args.expresion))
+    print(f"{total} pacientes en {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -3,10 +3,37 @@ import dataclasses
 from datetime import date
 from enum import Flag, auto
 import sqlite3
+from contextlib import closing
 import internal
-from typing import Any, Optional
-from internal import LISTMODEL, SQLiteFieldConstraint, SQLITE_FLAGS
+from typing import Any, Callable, Optional
+from internal import COMPRESS, CONTROL, DERIVED, INSERT_DEFAULT, LISTMODEL, SEARCHABLE, SHOWINTABLE, SORTINDEX, InputWidgetType, SQLiteFieldConstraint, SQLITE_FLAGS
 import json
+from database import codec
+from database.text import normalize_search
+
+DATABASE = "database.sqlite"
+""" Ruta del archivo de base de datos SQLite que usa la aplicación """
+
+_backend: Any = None
+""" Backend remoto (por ejemplo database.client.CrudClient); None usa sqlite3 directamente """
+
+_write_hooks: list = []
+""" Funciones llamadas tras cada insert/update/delete con (conexión, acción, anterior, nuevo) """
+
+_flush_hooks: list = []
+""" Funciones llamadas con la conexión antes de confirmar la transacción (ver `flush`) """
+
+_discard_hooks: list = []
+""" Funciones llamadas con la conexión cuando la transacción se revierte (ver `discard`) """
+
+NORMALIZED_SUFFIX = "__norm"
+""" Sufijo de las columnas normalizadas (ver `shadow_columns`) """
+
+MATCH_CONTAINS = "contains"
+MATCH_PREFIX = "prefix"
+MATCH_EXACT = "exact"
+""" Modos de comparación por campo de texto (ver `to_select_query`) """
+
 
 def python_type_to_sqlite(py_type):
     if py_type == int or py_type == Optional[int]:
@@ -29,7 +56,74 @@ class EnhancedJSONEncoder(json.JSONEncoder):
                 return o.strftime('%Y%m%d')
             return super().default(o)
 
-def create_table_sql(dataclass_type):
+def shadow_columns(dataclass_type) -> list[tuple[str, str]]:
+    """
+    Columnas ocultas que crud mantiene junto a los campos del modelo, como pares
+    (columna, campo): una columna normalizada (`text.normalize_search`: sin tildes ni
+    mayúsculas) por cada campo de texto buscable.
+
+    No son campos del dataclass: se agregan al final de la tabla, se calculan en cada
+    INSERT/UPDATE y tienen índice. `to_select_query` filtra por ellas en lugar del campo.
+    """
+    return [
+        (f"{f.name}{NORMALIZED_SUFFIX}", f.name)
+        for f in fields(dataclass_type)
+        if f.metadata.get(SEARCHABLE)
+        and f.metadata.get(CONTROL) == InputWidgetType.INPUT_TEXT
+        and python_type_to_sqlite(f.type) == "TEXT"
+        and not f.metadata.get(COMPRESS)
+    ]
+
+
+def _shadow_value(value) -> Optional[str]:
+    # NULL se conserva: "" y NULL no coinciden igual con LIKE
+    return None if value is None else normalize_search(value)
+
+
+def _shadow_values(instance: Any) -> list:
+    return [_shadow_value(getattr(instance, name)) for _, name in shadow_columns(type(instance))]
+
+
+def sort_columns(dataclass_type) -> list[str]:
+    """
+    Columnas con índice para ordenar las tablas de resultados (los campos marcados con
+    `sortindex`, ver database.query): la columna normalizada si el campo la tiene, o la
+    del campo. `migrate_table` les crea el índice para que ordenar no requiera leer todo;
+    los demás campos visibles también se pueden ordenar, pero sin índice (cada índice
+    duplica la columna en disco y encarece las escrituras).
+    """
+    shadows = {name: column for column, name in shadow_columns(dataclass_type)}
+    return [
+        shadows.get(f.name, f.name)
+        for f in fields(dataclass_type)
+        if f.metadata.get(SORTINDEX) and not f.metadata.get(COMPRESS)
+    ]
+
+
+def select_columns(dataclass_type, alias: Optional[str] = None) -> str:
+    """
+    Lista de columnas de los campos del modelo para un SELECT (con el alias de la tabla,
+    si se indica). Se usa en lugar de `*` porque la tabla puede tener columnas ocultas
+    (ver `shadow_columns`).
+    """
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(f'{prefix}"{f.name}"' for f in fields(dataclass_type))
+
+
+def _stored_value(f, value):
+    """
+    Aplica el códec de la columna al valor que se va a guardar.
+    Los campos marcados con `compress=True` se comprimen si superan el umbral
+    (las listas se serializan a JSON antes de comprimir).
+    """
+    if not f.metadata.get(COMPRESS):
+        return value
+    if isinstance(value, list):
+        value = json.dumps(value, cls=EnhancedJSONEncoder)
+    return codec.encode(value)
+
+
+def create_table_sql(dataclass_type, schema: Optional[str] = None):
     """
     Genera un comando SQL para crear una tabla SQLite a partir de un dataclass Python.
     
@@ -49,6 +143,8 @@ def create_table_sql(dataclass_type):
     Requisitos para los campos del dataclass:
     - Los tipos Python deben poder mapearse a tipos SQLite (usa la función python_type_to_sqlite).
     - Para utilizar restricciones, hay que emplear el argumento 'metadata' en los campos del dataclass.
+
+    Si se indica `schema`, la tabla se crea en esa base de datos adjunta (ATTACH).
     """
 
     columns = []      # Lista de definiciones de columnas (nombre y tipo + restricciones)
@@ -80,20 +176,22 @@ def create_table_sql(dataclass_type):
 
         columns.append(col_def)
 
+    columns.extend(f'"{column}" TEXT' for column, _ in shadow_columns(dataclass_type))
     columns_sql = ", ".join(columns)
-    table_name = dataclass_type.__name__
+    prefix = f'"{schema}".' if schema else ""
+    table_name = f'{prefix}"{dataclass_type.__name__}"'
 
     # Condicionales para construir la instrucción SQL respetando las reglas de SQLite
     if len(primarykey) == 0 and len(autoincrement) == 0:
         # Caso sin clave primaria ni autoincrement: tabla básica
-        return f"CREATE TABLE IF NOT EXISTS '{table_name}' ({columns_sql});"
+        return f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_sql});"
     else:
         if len(autoincrement) == 1:
             # Caso con AUTOINCREMENT: debe ser la única PRIMARY KEY
-            return f"CREATE TABLE IF NOT EXISTS '{table_name}' ({columns_sql}, PRIMARY KEY({autoincrement[0]} AUTOINCREMENT));"
+            return f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_sql}, PRIMARY KEY({autoincrement[0]} AUTOINCREMENT));"
         else:
             # Caso de clave primaria compuesta, sin autoincrement
-            return f"CREATE TABLE IF NOT EXISTS '{table_name}' ({columns_sql}, PRIMARY KEY({', '.join(primarykey)}));"
+            return f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_sql}, PRIMARY KEY({', '.join(primarykey)}));"
         
 def to_insert_sql(instance: Any, use_reemplace:bool = False) -> str:
     """
@@ -126,7 +224,7 @@ def to_insert_sql(instance: Any, use_reemplace:bool = False) -> str:
         isauto = SQLiteFieldConstraint.AUTOINCREMENT in f.metadata[SQLITE_FLAGS] and f.type == int
         if (isauto == False):
             col_names.append(f.name)
-        value = getattr(instance, f.name)
+        value = _stored_value(f, getattr(instance, f.name))
         # Si es lista, serializar a JSON
         if isinstance(value, list):
             value = json.dumps(value,cls=EnhancedJSONEncoder)
@@ -137,12 +235,17 @@ def to_insert_sql(instance: Any, use_reemplace:bool = False) -> str:
             values.append(f"'{value}'")  # Envuelve el valor entre comillas simples
         elif isinstance(value, date):
             values.append(f"{value.strftime('%Y%m%d')}")
+        elif isinstance(value, bytes):
+            values.append(__convert_value_sqlite(value))
         elif value is None:
             values.append("NULL")
         elif isauto:
             continue
         else:
             values.append(str(value))
+    for (column, _), value in zip(shadow_columns(type(instance)), _shadow_values(instance)):
+        col_names.append(column)
+        values.append(__convert_value_sqlite(value))
 
     columns = ", ".join(col_names)
     values_clause = ", ".join(values)
@@ -150,8 +253,82 @@ def to_insert_sql(instance: Any, use_reemplace:bool = False) -> str:
         return f"INSERT OR REPLACE INTO {table_name} ({columns}) VALUES ({values_clause});"
     else:
         return f"INSERT INTO {table_name} ({columns}) VALUES ({values_clause});"
+
+
+def to_insert_query(instance: Any, use_reemplace: bool = False):
+    """
+    Genera una sentencia INSERT parametrizada a partir de una instancia de dataclass.
+
+    A diferencia de `to_insert_sql`, los valores no se incrustan en el texto de la
+    consulta, por lo que la misma sentencia puede reutilizarse con `executemany`
+    para insertar lotes de instancias del mismo modelo.
+
+    Args:
+        instance: Objeto dataclass con los datos a insertar
+        use_reemplace: Usar INSERT OR REPLACE en lugar de INSERT
+
+    Raises:
+        ValueError: Si el objeto no es una instancia de dataclass
+
+    Returns:
+        Una tupla con (cadena de consulta, lista de parámetros) para uso seguro con sqlite3.
+    """
+    if not is_dataclass(instance):
+        raise ValueError("Input must be a dataclass instance.")
+    table_name = type(instance).__name__
+
+    col_names = []
+    params = []
+    for f in fields(instance):
+        if SQLiteFieldConstraint.AUTOINCREMENT in f.metadata[SQLITE_FLAGS] and f.type == int:
+            continue
+        col_names.append(f'"{f.name}"')
+        params.append(to_sqlite_param(_stored_value(f, getattr(instance, f.name))))
+    for (column, _), value in zip(shadow_columns(type(instance)), _shadow_values(instance)):
+        col_names.append(f'"{column}"')
+        params.append(value)
+
+    columns = ", ".join(col_names)
+    placeholders = ", ".join("?" for _ in col_names)
+    verb = "INSERT OR REPLACE" if use_reemplace else "INSERT"
+    return f'{verb} INTO "{table_name}" ({columns}) VALUES ({placeholders});', params
+
+
+def to_sqlite_param(value):
+    """Convierte un valor de un dataclass al valor que se enlaza como parámetro en sqlite3."""
+    if isinstance(value, list):
+        return json.dumps(value, cls=EnhancedJSONEncoder)
+    elif isinstance(value, date):
+        return int(value.strftime('%Y%m%d'))
+    return value
     
 
+def apply_derived(instance: Any) -> None:
+    """
+    Calcula los campos declarados con `derived` (ver internal.Derived) a partir de sus
+    campos fuente. Si falta alguna fuente se conserva el valor que tenga el campo.
+    """
+    for f in fields(instance):
+        rule = f.metadata.get(DERIVED)
+        if rule is None:
+            continue
+        args = [to_sqlite_param(getattr(instance, name)) for name in rule.sources]
+        if not all(isinstance(a, (int, float)) and not isinstance(a, bool) for a in args):
+            continue
+        result = float(rule.compute(*args))
+        if result != result:  # NaN: no se puede calcular con estos valores
+            continue
+        setattr(instance, f.name, int(result) if f.type in (int, Optional[int]) else result)
+
+
+def apply_insert_defaults(instance: Any) -> None:
+    """Asigna a los campos vacíos declarados con `insert_default` (ver internal.flags) su valor."""
+    for f in fields(instance):
+        default = f.metadata.get(INSERT_DEFAULT)
+        if default is not None and getattr(instance, f.name) is None:
+            setattr(instance, f.name, default())
+
+
 def to_update_sql(old: Any, new: Any) -> str:
     """
     Genera una sentencia UPDATE de SQLite para actualizar los valores de una fila,
@@ -171,13 +348,15 @@ def to_update_sql(old: Any, new: Any) -> str:
         # Ignorar campos con IGNORE
         """if SQLITE_FLAGS in f.metadata and SQLiteFieldConstraint.IGNORE in f.metadata[SQLITE_FLAGS]:
             continue"""
-        value = getattr(new, f.name)
+        value = _stored_value(f, getattr(new, f.name))
         # Si es lista, serializar a JSON
         if isinstance(value, list):
             value_sql = f"'{json.dumps(value,cls=EnhancedJSONEncoder).replace("'", "''")}'"
         else:
             value_sql = __convert_value_sqlite(value)
         set_clauses.append(f'"{f.name}" = {value_sql}')
+    for (column, _), value in zip(shadow_columns(type(new)), _shadow_values(new)):
+        set_clauses.append(f'"{column}" = {__convert_value_sqlite(value)}')
     set_clause = ", ".join(set_clauses)
 
     # Construir WHERE con los valores de 'old'
@@ -186,7 +365,14 @@ def to_update_sql(old: Any, new: Any) -> str:
         # Ignorar campos con IGNORE
         if SQLITE_FLAGS in f.metadata and SQLiteFieldConstraint.IGNORE in f.metadata[SQLITE_FLAGS]:
             continue
-        value = getattr(old, f.name)
+        value = _stored_value(f, getattr(old, f.name))
+        if codec.is_encoded(value):
+            where_clauses.append(__compressed_filter(f.name, value))
+            continue
+        if value is None:
+            # "= NULL" nunca es verdadero en SQL
+            where_clauses.append(f'"{f.name}" IS NULL')
+            continue
         # Si es lista, serializar a JSON
         if isinstance(value, list):
             value_sql = f"'{json.dumps(value,cls=EnhancedJSONEncoder).replace("'", "''")}'"
@@ -237,7 +423,13 @@ def to_delete_sql(instance: Any) -> str:
             # Ignorar campos con IGNORE
             """if SQLITE_FLAGS in f.metadata and SQLiteFieldConstraint.IGNORE in f.metadata[SQLITE_FLAGS]:
                 continue"""
-            value = getattr(instance, f.name)
+            value = _stored_value(f, getattr(instance, f.name))
+            if codec.is_encoded(value):
+                filters.append(__compressed_filter(f.name, value))
+                continue
+            if value is None:
+                filters.append(f'"{f.name}" IS NULL')
+                continue
             # Si es lista, serializar a JSON
             if isinstance(value, list):
                 value = f"'{json.dumps(value,cls=EnhancedJSONEncoder).replace("'", "''")}'"
@@ -253,8 +445,19 @@ def to_delete_sql(instance: Any) -> str:
     query = f'DELETE FROM "{table_name}" WHERE {where_clause};'
     return query
 
+def __compressed_filter(name: str, value: bytes) -> str:
+    """
+    Filtro WHERE para una columna comprimida. Acepta tanto el BLOB comprimido como el
+    texto plano, porque las filas guardadas antes de activar la compresión no cambian.
+    """
+    plain = __convert_value_sqlite(codec.decode(value))
+    return f'"{name}" IN ({__convert_value_sqlite(value)}, {plain})'
+
+
 def __convert_value_sqlite(value):
-    if isinstance(value, str):
+    if isinstance(value, bytes):
+        value = f"X'{value.hex()}'"
+    elif isinstance(value, str):
         value = value.replace("'", "''") 
         value = f"'{value}'"
     elif isinstance(value, date):
@@ -265,7 +468,27 @@ def __convert_value_sqlite(value):
         value= str(value)
     return value
 
-def to_select_query(instance, table_name=None, ignore_primary_int=False, comparator="=", limit_start=None, limit_end=None):
+def prefix_upper_bound(prefix: str) -> str:
+    """Menor texto mayor que todos los que empiezan con `prefix` ("abc" -> "abd")."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _match_filter(column: str, mode: str, value: str) -> tuple[str, list]:
+    """
+    Filtro de un campo de texto según el modo. "prefix" usa un rango
+    (`>= 'abc' AND < 'abd'`), que SQLite resuelve con el índice de la columna.
+    """
+    if mode == MATCH_EXACT:
+        return f'"{column}" = ?', [value]
+    if mode == MATCH_PREFIX:
+        return f'"{column}" >= ? AND "{column}" < ?', [value, prefix_upper_bound(value)]
+    if mode == MATCH_CONTAINS:
+        escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f'"{column}" LIKE ? ESCAPE \'\\\'', [f"%{escaped}%"]
+    raise ValueError(f"Modo de búsqueda desconocido: {mode}")
+
+
+def to_select_query(instance, table_name=None, ignore_primary_int=False, comparator="=", limit_start=None, limit_end=None, normalized=True, modes=None):
     """
     Genera una consulta SELECT de SQLite utilizando los atributos con valor distinto de None de una instancia de dataclass como filtros.
     
@@ -275,6 +498,12 @@ def to_select_query(instance, table_name=None, ignore_primary_int=False, compara
         comparator: comparador SQL a utilizar (por defecto "="). Puede personalizarse por campo si es necesario.
         limit_start: índice inicial para LIMIT/OFFSET (opcional).
         limit_end: cantidad de filas a devolver (opcional).
+        normalized: filtrar los campos de texto buscables por su columna normalizada (ver
+            `shadow_columns`), sin distinguir mayúsculas ni tildes. Usar False si la tabla
+            no tiene esas columnas (por ejemplo una vista).
+        modes: modo de comparación por campo de texto ({campo: MATCH_PREFIX | MATCH_CONTAINS |
+            MATCH_EXACT}); estos campos ignoran `comparator`, el valor se usa tal cual
+            (sin comodines) y un texto vacío no filtra.
     
     Retorna:
         Una tupla con (cadena de consulta, lista de parámetros) para uso seguro con sqlite3.
@@ -285,6 +514,8 @@ def to_select_query(instance, table_name=None, ignore_primary_int=False, compara
     table_name = table_name or type(instance).__name__
     filters = []
     params = []
+    shadows = {name: column for column, name in shadow_columns(type(instance))} if normalized else {}
+    modes = modes or {}
 
     for f in fields(instance):
         # Ignorar campos con IGNORE
@@ -305,6 +536,18 @@ def to_select_query(instance, table_name=None, ignore_primary_int=False, compara
                 if not value:
                     continue  # Ignorar listas vacías
                 value = json.dumps(value,cls=EnhancedJSONEncoder)
+            if f.name in modes and isinstance(value, str):
+                if f.name in shadows:
+                    value = normalize_search(value)
+                if value:
+                    clause, values = _match_filter(shadows.get(f.name, f.name), modes[f.name], value)
+                    filters.append(clause)
+                    params.extend(values)
+                continue
+            if f.name in shadows and isinstance(value, str):
+                filters.append(f'"{shadows[f.name]}" {comparator} ?')
+                params.append(normalize_search(value))
+                continue
             filters.append(f'"{f.name}" {comparator} ?')
             params.append(value)
 
@@ -322,20 +565,25 @@ def to_select_query(instance, table_name=None, ignore_primary_int=False, compara
         params.append(limit_end)
     # Si ambos son None, no se agrega LIMIT
 
-    query = f'SELECT * FROM "{table_name}"{where_clause}{limit_clause};'
+    query = f'SELECT {select_columns(type(instance))} FROM "{table_name}"{where_clause}{limit_clause};'
     return query, params
 
 
 
+def connect(database: Optional[str] = None) -> sqlite3.Connection:
+    """Abre una conexión a la base de datos de la aplicación (o a `database` si se indica)."""
+    return sqlite3.connect(database or DATABASE)
+
+
 def execute(query:str)->None:
-    sqlite_database = sqlite3.connect("database.sqlite")
+    sqlite_database = connect()
     sqlite_database.execute(query)
     sqlite_database.commit()
     sqlite_database.close()
     del sqlite_database
 
 
-def execute_select(dataclass_type:type, query: str, callback, params=None):
+def execute_select(dataclass_type:type, query: str, callback, params=None, conn: Optional[sqlite3.Connection] = None):
     """
     Ejecuta una consulta SELECT en la base de datos SQLite y llama al callback por cada fila leída.
 
@@ -343,11 +591,14 @@ def execute_select(dataclass_type:type, query: str, callback, params=None):
         query (str): Consulta SQL SELECT a ejecutar.
         callback (callable): Función a invocar por cada fila, recibe los valores de la fila como argumentos.
         params (list/tuple, opcional): Parámetros para la consulta SQL (para evitar inyección SQL).
+        conn (opcional): Conexión a reutilizar; si no se indica se abre y se cierra una nueva.
 
     Returns:
         None
     """
-    conn = sqlite3.connect("database.sqlite")
+    own = conn is None
+    if own:
+        conn = connect()
     cursor = conn.cursor()
     if params is None:
         cursor.execute(query)
@@ -356,7 +607,223 @@ def execute_select(dataclass_type:type, query: str, callback, params=None):
     for row in cursor:
         callback(__tuple_to_dataclass(dataclass_type,row))
     cursor.close()
-    conn.close()
+    if own:
+        conn.close()
+
+
+def use_backend(backend) -> None:
+    """
+    Cambia el destino de las operaciones `insert`, `update`, `delete` y `search`.
+
+    Con `None` (valor por defecto) se usa el archivo SQLite local. Cualquier objeto que
+    implemente esos cuatro métodos con la misma firma (ver database.client.CrudClient)
+    puede usarse en su lugar, sin cambios en la interfaz gráfica.
+    """
+    global _backend
+    _backend = backend
+
+
+def register_write_hook(
+    hook: Callable, flush: Optional[Callable] = None, discard: Optional[Callable] = None
+) -> None:
+    """
+    Registra una función que se ejecuta después de cada `insert`, `update` y `delete`,
+    dentro de la misma transacción. Recibe (conexión, acción, anterior, nuevo), donde
+    acción es "insert", "update" o "delete" y anterior/nuevo son None cuando no aplican.
+
+    `flush`, si se indica, recibe la conexión justo antes del COMMIT; permite a un hook
+    acumular trabajo en memoria y escribirlo en lote. `discard` recibe la conexión cuando
+    la transacción se revierte y debe olvidar lo acumulado para ella.
+    """
+    if hook not in _write_hooks:
+        _write_hooks.append(hook)
+    if flush is not None and flush not in _flush_hooks:
+        _flush_hooks.append(flush)
+    if discard is not None and discard not in _discard_hooks:
+        _discard_hooks.append(discard)
+
+
+def unregister_write_hook(
+    hook: Callable, flush: Optional[Callable] = None, discard: Optional[Callable] = None
+) -> None:
+    if hook in _write_hooks:
+        _write_hooks.remove(hook)
+    if flush in _flush_hooks:
+        _flush_hooks.remove(flush)
+    if discard in _discard_hooks:
+        _discard_hooks.remove(discard)
+
+
+def flush(conn: sqlite3.Connection) -> None:
+    """
+    Escribe el trabajo pendiente de los hooks en la transacción actual de `conn`.
+    Quien llame a insert/update/delete con su propia conexión debe llamarla antes del COMMIT.
+    """
+    for hook in _flush_hooks:
+        hook(conn)
+
+
+def discard(conn: sqlite3.Connection) -> None:
+    """
+    Descarta el trabajo pendiente de los hooks para `conn`. Quien llame a
+    insert/update/delete con su propia conexión debe llamarla al hacer ROLLBACK: si no,
+    lo acumulado se escribiría con la siguiente transacción (o con otra conexión que
+    reciba el mismo `id()`).
+    """
+    for hook in _discard_hooks:
+        hook(conn)
+
+
+def _notify(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    for hook in _write_hooks:
+        hook(conn, action, old, new)
+
+
+def insert(instance: Any, conn: Optional[sqlite3.Connection] = None) -> Optional[int]:
+    """
+    Inserta una instancia de dataclass y devuelve el rowid asignado. Si el modelo tiene
+    una columna AUTOINCREMENT, la instancia recibe el valor asignado.
+
+    Si se indica `conn`, la sentencia se ejecuta en esa conexión sin confirmar la
+    transacción (el llamador decide cuándo hacer COMMIT, ver `flush`).
+    """
+    apply_insert_defaults(instance)
+    apply_derived(instance)
+    if conn is None:
+        if _backend is not None:
+            return _backend.insert(instance)
+        with closing(connect()) as conn, conn:
+            try:
+                rowid = insert(instance, conn)
+                flush(conn)
+            except Exception:
+                discard(conn)
+                raise
+            return rowid
+    query, params = to_insert_query(instance)
+    rowid = conn.execute(query, params).lastrowid
+    set_autoincrement(instance, rowid)
+    _notify(conn, "insert", None, instance)
+    return rowid
+
+
+def set_autoincrement(instance: Any, rowid: Optional[int]) -> None:
+    """Asigna a la columna AUTOINCREMENT de la instancia (si tiene) el rowid generado."""
+    for f in fields(instance):
+        if SQLiteFieldConstraint.AUTOINCREMENT in f.metadata[SQLITE_FLAGS] and f.type == int:
+            setattr(instance, f.name, rowid)
+
+
+def update(old: Any, new: Any, conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Actualiza la fila que coincide con `old` usando los valores de `new`.
+
+    Raises:
+        ValueError: Si ninguna fila coincide, es decir, el registro fue modificado o
+            eliminado por otro usuario desde que se leyó.
+    """
+    apply_derived(new)
+    if conn is None:
+        if _backend is not None:
+            return _backend.update(old, new)
+        with closing(connect()) as conn, conn:
+            try:
+                count = update(old, new, conn)
+                flush(conn)
+            except Exception:
+                discard(conn)
+                raise
+            return count
+    count = conn.execute(to_update_sql(old, new)).rowcount
+    if count == 0:
+        raise ValueError("El registro no existe o fue modificado por otro usuario.")
+    _notify(conn, "update", old, new)
+    return count
+
+
+def delete(instance: Any, conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Elimina la fila que corresponde a la instancia.
+
+    Raises:
+        ValueError: Si ninguna fila coincide.
+    """
+    if conn is None:
+        if _backend is not None:
+            return _backend.delete(instance)
+        with closing(connect()) as conn, conn:
+            try:
+                count = delete(instance, conn)
+                flush(conn)
+            except Exception:
+                discard(conn)
+                raise
+            return count
+    count = conn.execute(to_delete_sql(instance)).rowcount
+    if count == 0:
+        raise ValueError("El registro no existe o ya fue eliminado.")
+    _notify(conn, "delete", instance, None)
+    return count
+
+
+def search(
+    instance: Any,
+    callback: Callable[[Any], None],
+    comparator: str = "=",
+    ignore_primary_int: bool = False,
+    limit_start: Optional[int] = None,
+    limit_end: Optional[int] = None,
+    conn: Optional[sqlite3.Connection] = None,
+    include_archive: bool = False,
+    modes: Optional[dict[str, str]] = None,
+) -> None:
+    """
+    Busca filas usando como filtro los atributos con valor de `instance` (ver `to_select_query`)
+    y llama a `callback` con cada instancia leída. `limit_start`/`limit_end` permiten
+    leer los resultados por páginas. Con `include_archive` también se buscan los
+    archivos históricos del modelo (ver database.archive). `modes` indica el modo de
+    comparación de cada campo de texto (MATCH_PREFIX, MATCH_CONTAINS, MATCH_EXACT).
+    """
+    if conn is None and _backend is not None:
+        return _backend.search(
+            instance,
+            callback,
+            comparator=comparator,
+            ignore_primary_int=ignore_primary_int,
+            limit_start=limit_start,
+            limit_end=limit_end,
+            include_archive=include_archive,
+            modes=modes,
+        )
+    if include_archive:
+        from database import archive  # Import local para evitar import circular
+
+        if archive.is_archivable(type(instance)):
+            return archive.search(
+                instance, callback, comparator, ignore_primary_int, limit_start, limit_end, modes=modes
+            )
+    query, params = to_select_query(
+        instance,
+        ignore_primary_int=ignore_primary_int,
+        comparator=comparator,
+        limit_start=limit_start,
+        limit_end=limit_end,
+        modes=modes,
+    )
+    execute_select(type(instance), query, callback, params, conn)
+
+
+def to_row(instance: Any) -> list:
+    """
+    Convierte una instancia en la lista de valores de sus campos, en el mismo orden y
+    formato en que SQLite los devuelve (fechas AAAAMMDD, listas como JSON, sin comprimir).
+    """
+    return [to_sqlite_param(getattr(instance, f.name)) for f in fields(instance)]
+
+
+def from_row(dataclass_type: type, row) -> Any:
+    """Construye una instancia a partir de una fila de SQLite o de `to_row`."""
+    return __tuple_to_dataclass(dataclass_type, row)
 
 def __tuple_to_dataclass(dataclass_type:type, data_tuple)->Any:
     """
@@ -375,7 +842,10 @@ def __tuple_to_dataclass(dataclass_type:type, data_tuple)->Any:
     field_types = [f.type for f in fields(dataclass_type)]
     values = []
     for value, ftype, f in zip(data_tuple, field_types, fields(dataclass_type)):
-        if ftype == date or ftype == Optional[date]:
+        if isinstance(value, bytes):
+            # Columnas comprimidas (ver database.codec)
+            value = codec.decode(value)
+        if (ftype == date or ftype == Optional[date]) and value is not None:
             # Intenta parsear fechas en formato YYYYMMDD
             value = str(value)
             try:
@@ -396,6 +866,61 @@ def __tuple_to_dataclass(dataclass_type:type, data_tuple)->Any:
         values.append(value)
     return dataclass_type(*values)
 
+def migrate_table(conn: sqlite3.Connection, dataclass_type: type, schema: Optional[str] = None) -> list[str]:
+    """
+    Agrega a una tabla existente las columnas de los campos que no tiene todavía.
+
+    ALTER TABLE agrega las columnas al final; como las consultas nombran las columnas
+    de los campos (ver `select_columns`), el orden físico de la tabla no importa.
+
+    También crea las columnas ocultas (ver `shadow_columns`) con su índice y calcula
+    las que falten, por ejemplo en filas escritas antes de que existieran, completa los
+    campos vacíos que tienen `insert_default` y crea los índices de las columnas por las
+    que se ordenan los resultados (ver `sort_columns`).
+
+    Returns:
+        list[str]: Nombres de las columnas agregadas.
+    """
+    prefix = f'"{schema}".' if schema else ""
+    table_name = dataclass_type.__name__
+    existing = {row[1] for row in conn.execute(f'PRAGMA {prefix}table_info("{table_name}");')}
+    added = []
+    for f in fields(dataclass_type):
+        if f.name not in existing:
+            conn.execute(
+                f'ALTER TABLE {prefix}"{table_name}" ADD COLUMN "{f.name}" {python_type_to_sqlite(f.type)};'
+            )
+            added.append(f.name)
+    for column, name in shadow_columns(dataclass_type):
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {prefix}"{table_name}" ADD COLUMN "{column}" TEXT;')
+            added.append(column)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {prefix}"ix_{table_name}_{column}" ON "{table_name}" ("{column}");')
+        missing = conn.execute(
+            f'SELECT rowid, "{name}" FROM {prefix}"{table_name}" WHERE "{column}" IS NULL AND "{name}" IS NOT NULL;'
+        ).fetchall()
+        conn.executemany(
+            f'UPDATE {prefix}"{table_name}" SET "{column}" = ? WHERE rowid = ?;',
+            [(_shadow_value(value), rowid) for rowid, value in missing],
+        )
+    for f in fields(dataclass_type):
+        # Las filas anteriores al campo (o escritas sin él) reciben el valor por defecto
+        default = f.metadata.get(INSERT_DEFAULT)
+        if default is not None:
+            conn.execute(
+                f'UPDATE {prefix}"{table_name}" SET "{f.name}" = ? WHERE "{f.name}" IS NULL;',
+                (to_sqlite_param(default()),),
+            )
+    for column in sort_columns(dataclass_type):
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {prefix}"ix_{table_name}_{column}" ON "{table_name}" ("{column}");')
+    # Versiones anteriores indexaban todos los campos visibles en la tabla
+    indexed = set(sort_columns(dataclass_type)) | {column for column, _ in shadow_columns(dataclass_type)}
+    for f in fields(dataclass_type):
+        if f.metadata.get(SHOWINTABLE) and f.name not in indexed:
+            conn.execute(f'DROP INDEX IF EXISTS {prefix}"ix_{table_name}_{f.name}";')
+    return added
+
+
 def make_database(instances:list):
     """
     Crea una base de datos SQLite a partir de un conjunto de clases dataclass, 
@@ -410,12 +935,17 @@ def make_database(instances:list):
         - Para cada clase en la lista:
             - Se genera la sentencia SQL de creación de tabla usando `create_table_sql(instance)`.
             - Se ejecuta la sentencia SQL para crear la tabla si no existe.
+            - Se agregan las columnas de los campos nuevos del modelo (ver `migrate_table`).
             - Si ocurre un error durante la creación de la tabla, imprime el error y la sentencia SQL fallida para ayudar en la depuración.
     """
-    
+    if _backend is not None:
+        # Con un servidor compartido, es el servidor quien crea las tablas
+        return
     for instance in instances:
         try:
-            execute(create_table_sql(instance))
+            with closing(connect()) as conn, conn:
+                conn.execute(create_table_sql(instance))
+                migrate_table(conn, instance)
         except Exception as e:
             print(f"{instance}: {e}")
 
@@ -0,0 +1,299 @@
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+import sqlite3
+from typing import Any, Optional
+
+from database import crud
+from database.models import InformacionGeneralPaciente
+from database.text import name_tokens, normalize_cedula
+
+TABLE = "ClaveDuplicado"
+
+THRESHOLD = 0.75
+""" Puntaje a partir del cual dos pacientes se consideran posibles duplicados """
+
+MAX_BLOCK = 200
+""" Bloques con más pacientes que este límite (nombres muy comunes) no se comparan """
+
+MIN_TOKEN = 3
+""" Longitud mínima de una palabra del nombre para usarla como clave """
+
+NAME_WEIGHT = 0.6
+BIRTH_WEIGHT = 0.25
+""" Peso de la fecha de nacimiento igual (el mismo año solo suma YEAR_WEIGHT) """
+YEAR_WEIGHT = 0.1
+CEDULA_WEIGHT = 0.15
+
+
+@dataclass
+class DuplicatePair:
+    """
+    Par de pacientes que probablemente son la misma persona.
+    """
+
+    paciente: int
+    duplicado: int
+    puntaje: float
+    """ 0 a 1; ver `score` """
+    motivos: list[str] = field(default_factory=list)
+    nombres: tuple[str, str] = ("", "")
+
+
+def blocking_keys(nombre_completo, cedula, fecha_nacimiento) -> set[str]:
+    """
+    Claves de bloqueo de un paciente. Solo se comparan pacientes que comparten al menos
+    una clave:
+
+    - "c:" cédula normalizada.
+    - "n:" cada palabra del nombre + fecha de nacimiento (tolera el orden de los apellidos
+      y los errores en las demás palabras).
+    - "p:" las dos primeras palabras del nombre en orden alfabético (tolera una fecha de
+      nacimiento mal escrita o ausente).
+
+    Con la fecha completa en "n:" los bloques son pequeños aun con nombres comunes.
+    """
+    keys = set()
+    cedula = normalize_cedula(cedula)
+    if cedula:
+        keys.add(f"c:{cedula}")
+    words = [w for w in name_tokens(nombre_completo) if len(w) >= MIN_TOKEN]
+    birth = crud.to_sqlite_param(fecha_nacimiento)
+    if isinstance(birth, int):
+        keys.update(f"n:{word}:{birth}" for word in words)
+    if len(words) >= 2:
+        keys.add("p:" + " ".join(sorted(words[:2])))
+    return keys
+
+
+def _keys_of(instance: Any) -> set[str]:
+    return blocking_keys(instance.nombre_completo, instance.cedula, instance.fecha_nacimiento)
+
+
+def score(a: tuple, b: tuple, threshold: float = 0.0) -> tuple[float, list[str]]:
+    """
+    Puntaje de similitud entre dos pacientes dados como (nombre, cédula, fecha AAAAMMDD).
+
+    Suma NAME_WEIGHT × similitud del nombre (con las palabras ordenadas), BIRTH_WEIGHT si
+    la fecha de nacimiento es igual (YEAR_WEIGHT si solo coincide el año) y CEDULA_WEIGHT
+    si la cédula es igual. Si ni con el nombre idéntico se alcanzaría `threshold`, no se
+    compara el nombre (que es lo costoso) y se devuelve lo acumulado.
+    """
+    reasons = []
+    total = 0.0
+    birth_a, birth_b = crud.to_sqlite_param(a[2]), crud.to_sqlite_param(b[2])
+    if isinstance(birth_a, int) and isinstance(birth_b, int):
+        if birth_a == birth_b:
+            total += BIRTH_WEIGHT
+            reasons.append("misma fecha de nacimiento")
+        elif birth_a // 10000 == birth_b // 10000:
+            total += YEAR_WEIGHT
+    cedula_a, cedula_b = normalize_cedula(a[1]), normalize_cedula(b[1])
+    if cedula_a and cedula_a == cedula_b:
+        total += CEDULA_WEIGHT
+        reasons.append("misma cédula")
+    if total + NAME_WEIGHT < threshold:
+        return round(total, 3), reasons
+    name_a = " ".join(sorted(name_tokens(a[0])))
+    name_b = " ".join(sorted(name_tokens(b[0])))
+    similarity = SequenceMatcher(None, name_a, name_b).ratio() if name_a and name_b else 0.0
+    total += NAME_WEIGHT * similarity
+    if similarity >= 0.85:
+        reasons.insert(0, "nombre similar" if similarity < 1 else "mismo nombre")
+    return round(total, 3), reasons
+
+
+def create_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{TABLE}" ("clave" TEXT NOT NULL, "paciente" INTEGER NOT NULL, '
+        'PRIMARY KEY ("clave", "paciente")) WITHOUT ROWID;'
+    )
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{TABLE}_paciente" ON "{TABLE}" ("paciente");')
+
+
+def _store_keys(conn: sqlite3.Connection, patient_id: int, keys: set[str]) -> None:
+    conn.execute(f'DELETE FROM "{TABLE}" WHERE "paciente" = ?;', (patient_id,))
+    conn.executemany(
+        f'INSERT OR IGNORE INTO "{TABLE}" VALUES (?, ?);', [(key, patient_id) for key in keys]
+    )
+
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """Recalcula las claves de todos los pacientes (para reparar)."""
+    conn.execute(f'DELETE FROM "{TABLE}";')
+    catch_up(conn)
+
+
+def catch_up(conn: sqlite3.Connection) -> None:
+    """
+    Calcula las claves de los pacientes que no tienen ninguna, por ejemplo los escritos
+    mientras el módulo no estaba activo.
+    """
+    table = InformacionGeneralPaciente.__name__
+    rows = conn.execute(
+        f'SELECT "id", "nombre_completo", "cedula", "fecha_nacimiento" FROM "{table}" '
+        f'WHERE "id" NOT IN (SELECT "paciente" FROM "{TABLE}");'
+    ).fetchall()
+    conn.executemany(
+        f'INSERT OR IGNORE INTO "{TABLE}" VALUES (?, ?);',
+        [(key, row[0]) for row in rows for key in blocking_keys(*row[1:])],
+    )
+
+
+def on_write(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    """Hook de crud: mantiene las claves de bloqueo de cada paciente."""
+    instance = new if new is not None else old
+    if not isinstance(instance, InformacionGeneralPaciente) or not instance.id:
+        return
+    if action == "delete":
+        conn.execute(f'DELETE FROM "{TABLE}" WHERE "paciente" = ?;', (instance.id,))
+    elif action == "insert" or _keys_of(old) != _keys_of(new):
+        _store_keys(conn, instance.id, _keys_of(new))
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Crea la tabla de claves, calcula las que falten y registra el hook en crud."""
+    conn = crud.connect(database)
+    try:
+        with conn:
+            create_table(conn)
+            catch_up(conn)
+    finally:
+        conn.close()
+    crud.register_write_hook(on_write)
+
+
+def disable() -> None:
+    crud.unregister_write_hook(on_write)
+
+
+def _load(conn: sqlite3.Connection, ids) -> dict[int, tuple]:
+    table = InformacionGeneralPaciente.__name__
+    result = {}
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start : start + 500]
+        for row in conn.execute(
+            f'SELECT "id", "nombre_completo", "cedula", "fecha_nacimiento" FROM "{table}" '
+            f'WHERE "id" IN ({", ".join("?" * len(chunk))});',
+            chunk,
+        ):
+            result[row[0]] = row[1:]
+    return result
+
+
+def _small_blocks(conn: sqlite3.Connection, keys: list[str]) -> list[str]:
+    if not keys:
+        return []
+    return [
+        key
+        for (key,) in conn.execute(
+            f'SELECT "clave" FROM "{TABLE}" WHERE "clave" IN ({", ".join("?" * len(keys))}) '
+            'GROUP BY "clave" HAVING count(*) <= ?;',
+            (*keys, MAX_BLOCK),
+        )
+    ]
+
+
+def candidates(
+    instance: Any, threshold: float = THRESHOLD, database: Optional[str] = None
+) -> list[DuplicatePair]:
+    """
+    Pacientes ya guardados que probablemente son el mismo que `instance` (aún sin guardar
+    o ya guardado), del más al menos probable. Usa el índice de claves: solo se leen y
+    comparan los pacientes de los mismos bloques.
+    """
+    if database is None and crud._backend is not None:
+        return crud._backend.duplicate_candidates(instance, threshold)
+    me = (instance.nombre_completo, instance.cedula, instance.fecha_nacimiento)
+    conn = crud.connect(database)
+    try:
+        keys = _small_blocks(conn, sorted(_keys_of(instance)))
+        if not keys:
+            return []
+        ids = {
+            row[0]
+            for row in conn.execute(
+                f'SELECT DISTINCT "paciente" FROM "{TABLE}" WHERE "clave" IN ({", ".join("?" * len(keys))});',
+                keys,
+            )
+        }
+        ids.discard(instance.id)
+        others = _load(conn, ids)
+    finally:
+        conn.close()
+    pairs = []
+    for other_id, other in others.items():
+        total, reasons = score(me, other, threshold)
+        if total >= threshold:
+            pairs.append(
+                DuplicatePair(instance.id or 0, other_id, total, reasons, (me[0] or "", other[0] or ""))
+            )
+    pairs.sort(key=lambda pair: -pair.puntaje)
+    return pairs
+
+
+def find_duplicates(
+    threshold: float = THRESHOLD, database: Optional[str] = None, limit: Optional[int] = None
+) -> list[DuplicatePair]:
+    """
+    Todos los pares de posibles duplicados de la base, del más al menos probable.
+    Solo se comparan los pares que comparten un bloque (de a lo sumo MAX_BLOCK pacientes).
+    """
+    if database is None and crud._backend is not None:
+        return crud._backend.find_duplicates(threshold, limit)
+    conn = crud.connect(database)
+    try:
+        with conn:
+            catch_up(conn)
+        pairs = conn.execute(
+            f'WITH bloque AS (SELECT "clave" FROM "{TABLE}" GROUP BY "clave" '
+            "HAVING count(*) BETWEEN 2 AND ?) "
+            f'SELECT DISTINCT a."paciente", b."paciente" FROM bloque JOIN "{TABLE}" a USING ("clave") '
+            f'JOIN "{TABLE}" b ON b."clave" = a."clave" AND b."paciente" > a."paciente";',
+            (MAX_BLOCK,),
+        ).fetchall()
+        patients = _load(conn, {pid for pair in pairs for pid in pair})
+    finally:
+        conn.close()
+    result = []
+    for a, b in pairs:
+        if a not in patients or b not in patients:
+            continue
+        total, reasons = score(patients[a], patients[b], threshold)
+        if total >= threshold:
+            result.append(
+                DuplicatePair(a, b, total, reasons, (patients[a][0] or "", patients[b][0] or ""))
+            )
+    result.sort(key=lambda pair: (-pair.puntaje, pair.paciente, pair.duplicado))
+    return result[:limit] if limit else result
+
+
+def to_rows(pairs: list[DuplicatePair]) -> list[list]:
+    return [[p.paciente, p.duplicado, p.puntaje, p.motivos, list(p.nombres)] for p in pairs]
+
+
+def from_rows(rows: list[list]) -> list[DuplicatePair]:
+    return [DuplicatePair(a, b, s, m, tuple(n)) for a, b, s, m, n in rows]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Busca pacientes duplicados.")
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--rebuild", action="store_true", help="recalcula las claves de bloqueo")
+    args = parser.parse_args()
+
+    conn = crud.connect(args.database)
+    with conn:
+        create_table(conn)
+        if args.rebuild:
+            rebuild(conn)
+    conn.close()
+    for pair in find_duplicates(args.threshold, args.database, args.limit):
+        print(
+            f"{pair.puntaje:.2f}  #{pair.paciente} {pair.nombres[0]!r} ~ #{pair.duplicado} "
+            f"{pair.nombres[1]!r}  ({', '.join(pair.motivos)})"
+        )
@@ -0,0 +1,134 @@
+from dataclasses import Field, fields
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from database import crud
+from internal import DERIVED
+
+CHUNK_SIZE = 50_000
+""" Filas recalculadas (y confirmadas) por cada transacción del proceso por lotes """
+
+
+def age(fecha_nacimiento):
+    """Edad en años cumplidos a partir de la fecha de nacimiento (AAAAMMDD)."""
+    today = date.today()
+    birth = np.asarray(fecha_nacimiento, dtype=np.float64)
+    years = np.floor((today.year * 10000 + today.month * 100 + today.day - birth) / 10000)
+    return np.where(years >= 0, years, np.nan)
+
+
+def bmi(peso, talla):
+    """Índice de masa corporal; la talla se acepta en metros o en centímetros."""
+    weight = np.asarray(peso, dtype=np.float64)
+    height = np.asarray(talla, dtype=np.float64)
+    height = np.where(height > 3, height / 100, height)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = np.round(weight / (height * height), 1)
+    return np.where((weight > 0) & (height > 0), value, np.nan)
+
+
+def derived_fields(dataclass_type: type) -> list[Field]:
+    return [f for f in fields(dataclass_type) if f.metadata.get(DERIVED) is not None]
+
+
+def _numeric(column: str) -> str:
+    return f"""CASE WHEN typeof("{column}") IN ('integer', 'real') THEN "{column}" END"""
+
+
+def recompute(
+    dataclass_type: type, database: Optional[str] = None, chunk_size: int = CHUNK_SIZE
+) -> int:
+    """
+    Recalcula los campos derivados de toda la tabla.
+
+    Explicación:
+    -----------------------------------------
+    - Las filas se leen por bloques de `chunk_size` en orden de rowid (paginación por
+      clave, sin OFFSET) como arreglos NumPy, y cada `Derived.compute` se evalúa sobre
+      el bloque completo.
+    - Solo se escriben las filas cuyo valor cambió, con un `executemany` por bloque en
+      una sola transacción.
+    - Si faltan las fuentes de un campo se conserva el valor actual.
+    - La escritura es directa en SQL: no pasa por los hooks de crud (auditoría, etc.).
+
+    Returns:
+        int: Cantidad de filas actualizadas.
+    """
+    targets = derived_fields(dataclass_type)
+    if not targets:
+        return 0
+    table = dataclass_type.__name__
+    sources = sorted({name for f in targets for name in f.metadata[DERIVED].sources})
+    columns = [*sources, *(f.name for f in targets)]
+    select = (
+        f'SELECT rowid, {", ".join(_numeric(c) for c in columns)} FROM "{table}" '
+        "WHERE rowid > ? ORDER BY rowid LIMIT ?;"
+    )
+    update = (
+        f'UPDATE "{table}" SET '
+        f'{", ".join(f""""{f.name}" = COALESCE(?, "{f.name}")""" for f in targets)} WHERE rowid = ?;'
+    )
+    integer = [f.type in (int, Optional[int]) for f in targets]
+
+    updated = 0
+    last = -(2**63)
+    conn = crud.connect(database)
+    try:
+        while True:
+            rows = conn.execute(select, (last, chunk_size)).fetchall()
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            last = ids[-1]
+            data = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), -1)
+            values = {name: data[:, i] for i, name in enumerate(sources)}
+            current = data[:, len(sources) :]
+            computed = np.column_stack(
+                [
+                    np.broadcast_to(
+                        f.metadata[DERIVED].compute(*(values[name] for name in f.metadata[DERIVED].sources)),
+                        len(rows),
+                    )
+                    for f in targets
+                ]
+            )
+            # NaN = no se puede calcular: se envía NULL y COALESCE conserva el valor actual
+            same = (computed == current) | np.isnan(computed)
+            changed = np.flatnonzero(~same.all(axis=1))
+            if not len(changed):
+                continue
+            params = []
+            for index in changed.tolist():
+                row = []
+                for value, is_int in zip(computed[index].tolist(), integer):
+                    if value != value:
+                        row.append(None)
+                    else:
+                        row.append(int(value) if is_int else value)
+                row.append(ids[index])
+                params.append(row)
+            with conn:
+                conn.executemany(update, params)
+            updated += len(params)
+    finally:
+        conn.close()
+    return updated
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from database import models
+
+    parser = argparse.ArgumentParser(description="Recalcula los campos derivados (para ejecutar cada noche).")
+    parser.add_argument("--model", default="InformacionGeneralPaciente")
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = recompute(getattr(models, args.model), args.database, args.chunk_size)
+    print(f"{count} registros actualizados en {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,213 @@
+from dataclasses import fields
+from datetime import date
+import json
+import os
+import sqlite3
+from typing import Any, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+from database import codec, crud, models
+from internal import CONTROL, LISTMODEL, InputWidgetType
+
+MODELS = [models.MedicalConsultation, models.InformacionGeneralPaciente]
+""" Tablas que se exportan por defecto """
+
+EXPORT_DIRECTORY = "exports"
+
+ROW_GROUP_SIZE = 65_536
+""" Filas que se leen de SQLite y se escriben por cada grupo de filas (row group) """
+
+COMPRESSION = "zstd"
+
+FORMATS = ("parquet", "arrow")
+""" Parquet para guardar y compartir; Arrow IPC (Feather v2) para abrir con memory-map """
+
+
+def exported_fields(dataclass_type: type) -> list:
+    """Campos con datos: se excluyen los separadores visuales."""
+    return [f for f in fields(dataclass_type) if f.metadata.get(CONTROL) != InputWidgetType.SEP]
+
+
+def arrow_type(f) -> pa.DataType:
+    """
+    Tipo Arrow de un campo según su tipo Python: fechas como date32, decimales como
+    float64 y las listas de `flagsv2(model=...)` como listas de structs con los campos
+    del modelo.
+    """
+    model = f.metadata.get(LISTMODEL)
+    if model is not None:
+        return pa.list_(pa.struct([pa.field(g.name, arrow_type(g)) for g in exported_fields(model)]))
+    sqlite_type = crud.python_type_to_sqlite(f.type)
+    if f.type in (date, Optional[date]):
+        return pa.date32()
+    if sqlite_type == "INTEGER":
+        return pa.int64()
+    if sqlite_type == "REAL":
+        return pa.float64()
+    return pa.string()
+
+
+def schema(dataclass_type: type) -> pa.Schema:
+    return pa.schema(
+        [pa.field(f.name, arrow_type(f)) for f in exported_fields(dataclass_type)],
+        metadata={"model": dataclass_type.__name__},
+    )
+
+
+def _dates(values: list) -> pa.Array:
+    """
+    Convierte fechas AAAAMMDD (enteros, como las guarda crud) a date32 de forma
+    vectorizada. Los valores vacíos o que no son una fecha válida quedan nulos.
+    """
+    raw = np.array(
+        [v if isinstance(v, int) else int(v) if isinstance(v, str) and v.isdigit() else 0 for v in values],
+        dtype=np.int64,
+    )
+    year, month, day = raw // 10000, raw // 100 % 100, raw % 100
+    valid = (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + np.where(valid, day - 1, 0)
+    # 31 de febrero se convertiría en marzo: se descarta si cambia de mes
+    valid &= days.astype("datetime64[M]") == months
+    return pa.array(days.astype(np.int64).astype(np.int32), type=pa.date32(), mask=~valid)
+
+
+def _struct_value(model_fields: list, item: Any) -> Optional[dict]:
+    if not isinstance(item, dict):
+        return None
+    result = {}
+    for f in model_fields:
+        value = item.get(f.name)
+        if f.type in (date, Optional[date]):
+            value = str(value) if value is not None else ""
+            try:
+                value = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+            except ValueError:
+                value = None
+        result[f.name] = value
+    return result
+
+
+def _lists(f, values: list) -> pa.Array:
+    model_fields = exported_fields(f.metadata[LISTMODEL])
+    result = []
+    for value in values:
+        value = codec.decode(value)
+        try:
+            items = json.loads(value) if value else []
+        except ValueError:
+            items = []
+        result.append([_struct_value(model_fields, item) for item in items] if isinstance(items, list) else [])
+    return pa.array(result, type=arrow_type(f))
+
+
+def _column(f, values: list) -> pa.Array:
+    kind = arrow_type(f)
+    if kind == pa.date32():
+        return _dates(values)
+    if pa.types.is_list(kind):
+        return _lists(f, values)
+    if kind == pa.string():
+        return pa.array([None if v is None else str(codec.decode(v)) for v in values], type=kind)
+    return pa.array(values, type=kind, from_pandas=True)
+
+
+def to_batch(dataclass_type: type, rows: list[tuple]) -> pa.RecordBatch:
+    """Convierte filas de SQLite (en el orden de `exported_fields`) en un RecordBatch."""
+    target = schema(dataclass_type)
+    columns = list(zip(*rows)) if rows else [()] * len(target)
+    return pa.RecordBatch.from_arrays(
+        [_column(f, list(values)) for f, values in zip(exported_fields(dataclass_type), columns)],
+        schema=target,
+    )
+
+
+def _open_writer(path: str, target: pa.Schema, format: str):
+    if format == "parquet":
+        return pq.ParquetWriter(path, target, compression=COMPRESSION)
+    if format == "arrow":
+        return pa.ipc.new_file(path, target, options=pa.ipc.IpcWriteOptions(compression=COMPRESSION))
+    raise ValueError(f"Formato de exportación desconocido: {format}")
+
+
+def export_table(
+    dataclass_type: type,
+    path: str,
+    conn: sqlite3.Connection,
+    format: str = "parquet",
+    row_group_size: int = ROW_GROUP_SIZE,
+) -> int:
+    """
+    Escribe la tabla del modelo en `path` en formato columnar y devuelve las filas
+    escritas. Las filas se leen de SQLite por bloques de `row_group_size` y cada bloque
+    se escribe como un grupo de filas, de modo que la memoria no depende del tamaño de
+    la tabla.
+    """
+    target = schema(dataclass_type)
+    columns = ", ".join(f'"{f.name}"' for f in exported_fields(dataclass_type))
+    cursor = conn.execute(f'SELECT {columns} FROM "{dataclass_type.__name__}";')
+    total = 0
+    tmp = path + ".tmp"
+    writer = _open_writer(tmp, target, format)
+    try:
+        while rows := cursor.fetchmany(row_group_size):
+            batch = to_batch(dataclass_type, rows)
+            if format == "parquet":
+                writer.write_batch(batch, row_group_size=row_group_size)
+            else:
+                writer.write_batch(batch)
+            total += len(rows)
+    finally:
+        writer.close()
+    os.replace(tmp, path)
+    return total
+
+
+def export(
+    directory: str = EXPORT_DIRECTORY,
+    dataclass_types: Optional[list[type]] = None,
+    database: Optional[str] = None,
+    format: str = "parquet",
+) -> dict[str, int]:
+    """
+    Exporta una instantánea de cada tabla a `directory`/<Modelo>.<format> y devuelve las
+    filas escritas por archivo. Todas las tablas se leen en la misma transacción, así
+    que la instantánea es consistente aunque se siga escribiendo en la base de datos.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Formato de exportación desconocido: {format}")
+    os.makedirs(directory, exist_ok=True)
+    conn = crud.connect(database)
+    result = {}
+    try:
+        conn.execute("BEGIN;")
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+        for dataclass_type in dataclass_types or MODELS:
+            if dataclass_type.__name__ not in existing:
+                continue
+            path = os.path.join(directory, f"{dataclass_type.__name__}.{format}")
+            result[path] = export_table(dataclass_type, path, conn, format)
+        conn.rollback()
+    finally:
+        conn.close()
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Exporta las tablas a Parquet o Arrow para análisis.")
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--directory", default=EXPORT_DIRECTORY)
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for path, rows in export(args.directory, database=args.database, format=args.format).items():
+        print(f"{path}: {rows} filas, {os.path.getsize(path) / 2**20:.1f} MB")
+    print(f"{time.perf_counter() - start:.1f} s")
@@ -0,0 +1,251 @@
+from collections import Counter
+import sqlite3
+from typing import Any, Callable, Optional
+
+from database import crud
+from database.models import InformacionGeneralPaciente
+from database.text import normalize_name
+
+TABLE = "TrigramaNombre"
+FREQUENCY_TABLE = "TrigramaFrecuencia"
+INDEXED_TABLE = "TrigramaPaciente"
+
+FIELD = "nombre_completo"
+""" Campo de InformacionGeneralPaciente indexado por trigramas """
+
+TOP_K = 20
+""" Resultados que devuelve la búsqueda aproximada """
+
+MIN_SIMILARITY = 0.3
+""" Similitud mínima (Jaccard de trigramas, 0 a 1) para incluir un resultado """
+
+CANDIDATES = 200
+""" Pacientes que se leen y se ordenan con la similitud exacta """
+
+MAX_POSTINGS = 100_000
+""" Filas del índice que se leen como máximo por búsqueda (se usan primero los trigramas menos frecuentes) """
+
+_ALPHABET = {c: i for i, c in enumerate(" 0123456789abcdefghijklmnopqrstuvwxyz")}
+
+
+def trigrams(value) -> set[int]:
+    """
+    Trigramas del nombre normalizado, codificados como enteros (base 37).
+    Cada palabra se rellena como en pg_trgm ("  jose "), de modo que el inicio de las
+    palabras pesa más que el final.
+    """
+    result = set()
+    size = len(_ALPHABET)
+    for word in normalize_name(value).split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            a, b, c = padded[i : i + 3]
+            result.add((_ALPHABET[a] * size + _ALPHABET[b]) * size + _ALPHABET[c])
+    return result
+
+
+def similarity(a: set[int], b: set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def is_indexed(dataclass_type: type) -> bool:
+    return dataclass_type is InformacionGeneralPaciente
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{TABLE}" ("trigrama" INTEGER NOT NULL, "paciente" INTEGER NOT NULL, '
+        'PRIMARY KEY ("trigrama", "paciente")) WITHOUT ROWID;'
+    )
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{FREQUENCY_TABLE}" ("trigrama" INTEGER PRIMARY KEY, "n" INTEGER NOT NULL);'
+    )
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{INDEXED_TABLE}" ("paciente" INTEGER PRIMARY KEY);')
+
+
+def _add(conn: sqlite3.Connection, entries: list[tuple[int, Any]]) -> None:
+    postings = [(t, patient_id) for patient_id, name in entries for t in trigrams(name)]
+    frequency = Counter(t for t, _ in postings)
+    conn.executemany(f'INSERT OR IGNORE INTO "{TABLE}" VALUES (?, ?);', postings)
+    conn.executemany(
+        f'INSERT INTO "{FREQUENCY_TABLE}" VALUES (?, ?) ON CONFLICT DO UPDATE SET "n" = "n" + excluded."n";',
+        frequency.items(),
+    )
+    conn.executemany(
+        f'INSERT OR IGNORE INTO "{INDEXED_TABLE}" VALUES (?);', [(patient_id,) for patient_id, _ in entries]
+    )
+
+
+def _remove(conn: sqlite3.Connection, patient_id: int, name) -> None:
+    grams = trigrams(name)
+    conn.executemany(
+        f'DELETE FROM "{TABLE}" WHERE "trigrama" = ? AND "paciente" = ?;', [(t, patient_id) for t in grams]
+    )
+    conn.executemany(f'UPDATE "{FREQUENCY_TABLE}" SET "n" = "n" - 1 WHERE "trigrama" = ?;', [(t,) for t in grams])
+    conn.execute(f'DELETE FROM "{INDEXED_TABLE}" WHERE "paciente" = ?;', (patient_id,))
+
+
+def on_write(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    """Hook de crud: mantiene el índice de trigramas de FIELD."""
+    instance = new if new is not None else old
+    if not isinstance(instance, InformacionGeneralPaciente) or not instance.id:
+        return
+    if action == "update" and normalize_name(getattr(old, FIELD)) == normalize_name(getattr(new, FIELD)):
+        return
+    if action in ("update", "delete"):
+        _remove(conn, instance.id, getattr(old, FIELD))
+    if action in ("insert", "update"):
+        _add(conn, [(new.id, getattr(new, FIELD))])
+
+
+def catch_up(conn: sqlite3.Connection, chunk_size: int = 50_000) -> int:
+    """
+    Indexa los pacientes que no están en el índice (por ejemplo los escritos mientras
+    el módulo no estaba activo).
+    """
+    table = InformacionGeneralPaciente.__name__
+    rows = conn.execute(
+        f'SELECT "id", "{FIELD}" FROM "{table}" '
+        f'WHERE "id" NOT IN (SELECT "paciente" FROM "{INDEXED_TABLE}");'
+    ).fetchall()
+    for start in range(0, len(rows), chunk_size):
+        _add(conn, rows[start : start + chunk_size])
+    return len(rows)
+
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    for name in (TABLE, FREQUENCY_TABLE, INDEXED_TABLE):
+        conn.execute(f'DELETE FROM "{name}";')
+    catch_up(conn)
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Crea el índice, indexa los pacientes que falten y registra el hook en crud."""
+    conn = crud.connect(database)
+    try:
+        with conn:
+            create_tables(conn)
+            catch_up(conn)
+    finally:
+        conn.close()
+    crud.register_write_hook(on_write)
+
+
+def disable() -> None:
+    crud.unregister_write_hook(on_write)
+
+
+def search(
+    text: str,
+    callback: Callable[[Any], None],
+    limit: int = TOP_K,
+    min_similarity: float = MIN_SIMILARITY,
+    database: Optional[str] = None,
+) -> list[float]:
+    """
+    Búsqueda aproximada por nombre: llama a `callback` con los `limit` pacientes cuyo
+    nombre más se parece a `text`, del más al menos parecido, y devuelve sus similitudes.
+
+    Explicación:
+    -----------------------------------------
+    - Se leen las listas del índice de los trigramas de `text`, empezando por los menos
+      frecuentes, hasta MAX_POSTINGS filas (o antes, si con la mitad de los trigramas ya
+      hay candidatos); así un trigrama muy común ("ez ") no obliga a recorrer medio
+      índice, y uno que no existe (un error de escritura) no cuesta nada.
+    - SQLite cuenta los trigramas compartidos por paciente y devuelve los CANDIDATES
+      con más coincidencias; solo estos se leen y se ordenan por similitud exacta.
+    """
+    if database is None and crud._backend is not None:
+        return crud._backend.fuzzy_search(text, callback, limit, min_similarity)
+    query = trigrams(text)
+    if not query:
+        return []
+    conn = crud.connect(database)
+    try:
+        marks = ", ".join("?" * len(query))
+        frequencies = sorted(
+            conn.execute(
+                f'SELECT "trigrama", "n" FROM "{FREQUENCY_TABLE}" WHERE "trigrama" IN ({marks}) AND "n" > 0;',
+                list(query),
+            ),
+            key=lambda row: row[1],
+        )
+        chosen = []
+        postings = 0
+        for trigram, n in frequencies:
+            if chosen and postings + n > MAX_POSTINGS:
+                break
+            if len(chosen) >= len(frequencies) // 2 and n > postings:
+                # con la mitad de los trigramas ya hay candidatos; este duplicaría el trabajo
+                break
+            chosen.append(trigram)
+            postings += n
+        if not chosen:
+            return []
+        ids = [
+            row[0]
+            for row in conn.execute(
+                f'SELECT "paciente" FROM "{TABLE}" WHERE "trigrama" IN ({", ".join("?" * len(chosen))}) '
+                'GROUP BY "paciente" ORDER BY count(*) DESC LIMIT ?;',
+                (*chosen, CANDIDATES),
+            )
+        ]
+        table = InformacionGeneralPaciente.__name__
+        names = conn.execute(
+            f'SELECT "id", "{FIELD}" FROM "{table}" WHERE "id" IN ({", ".join("?" * len(ids))});',
+            ids,
+        ).fetchall()
+        ranked = sorted(
+            ((similarity(query, trigrams(name)), patient_id) for patient_id, name in names),
+            key=lambda item: -item[0],
+        )
+        ranked = [(score, patient_id) for score, patient_id in ranked if score >= min_similarity][:limit]
+        if not ranked:
+            return []
+        found: dict[int, Any] = {}
+        crud.execute_select(
+            InformacionGeneralPaciente,
+            f'SELECT {crud.select_columns(InformacionGeneralPaciente)} FROM "{table}" WHERE "id" IN ({", ".join("?" * len(ranked))});',
+            lambda patient: found.__setitem__(patient.id, patient),
+            [patient_id for _, patient_id in ranked],
+            conn,
+        )
+    finally:
+        conn.close()
+    scores = []
+    for score, patient_id in ranked:
+        if patient_id in found:
+            callback(found[patient_id])
+            scores.append(round(score, 3))
+    return scores
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Búsqueda aproximada de pacientes por nombre.")
+    parser.add_argument("nombre")
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--limit", type=int, default=TOP_K)
+    parser.add_argument("--rebuild", action="store_true", help="reconstruye el índice de trigramas")
+    args = parser.parse_args()
+
+    conn = crud.connect(args.database)
+    with conn:
+        create_tables(conn)
+        if args.rebuild:
+            rebuild(conn)
+        else:
+            catch_up(conn)
+    conn.close()
+    start = time.perf_counter()
+    patients: list = []
+    scores = search(args.nombre, patients.append, args.limit, database=args.database)
+    elapsed = time.perf_counter() - start
+    for patient, score in zip(patients, scores):
+        print(f"{score:.2f}  #{patient.id} {patient.nombre_completo}")
+    print(f"{elapsed * 1000:.1f} ms")
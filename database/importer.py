@@ -0,0 +1,343 @@
+import csv
+from dataclasses import dataclass, fields, is_dataclass
+from datetime import date, datetime
+import json
+import os
+import sqlite3
+import unicodedata
+from typing import Any, Iterator, Optional
+
+from database import crud
+from internal import (
+    CONTROL,
+    ITEMS,
+    LISTMODEL,
+    REQUIRED,
+    SQLITE_FLAGS,
+    TITLE,
+    InputWidgetType,
+    SQLiteFieldConstraint,
+    is_empty_or_whitespace,
+)
+
+DATE_FORMATS = ("%Y%m%d", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y")
+""" Formatos de fecha aceptados en los archivos de origen """
+
+TABLE = "ProgresoImportacion"
+""" Avance de cada archivo importado, guardado con cada lote (ver `import_file`) """
+
+
+@dataclass
+class ImportResult:
+    """
+    Resumen de una importación.
+    """
+
+    processed: int = 0
+    inserted: int = 0
+    rejected: int = 0
+
+
+def _normalize_header(text: str) -> str:
+    """Normaliza un encabezado o título: sin acentos, minúsculas y sin signos."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return "_".join("".join(c if c.isalnum() else " " for c in text).split())
+
+
+def importable_fields(dataclass_type: type) -> list:
+    """
+    Devuelve los campos del modelo que pueden cargarse desde un archivo externo.
+    Se excluyen los separadores visuales y las columnas AUTOINCREMENT.
+    """
+    result = []
+    for f in fields(dataclass_type):
+        if f.metadata.get(CONTROL) in (InputWidgetType.SEP, InputWidgetType.NONE):
+            continue
+        if SQLiteFieldConstraint.AUTOINCREMENT in f.metadata[SQLITE_FLAGS]:
+            continue
+        result.append(f)
+    return result
+
+
+def column_mapping(dataclass_type: type, headers: list[str]) -> dict[str, Any]:
+    """
+    Asocia los encabezados del archivo con los campos del modelo.
+
+    Un encabezado coincide con un campo si es igual (ignorando mayúsculas, acentos
+    y signos) a su nombre o a su título en los metadatos (`flags(title=...)`).
+    Los encabezados sin coincidencia se ignoran.
+    """
+    by_key = {}
+    for f in importable_fields(dataclass_type):
+        by_key.setdefault(_normalize_header(f.name), f)
+        if f.metadata.get(TITLE):
+            by_key.setdefault(_normalize_header(f.metadata[TITLE]), f)
+    return {h: by_key[_normalize_header(h)] for h in headers if _normalize_header(h) in by_key}
+
+
+def _parse_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    if isinstance(value, int):
+        value = str(value)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"fecha no válida '{value}'")
+
+
+def convert_value(f, value):
+    """
+    Convierte un valor leído del archivo al tipo Python declarado en el campo.
+
+    Raises:
+        ValueError: Si el valor no puede convertirse o no pertenece a los ITEMS del campo.
+    """
+    if value is None or (isinstance(value, str) and is_empty_or_whitespace(value)):
+        return None
+    ftype = f.type
+    try:
+        if ftype == int or ftype == Optional[int]:
+            return int(float(value)) if isinstance(value, str) else int(value)
+        if ftype == float or ftype == Optional[float]:
+            return float(str(value).replace(",", ".")) if isinstance(value, str) else float(value)
+        if ftype == date or ftype == Optional[date]:
+            return _parse_date(value)
+        if ftype == list or getattr(ftype, "__origin__", None) == list:
+            items = json.loads(value, object_hook=crud._json_object_hook_with_date) if isinstance(value, str) else value
+            if not isinstance(items, list):
+                raise ValueError("se esperaba una lista JSON")
+            model_type = f.metadata.get(LISTMODEL, None)
+            if model_type is not None:
+                items = [model_type(**item) if isinstance(item, dict) else item for item in items]
+            return items
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"{f.name}: {e}")
+    except ValueError as e:
+        raise ValueError(f"{f.name}: {e}")
+
+    value = str(value).strip()
+    allowed = f.metadata.get(ITEMS)
+    if f.metadata.get(CONTROL) == InputWidgetType.COMBO and allowed:
+        matches = [item for item in allowed if _normalize_header(item) == _normalize_header(value)]
+        if not matches:
+            raise ValueError(f"{f.name}: '{value}' no es una opción válida ({', '.join(allowed)})")
+        value = matches[0]
+    return value
+
+
+def build_instance(dataclass_type: type, record: dict, mapping: dict[str, Any]):
+    """
+    Construye una instancia del modelo a partir de un registro del archivo y valida
+    los campos marcados como requeridos.
+
+    Raises:
+        ValueError: Con la lista de problemas encontrados en el registro.
+    """
+    instance = dataclass_type()
+    problems = []
+    invalid = set()
+    for header, f in mapping.items():
+        try:
+            setattr(instance, f.name, convert_value(f, record.get(header)))
+        except ValueError as e:
+            problems.append(str(e))
+            invalid.add(f.name)
+    for f in importable_fields(dataclass_type):
+        if f.name in invalid:
+            continue
+        if f.metadata.get(REQUIRED) and getattr(instance, f.name) in (None, "", []):
+            problems.append(f"{f.name}: campo requerido vacío")
+    if problems:
+        raise ValueError("; ".join(problems))
+    return instance
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """Lee un archivo CSV o JSONL registro por registro, sin cargarlo completo en memoria."""
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as stream:
+            for line in stream:
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        record = {"__error__": f"JSON no válido: {e}", "__line__": line.rstrip("\n")}
+                    yield record if isinstance(record, dict) else {"__error__": "se esperaba un objeto JSON"}
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as stream:
+            yield from csv.DictReader(stream)
+
+
+def create_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{TABLE}" ("origen" TEXT NOT NULL PRIMARY KEY, "posicion" INTEGER NOT NULL, '
+        '"insertados" INTEGER NOT NULL, "rechazados" INTEGER NOT NULL, "cuarentena" INTEGER NOT NULL);'
+    )
+
+
+def _read_progress(conn: sqlite3.Connection, source: str) -> Optional[tuple[int, int, int, int]]:
+    """(posición, insertados, rechazados, tamaño de la cuarentena) del último lote confirmado."""
+    row = conn.execute(
+        f'SELECT "posicion", "insertados", "rechazados", "cuarentena" FROM "{TABLE}" WHERE "origen" = ?;',
+        (source,),
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+def import_file(
+    dataclass_type: type,
+    path: str,
+    quarantine_path: Optional[str] = None,
+    batch_size: int = 5000,
+    database: Optional[str] = None,
+    restart: bool = False,
+) -> ImportResult:
+    """
+    Importa registros desde un archivo CSV o JSONL a la tabla del modelo.
+
+    Explicación:
+    -----------------------------------------
+    - El archivo se procesa en streaming; nunca se carga completo en memoria.
+    - Las columnas se asocian a los campos por nombre o por título (ver `column_mapping`).
+    - Cada registro se valida (tipos, opciones de COMBO y campos requeridos). Los registros
+      rechazados se escriben en el archivo de cuarentena (JSONL) junto con el motivo, en
+      lugar de abortar la importación.
+    - Los registros válidos se insertan con `crud.insert` en transacciones de `batch_size`
+      filas, así que los hooks de crud activos (auditoría, índices de búsqueda, cohortes,
+      carga por profesional...) quedan al día en la misma transacción.
+    - La posición alcanzada se guarda en la tabla ProgresoImportacion dentro de esa
+      transacción, así que un lote y su avance se confirman juntos o no se confirman: si
+      el proceso se interrumpe, una nueva llamada con el mismo archivo continúa desde el
+      último lote confirmado sin repetir filas.
+    - Los rechazados de un lote se escriben en la cuarentena antes del COMMIT y el avance
+      guarda el tamaño del archivo; al reanudar se descartan las líneas de un lote que no
+      llegó a confirmarse.
+
+    Args:
+        dataclass_type: Modelo destino (por ejemplo InformacionGeneralPaciente).
+        path: Archivo de origen (.csv, .jsonl o .ndjson).
+        quarantine_path: Archivo de cuarentena, por defecto `<path>.rejected.jsonl`.
+        batch_size: Cantidad de registros por transacción.
+        database: Ruta de la base de datos, por defecto `crud.DATABASE`.
+        restart: Descarta el avance guardado e importa el archivo desde el principio.
+
+    Returns:
+        ImportResult: Totales acumulados de la importación (incluye ejecuciones anteriores reanudadas).
+    """
+    if not is_dataclass(dataclass_type):
+        raise ValueError("dataclass_type must be a dataclass.")
+    if batch_size <= 0:
+        raise ValueError("batch_size debe ser mayor que cero.")
+
+    source = os.path.abspath(path)
+    quarantine_path = quarantine_path or path + ".rejected.jsonl"
+
+    conn = crud.connect(database)
+    with conn:
+        conn.execute(crud.create_table_sql(dataclass_type))
+        # Una base anterior puede no tener las columnas nuevas (p. ej. las normalizadas)
+        crud.migrate_table(conn, dataclass_type)
+        create_table(conn)
+        if restart:
+            conn.execute(f'DELETE FROM "{TABLE}" WHERE "origen" = ?;', (source,))
+    progress = _read_progress(conn, source)
+    if progress is None:
+        existing = os.path.getsize(quarantine_path) if os.path.exists(quarantine_path) else 0
+        progress = (0, 0, 0, existing)
+    start, inserted, rejected_count, quarantine_size = progress
+    if os.path.exists(quarantine_path) and os.path.getsize(quarantine_path) > quarantine_size:
+        # Rechazados de un lote que no llegó al COMMIT: se vuelven a procesar
+        os.truncate(quarantine_path, quarantine_size)
+    result = ImportResult(start, inserted, rejected_count)
+
+    mapping: dict[str, Any] = {}
+    seen_headers: set[str] = set()
+    batch: list = []
+    rejected: list[dict] = []
+
+    def flush():
+        nonlocal quarantine_size
+        if rejected:
+            with open(quarantine_path, "a", encoding="utf-8") as quarantine:
+                for item in rejected:
+                    quarantine.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+                quarantine.flush()
+                os.fsync(quarantine.fileno())
+            quarantine_size = os.path.getsize(quarantine_path)
+        try:
+            with conn:
+                for instance in batch:
+                    crud.insert(instance, conn)
+                crud.flush(conn)
+                conn.execute(
+                    f'INSERT OR REPLACE INTO "{TABLE}" VALUES (?, ?, ?, ?, ?);',
+                    (
+                        source,
+                        result.processed,
+                        result.inserted + len(batch),
+                        result.rejected + len(rejected),
+                        quarantine_size,
+                    ),
+                )
+        except Exception:
+            crud.discard(conn)
+            raise
+        result.inserted += len(batch)
+        result.rejected += len(rejected)
+        batch.clear()
+        rejected.clear()
+
+    try:
+        for position, record in enumerate(read_records(path)):
+            if position < start:
+                continue
+            result.processed += 1
+            try:
+                if "__error__" in record:
+                    raise ValueError(record["__error__"])
+                new_headers = [h for h in record if h not in seen_headers]
+                if new_headers:
+                    # JSONL puede traer claves distintas en cada línea
+                    mapping.update(column_mapping(dataclass_type, new_headers))
+                    seen_headers.update(new_headers)
+                batch.append(build_instance(dataclass_type, record, mapping))
+            except ValueError as e:
+                rejected.append({"record": position + 1, "reason": str(e), "data": record})
+            if len(batch) + len(rejected) >= batch_size:
+                flush()
+        flush()
+    finally:
+        conn.close()
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import audit, cohort, dedup, fuzzy, models, phonetic, recent, summary, vitals, workload
+
+    parser = argparse.ArgumentParser(description="Importa pacientes u otros modelos desde CSV/JSONL.")
+    parser.add_argument("model", help="Nombre del modelo, por ejemplo InformacionGeneralPaciente")
+    parser.add_argument("path", help="Archivo .csv o .jsonl de origen")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--quarantine", default=None)
+    parser.add_argument("--restart", action="store_true", help="ignora el avance guardado y empieza de nuevo")
+    parser.add_argument("--database", default=None)
+    args = parser.parse_args()
+
+    # Los mismos hooks que activa la aplicación, para que lo importado quede auditado e indexado
+    for module in (audit, vitals, summary, dedup, fuzzy, phonetic, cohort, workload, recent):
+        module.enable(args.database)
+    totals = import_file(
+        getattr(models, args.model),
+        args.path,
+        quarantine_path=args.quarantine,
+        batch_size=args.batch_size,
+        database=args.database,
+        restart=args.restart,
+    )
+    print(f"procesados={totals.processed} insertados={totals.inserted} rechazados={totals.rejected}")
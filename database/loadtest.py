@@ -0,0 +1,331 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field, fields
+from datetime import date, timedelta
+import copy
+import multiprocessing
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from database import crud, query
+from database.client import CrudClient
+from database.models import InformacionGeneralPaciente, PlanManejo, Seguimiento
+from internal import CONTROL, SEARCHABLE, InputWidgetType
+
+WORKLOAD = {"search": 50, "detail": 25, "insert": 15, "update": 10}
+""" Mezcla por defecto de operaciones (pesos relativos) """
+
+_SYLLABLES = ["ma", "ri", "jo", "se", "an", "lu", "pe", "ra", "to", "ca", "gu", "mi", "el", "na", "sa"]
+_PROFESSIONALS = ["Dra. Ramírez", "Dr. Gómez", "Dra. Pérez", "Dr. Castillo"]
+
+
+@dataclass
+class LoadReport:
+    """
+    Resultado de una prueba de carga.
+    """
+
+    seconds: float = 0
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Counter = field(default_factory=Counter)
+
+    @property
+    def operations(self) -> int:
+        return sum(len(v) for v in self.latencies.values())
+
+    def merge(self, other: "LoadReport"):
+        for op, values in other.latencies.items():
+            self.latencies[op].extend(values)
+        self.errors.update(other.errors)
+
+    def summary(self) -> str:
+        lines = [
+            f"duración: {self.seconds:.1f}s  operaciones: {self.operations}  "
+            f"throughput: {self.operations / self.seconds if self.seconds else 0:.1f} op/s",
+            f"{'operación':<10}{'n':>8}{'op/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+        ]
+        for op in sorted(self.latencies):
+            values = sorted(self.latencies[op])
+            lines.append(
+                f"{op:<10}{len(values):>8}{len(values) / self.seconds if self.seconds else 0:>10.1f}"
+                f"{percentile(values, 50) * 1000:>10.2f}{percentile(values, 95) * 1000:>10.2f}"
+                f"{percentile(values, 99) * 1000:>10.2f}"
+            )
+        if self.errors:
+            lines.append("errores:")
+            for key, count in self.errors.most_common():
+                lines.append(f"  {count:>6}  {key}")
+        return "\n".join(lines)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def _classify(e: Exception) -> str:
+    message = str(e)
+    if "locked" in message or "busy" in message:
+        return "database is locked"
+    if isinstance(e, ValueError):
+        return "conflicto: " + message
+    return f"{type(e).__name__}: {message}"
+
+
+def _name(rnd: random.Random) -> str:
+    return " ".join(
+        "".join(rnd.choice(_SYLLABLES) for _ in range(rnd.randint(2, 4))).capitalize() for _ in range(3)
+    )
+
+
+def random_patient(rnd: random.Random) -> InformacionGeneralPaciente:
+    """Genera un paciente con datos verosímiles y listas de seguimiento y plan de manejo."""
+    birth = date(1940, 1, 1) + timedelta(days=rnd.randint(0, 365 * 80))
+    peso = round(rnd.uniform(45, 120), 1)
+    talla = round(rnd.uniform(1.45, 1.95), 2)
+    return InformacionGeneralPaciente(
+        nombre_completo=_name(rnd),
+        fecha_nacimiento=birth,
+        edad=(date.today() - birth).days // 365,
+        genero=rnd.choice(["Masculino", "Femenino"]),
+        cedula=f"{rnd.randint(1, 402):03d}-{rnd.randint(0, 9999999):07d}-{rnd.randint(0, 9)}",
+        telefono=f"809-{rnd.randint(0, 9999999):07d}",
+        estado_civil=rnd.choice(["Soltero", "Casado", "Divorciado", "Viudo", "Otro"]),
+        tension=f"{rnd.randint(100, 160)}/{rnd.randint(60, 100)}",
+        frecuenciac=float(rnd.randint(55, 110)),
+        frecuenciar=float(rnd.randint(12, 24)),
+        temp=round(rnd.uniform(36.0, 38.5), 1),
+        satur=float(rnd.randint(88, 100)),
+        peso=peso,
+        talla=talla,
+        imc=round(peso / (talla * talla), 1),
+        observaciones="Paciente en control. " * rnd.randint(0, 30),
+        pfnombre=rnd.choice(_PROFESSIONALS),
+        pfnumero_registro=f"R-{rnd.randint(1000, 9999)}",
+        pfespecialidad="Medicina Interna",
+        pffirma_digital="firma",
+        ls_sg=[
+            Seguimiento(date.today() + timedelta(days=30 * i), "Control de rutina")
+            for i in range(rnd.randint(0, 3))
+        ],
+        ls_pm=[PlanManejo("Hemograma", "Metformina 850mg", "Dieta", None) for _ in range(rnd.randint(0, 2))],
+    )
+
+
+def searcher_filter(rnd: random.Random, model=InformacionGeneralPaciente) -> Any:
+    """
+    Reproduce el filtro que arma FormSearcherDesigner: todos los campos de texto
+    buscables como '%valor%' (vacíos como '%%') y los numéricos solo si son > 0.
+    """
+    clone = model()
+    for f in fields(model):
+        if not f.metadata.get(SEARCHABLE):
+            continue
+        match f.metadata.get(CONTROL):
+            case InputWidgetType.INPUT_TEXT | InputWidgetType.COMBO:
+                setattr(clone, f.name, "%%")
+    clone.nombre_completo = f"%{rnd.choice(_SYLLABLES)}{rnd.choice(_SYLLABLES)}%"
+    if rnd.random() < 0.3:
+        clone.genero = rnd.choice(["Masculino", "Femenino"])
+    return clone
+
+
+class _Target:
+    """Ejecuta las operaciones contra un archivo local o contra un CrudServer."""
+
+    def __init__(self, database: Optional[str], server: Optional[tuple[str, int]], timeout: float):
+        self.conn: Optional[sqlite3.Connection] = None
+        self.client: Optional[CrudClient] = None
+        if server:
+            self.client = CrudClient(server[0], server[1])
+        else:
+            self.conn = sqlite3.connect(database or crud.DATABASE, timeout=timeout)
+
+    def write(self, action, *args):
+        if self.client:
+            return getattr(self.client, action)(*args)
+        try:
+            result = getattr(crud, action)(*args, conn=self.conn)
+            crud.flush(self.conn)  # type: ignore
+            self.conn.commit()  # type: ignore
+            return result
+        except Exception:
+            crud.discard(self.conn)  # type: ignore
+            self.conn.rollback()  # type: ignore
+            raise
+
+    def search(self, instance, callback, **kwargs):
+        if self.client:
+            return self.client.search(instance, callback, **kwargs)
+        return crud.search(instance, callback, conn=self.conn, **kwargs)
+
+    def close(self):
+        if self.client:
+            self.client.close()
+        if self.conn:
+            self.conn.close()
+
+
+def _worker(
+    seed: int,
+    duration: float,
+    workload: dict[str, int],
+    max_id: int,
+    database: Optional[str],
+    server: Optional[tuple[str, int]],
+    timeout: float,
+    page_size: int,
+) -> LoadReport:
+    rnd = random.Random(seed)
+    report = LoadReport()
+    target = _Target(database, server, timeout)
+    ops, weights = zip(*workload.items())
+    deadline = time.perf_counter() + duration
+    try:
+        while time.perf_counter() < deadline:
+            op = rnd.choices(ops, weights)[0]
+            start = time.perf_counter()
+            try:
+                match op:
+                    case "search":
+                        target.search(
+                            searcher_filter(rnd),
+                            lambda row: None,
+                            comparator="Like",
+                            ignore_primary_int=True,
+                            limit_end=page_size,
+                        )
+                    case "detail":
+                        target.search(InformacionGeneralPaciente(id=rnd.randint(1, max_id)), lambda row: None)
+                    case "insert":
+                        target.write("insert", random_patient(rnd))
+                    case "update":
+                        found = []
+                        target.search(InformacionGeneralPaciente(id=rnd.randint(1, max_id)), found.append)
+                        if found:
+                            new = copy.deepcopy(found[0])
+                            new.observaciones = (new.observaciones or "") + " Actualizado."
+                            new.ls_sg = new.ls_sg + [Seguimiento(date.today(), "Nueva cita")]
+                            target.write("update", found[0], new)
+                    case _:
+                        raise ValueError(f"Operación desconocida: {op}")
+                report.latencies[op].append(time.perf_counter() - start)
+            except Exception as e:
+                report.errors[f"{op}: {_classify(e)}"] += 1
+    finally:
+        target.close()
+    return report
+
+
+def seed_database(rows: int, database: Optional[str] = None, seed: int = 0, batch_size: int = 5000):
+    """Carga `rows` pacientes aleatorios en la base de datos local en transacciones grandes."""
+    rnd = random.Random(seed)
+    conn = crud.connect(database)
+    conn.execute(crud.create_table_sql(InformacionGeneralPaciente))
+    sql = crud.to_insert_query(InformacionGeneralPaciente())[0]
+    for start in range(0, rows, batch_size):
+        conn.executemany(
+            sql,
+            (crud.to_insert_query(random_patient(rnd))[1] for _ in range(min(batch_size, rows - start))),
+        )
+        conn.commit()
+    conn.close()
+
+
+def run(
+    workers: int = 4,
+    duration: float = 10,
+    workload: Optional[dict[str, int]] = None,
+    database: Optional[str] = None,
+    server: Optional[tuple[str, int]] = None,
+    processes: bool = False,
+    timeout: float = 5,
+    page_size: int = 200,
+) -> LoadReport:
+    """
+    Simula `workers` clínicos trabajando a la vez durante `duration` segundos.
+
+    Args:
+        workers: Cantidad de usuarios simultáneos.
+        duration: Segundos de la prueba.
+        workload: Pesos de cada operación (search, detail, insert, update).
+        database: Archivo SQLite local (cada usuario abre su propia conexión, como
+            varias estaciones compartiendo el archivo).
+        server: (host, puerto) de un CrudServer; si se indica se ignora `database`.
+        processes: Usar procesos en lugar de hilos (evita que el GIL limite la prueba).
+        timeout: Segundos que sqlite3 espera un bloqueo antes de fallar con "database is locked".
+        page_size: Filas leídas por búsqueda, como la primera página de la tabla de resultados.
+
+    Returns:
+        LoadReport: Latencias por operación y errores agrupados por causa.
+    """
+    workload = workload or WORKLOAD
+    if server is None:
+        conn = crud.connect(database)
+        conn.execute(crud.create_table_sql(InformacionGeneralPaciente))
+        max_id = conn.execute('SELECT MAX("id") FROM "InformacionGeneralPaciente";').fetchone()[0] or 1
+        conn.close()
+    else:
+        probe = CrudClient(server[0], server[1])
+        ids: list[int] = []
+        # Solo la fila de mayor id (el índice de la clave primaria, sin recorrer la tabla)
+        last = query.Query(InformacionGeneralPaciente).select("id").order_by("-id").page(0, 1)
+        probe.query(last, lambda row: ids.append(row[0]))
+        probe.close()
+        max_id = max(ids, default=1)
+
+    args = [
+        (seed, duration, workload, max_id, database, server, timeout, page_size) for seed in range(workers)
+    ]
+    report = LoadReport()
+    start = time.perf_counter()
+    if processes:
+        with multiprocessing.Pool(workers) as pool:
+            for partial in pool.starmap(_worker, args):
+                report.merge(partial)
+    else:
+        partials: list[LoadReport] = []
+        threads = [threading.Thread(target=lambda a=a: partials.append(_worker(*a))) for a in args]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for partial in partials:
+            report.merge(partial)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prueba de carga con clínicos simultáneos.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--server", default=None, help="host:puerto de un CrudServer")
+    parser.add_argument("--processes", action="store_true")
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--seed-rows", type=int, default=0, help="pacientes a generar antes de la prueba")
+    parser.add_argument(
+        "--mix", default=None, help="pesos, por ejemplo search=50,detail=25,insert=15,update=10"
+    )
+    args = parser.parse_args()
+
+    if args.seed_rows:
+        seed_database(args.seed_rows, args.database)
+    server = None
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        server = (host or "127.0.0.1", int(port))
+    mix = None
+    if args.mix:
+        mix = {k: int(v) for k, v in (item.split("=") for item in args.mix.split(","))}
+    print(
+        run(args.workers, args.duration, mix, args.database, server, args.processes, args.timeout).summary()
+    )
@@ -4,8 +4,9 @@ from enum import auto
 from typing import Optional
 import sqlite3
 
+from database import derived
 from database.crud import create_table_sql
-from internal import Empty, InputWidgetType, SQLiteFieldConstraint, flags, flagsv2
+from internal import Derived, Empty, InputWidgetType, SQLiteFieldConstraint, flags, flagsv2
 import internal
 
 
@@ -28,6 +29,7 @@ class MedicalConsultation:
         sqlite=SQLiteFieldConstraint.NONE,
         tcontrol=InputWidgetType.INPUT_TEXT,
         title="Historial",
+        compress=True,
     )
 
     examen_fisico: Optional[str] = flags(
@@ -56,6 +58,7 @@ class MedicalConsultation:
         sqlite=SQLiteFieldConstraint.NONE,
         tcontrol=InputWidgetType.DATE_PICKER,
         title="Fecha",
+        sortindex=True,
     )
 
     seguimiento_observaciones: Optional[str] = flags(
@@ -65,6 +68,16 @@ class MedicalConsultation:
         title="Observaciones",
     )
 
+    fecha_consulta: Optional[date] = flags(
+        default=None,
+        sqlite=SQLiteFieldConstraint.NONE,
+        tcontrol=InputWidgetType.DATE_PICKER,
+        title="Fecha de Consulta",
+        searchable=True,
+        sortindex=True,
+        insert_default=date.today,
+    )
+
 
 @dataclass
 class Seguimiento:
@@ -153,6 +166,7 @@ class InformacionGeneralPaciente:
         required=True,
         title="Nombre Completo",
         searchable=True,
+        sortindex=True,
     )
 
     fecha_nacimiento: Optional[date] = flags(
@@ -168,10 +182,12 @@ class InformacionGeneralPaciente:
     edad: Optional[int] = flags(
         default=None,
         sqlite=SQLiteFieldConstraint.NONE,
-        required=True,
         tcontrol=InputWidgetType.INPUT_INT,
         title="Edad",
+        readonly=True,
         searchable=True,
+        derived=Derived(("fecha_nacimiento",), derived.age),
+        sortindex=True,
     )
 
     genero: Optional[str] = flags(
@@ -191,6 +207,7 @@ class InformacionGeneralPaciente:
         tcontrol=InputWidgetType.INPUT_TEXT,
         title="Cedula",
         searchable=True,
+        sortindex=True,
     )
 
     direccion: Optional[str] = flags(
@@ -324,6 +341,7 @@ class InformacionGeneralPaciente:
         sqlite=SQLiteFieldConstraint.NONE,
         tcontrol=InputWidgetType.INPUT_TEXT_RICH,
         showintable=False,
+        compress=True,
     )
 
     lb_efps: int = flags(
@@ -484,7 +502,9 @@ class InformacionGeneralPaciente:
         sqlite=SQLiteFieldConstraint.NONE,
         tcontrol=InputWidgetType.INPUT_FLOAT,
         title="IMC",
+        readonly=True,
         showintable=False,
+        derived=Derived(("peso", "talla"), derived.bmi),
     )
     observaciones: Optional[str] = flags(
         default=None,
@@ -492,6 +512,7 @@ class InformacionGeneralPaciente:
         tcontrol=InputWidgetType.INPUT_TEXT_RICH,
         title="Observaciones",
         showintable=False,
+        compress=True,
     )
 
     lb_pf: int = flags(
@@ -551,6 +572,7 @@ class InformacionGeneralPaciente:
         tcontrol=InputWidgetType.LIST,
         title=Empty,
         showintable=False,
+        compress=True,
     )
     lb_pm: int = flags(
         default=0,
@@ -567,4 +589,5 @@ class InformacionGeneralPaciente:
         tcontrol=InputWidgetType.LIST,
         title=Empty,
         showintable=False,
+        compress=True,
     )
@@ -0,0 +1,155 @@
+import sqlite3
+from typing import Any, Callable, Optional
+
+from database import crud
+from database.models import InformacionGeneralPaciente
+from database.text import phonetic_tokens
+
+TABLE = "ClaveFonetica"
+
+FIELD = "nombre_completo"
+""" Campo de InformacionGeneralPaciente del que se derivan las claves fonéticas """
+
+
+def is_indexed(dataclass_type: type) -> bool:
+    return dataclass_type is InformacionGeneralPaciente
+
+
+def create_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{TABLE}" ("clave" TEXT NOT NULL, "paciente" INTEGER NOT NULL, '
+        'PRIMARY KEY ("clave", "paciente")) WITHOUT ROWID;'
+    )
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{TABLE}_paciente" ON "{TABLE}" ("paciente");')
+
+
+def _store_keys(conn: sqlite3.Connection, patient_id: int, name) -> None:
+    conn.execute(f'DELETE FROM "{TABLE}" WHERE "paciente" = ?;', (patient_id,))
+    conn.executemany(
+        f'INSERT OR IGNORE INTO "{TABLE}" VALUES (?, ?);', [(key, patient_id) for key in phonetic_tokens(name)]
+    )
+
+
+def on_write(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    """Hook de crud: mantiene las claves fonéticas de cada paciente."""
+    instance = new if new is not None else old
+    if not isinstance(instance, InformacionGeneralPaciente) or not instance.id:
+        return
+    if action == "delete":
+        conn.execute(f'DELETE FROM "{TABLE}" WHERE "paciente" = ?;', (instance.id,))
+    elif action == "insert" or phonetic_tokens(getattr(old, FIELD)) != phonetic_tokens(getattr(new, FIELD)):
+        _store_keys(conn, instance.id, getattr(new, FIELD))
+
+
+def catch_up(conn: sqlite3.Connection) -> int:
+    """
+    Calcula las claves de los pacientes que no tienen ninguna, por ejemplo los escritos
+    mientras el módulo no estaba activo.
+    """
+    table = InformacionGeneralPaciente.__name__
+    rows = conn.execute(
+        f'SELECT "id", "{FIELD}" FROM "{table}" WHERE "id" NOT IN (SELECT "paciente" FROM "{TABLE}");'
+    ).fetchall()
+    conn.executemany(
+        f'INSERT OR IGNORE INTO "{TABLE}" VALUES (?, ?);',
+        [(key, patient_id) for patient_id, name in rows for key in phonetic_tokens(name)],
+    )
+    return len(rows)
+
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """Recalcula las claves de todos los pacientes (por ejemplo si cambian las reglas)."""
+    conn.execute(f'DELETE FROM "{TABLE}";')
+    catch_up(conn)
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Crea la tabla de claves, calcula las que falten y registra el hook en crud."""
+    conn = crud.connect(database)
+    try:
+        with conn:
+            create_table(conn)
+            catch_up(conn)
+    finally:
+        conn.close()
+    crud.register_write_hook(on_write)
+
+
+def disable() -> None:
+    crud.unregister_write_hook(on_write)
+
+
+def search(
+    text: str,
+    callback: Callable[[Any], None],
+    limit: Optional[int] = None,
+    database: Optional[str] = None,
+) -> None:
+    """
+    Búsqueda "suena como": llama a `callback` con los pacientes que tienen, en cualquier
+    orden, una palabra que suena como cada palabra de `text` ("Llesenia Giménez"
+    encuentra a "Yesenia Carolina Jiménez").
+
+    Explicación:
+    -----------------------------------------
+    - Cada palabra de `text` se convierte en su clave (text.phonetic_key).
+    - Se recorre la lista de pacientes de la clave menos frecuente y las demás se
+      comprueban con búsquedas por igualdad en la clave primaria ("clave", "paciente"):
+      el costo depende de la clave más rara, no del tamaño de la tabla.
+    - Los pacientes salen en orden de id (el de la clave primaria), sin ordenar aparte.
+    """
+    if database is None and crud._backend is not None:
+        return crud._backend.phonetic_search(text, callback, limit)
+    keys = sorted(set(phonetic_tokens(text)))
+    if not keys:
+        return
+    table = InformacionGeneralPaciente.__name__
+    conn = crud.connect(database)
+    try:
+        keys.sort(
+            key=lambda key: conn.execute(f'SELECT count(*) FROM "{TABLE}" WHERE "clave" = ?;', (key,)).fetchone()[0]
+        )
+        # CROSS JOIN fija el orden: primero la clave más rara
+        joins = "".join(
+            f' CROSS JOIN "{TABLE}" k{i} ON k{i}."clave" = ? AND k{i}."paciente" = k0."paciente"'
+            for i in range(1, len(keys))
+        )
+        query = (
+            f'SELECT {crud.select_columns(InformacionGeneralPaciente, "p")} FROM "{TABLE}" k0{joins} CROSS JOIN "{table}" p ON p."id" = k0."paciente" '
+            'WHERE k0."clave" = ?'
+        )
+        params: list = [*keys[1:], keys[0]]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        crud.execute_select(InformacionGeneralPaciente, query + ";", callback, params, conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Búsqueda "suena como" de pacientes por nombre.')
+    parser.add_argument("nombre")
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--rebuild", action="store_true", help="recalcula las claves fonéticas")
+    args = parser.parse_args()
+
+    conn = crud.connect(args.database)
+    with conn:
+        create_table(conn)
+        if args.rebuild:
+            rebuild(conn)
+        else:
+            catch_up(conn)
+    conn.close()
+    start = time.perf_counter()
+    patients: list = []
+    search(args.nombre, patients.append, args.limit, args.database)
+    elapsed = time.perf_counter() - start
+    for patient in patients:
+        print(f"#{patient.id} {patient.nombre_completo}")
+    print(f"{len(patients)} pacientes, {elapsed * 1000:.1f} ms")
@@ -0,0 +1,84 @@
+"""
+Protocolo del servidor compartido.
+
+Cada mensaje es un objeto JSON en UTF-8 precedido por su longitud en 4 bytes
+(big-endian). Las instancias viajan como filas (`crud.to_row`), es decir, listas de
+valores en el orden de los campos del modelo, sin los nombres de las columnas.
+U es el usuario que se registra en la auditoría (database.audit).
+
+Solicitudes:
+    {"op": "insert", "model": M, "row": [...], "user": U}
+    {"op": "update", "model": M, "old": [...], "new": [...], "user": U}
+    {"op": "delete", "model": M, "row": [...], "user": U}
+    {"op": "search", "model": M, "row": [...], "comparator": "=",
+     "ignore_primary_int": false, "limit_start": null, "limit_end": null,
+     "include_archive": false, "modes": null}   # modes: {campo: "prefix" | "contains" | "exact"}
+    {"op": "query", "model": M, "query": {...},
+     "include_archive": false}             # query: database.query.Query.to_dict()
+    {"op": "cohort_stats"}                 # ver database.analytics
+    {"op": "summary"}                      # ver database.summary
+    {"op": "duplicate_candidates", "row": [...], "threshold": T}
+    {"op": "find_duplicates", "threshold": T, "limit": null}   # ver database.dedup
+    {"op": "fuzzy_search", "text": T, "limit": K,
+     "min_similarity": S}                  # ver database.fuzzy
+    {"op": "phonetic_search", "text": T, "limit": null}   # ver database.phonetic
+    {"op": "cohort", "expression": [...], "offset": 0,
+     "limit": null}                        # ver database.cohort
+    {"op": "workload", "start": null, "end": null,
+     "by_month": true}                     # ver database.workload
+    {"op": "recent", "user": U}            # ver database.recent
+    {"op": "recent_open", "patient": P, "user": U}
+    {"op": "vital_series", "patient": P, "field": F, "start": null,
+     "end": null, "resolution": null}      # ver database.vitals
+    {"op": "ping"}
+
+Respuestas:
+    {"ok": true, "rows": [[...], ...]}     # search, query, phonetic_search
+    {"ok": true, "rows": [[...], ...], "result": [...]}   # fuzzy_search
+    {"ok": true, "rows": [[...], ...], "result": N}       # cohort (N = total de la cohorte)
+    {"ok": true, "result": ...}            # las demás operaciones
+    {"ok": false, "error": "...", "type": "ValueError"}
+"""
+
+import json
+import socket
+import struct
+from typing import Any, Optional
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+MAX_MESSAGE = 256 * 1024 * 1024
+""" Tamaño máximo aceptado para un mensaje """
+
+_HEADER = struct.Struct("!I")
+
+
+def send_message(sock: socket.socket, message: dict) -> None:
+    payload = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock: socket.socket) -> Optional[dict[str, Any]]:
+    """Lee un mensaje completo. Devuelve None si la conexión se cerró."""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_MESSAGE:
+        raise ValueError(f"Mensaje demasiado grande: {size} bytes")
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        return None
+    return json.loads(payload.decode("utf-8"))
@@ -0,0 +1,481 @@
+from dataclasses import dataclass, field, fields, replace
+import sqlite3
+from typing import Any, Callable, Optional
+
+from database import codec, crud
+from database.text import normalize_search
+from internal import COMPRESS, SQLITE_FLAGS, SQLiteFieldConstraint
+
+COMPARISONS = ("=", "!=", "<", "<=", ">", ">=")
+
+
+def eq(name: str, value: Any) -> list:
+    return ["=", name, value]
+
+
+def ne(name: str, value: Any) -> list:
+    return ["!=", name, value]
+
+
+def lt(name: str, value: Any) -> list:
+    return ["<", name, value]
+
+
+def le(name: str, value: Any) -> list:
+    return ["<=", name, value]
+
+
+def gt(name: str, value: Any) -> list:
+    return [">", name, value]
+
+
+def ge(name: str, value: Any) -> list:
+    return [">=", name, value]
+
+
+def between(name: str, low: Any, high: Any) -> list:
+    """Entre `low` y `high`, ambos incluidos."""
+    return ["between", name, low, high]
+
+
+def one_of(name: str, values: list) -> list:
+    """El campo es uno de `values` (IN)."""
+    return ["in", name, list(values)]
+
+
+def is_null(name: str) -> list:
+    return ["null", name]
+
+
+def not_null(name: str) -> list:
+    return ["notnull", name]
+
+
+def match(name: str, mode: str, text: str) -> list:
+    """Comparación de texto de crud (MATCH_PREFIX, MATCH_CONTAINS o MATCH_EXACT)."""
+    return ["match", name, mode, text]
+
+
+def all_of(*terms) -> list:
+    return ["and", *terms]
+
+
+def any_of(*terms) -> list:
+    return ["or", *terms]
+
+
+def negate(term) -> list:
+    return ["not", term]
+
+
+def primary_key(dataclass_type: type) -> list[str]:
+    return [
+        f.name for f in fields(dataclass_type) if SQLiteFieldConstraint.PRIMARY_KEY in f.metadata[SQLITE_FLAGS]
+    ]
+
+
+@dataclass(frozen=True)
+class Query:
+    """
+    Consulta SELECT sobre la tabla de un modelo, armada por partes y sin modificar la
+    original (cada método devuelve una consulta nueva):
+
+        Query(InformacionGeneralPaciente)
+            .filter(any_of(eq("genero", "Femenino"), is_null("genero")))
+            .filter(one_of("estado_civil", ["Casado", "Viudo"]))
+            .order_by("nombre_completo", "-fecha_nacimiento")
+            .page(0, 100)
+
+    Las condiciones son listas JSON (ver `eq`, `one_of`, `any_of`...), así que una
+    consulta viaja tal cual al servidor compartido (`to_dict`).
+
+    Explicación:
+    -----------------------------------------
+    - Cada condición compara la columna sin funciones alrededor y con parámetros, de
+      modo que SQLite puede usar el índice de la columna (un IN o un prefijo son rangos
+      del índice; un OR entre columnas con índice se resuelve como unión de búsquedas).
+    - Los campos de texto buscables se comparan (match, =, !=, IN, rangos) y ordenan
+      por su columna normalizada (`crud.shadow_columns`), que tiene índice y no
+      distingue mayúsculas ni tildes.
+    - El orden siempre termina con la clave primaria (o rowid), así que es estable: dos
+      ejecuciones devuelven las filas en el mismo orden y las páginas no se solapan.
+    """
+
+    model: type
+    where: list = field(default_factory=lambda: ["and"])
+    order: tuple[str, ...] = ()
+    """ Campos del orden; con "-" adelante, descendente """
+    columns: Optional[tuple[str, ...]] = None
+    """ Proyección: solo estos campos (las filas se entregan como tuplas) """
+    limit: Optional[int] = None
+    offset: Optional[int] = None
+    after: Optional[tuple] = None
+    """ Clave de la última fila leída (ver `seek`): la consulta empieza después de ella """
+
+    def filter(self, *terms) -> "Query":
+        """Agrega condiciones (se combinan con Y)."""
+        if self.where and self.where[0] == "and":
+            return replace(self, where=[*self.where, *terms])
+        return replace(self, where=["and", self.where, *terms])
+
+    def order_by(self, *names: str) -> "Query":
+        for name in names:
+            self._field(name.lstrip("-"))
+        return replace(self, order=tuple(names))
+
+    def select(self, *names: str) -> "Query":
+        for name in names:
+            self._field(name)
+        return replace(self, columns=tuple(names) or None)
+
+    def page(self, offset: Optional[int], limit: Optional[int]) -> "Query":
+        return replace(self, offset=offset, limit=limit)
+
+    def seek(self, last: Any) -> "Query":
+        """
+        Paginación por clave (keyset): la consulta devuelve las filas que siguen a `last`
+        (la última fila de la página anterior) en el orden de la consulta. A diferencia
+        de OFFSET, SQLite salta directo a esa posición del índice, así que la página mil
+        cuesta lo mismo que la primera. Requiere que el modelo tenga clave primaria.
+        """
+        keys = primary_key(self.model)
+        if not keys:
+            raise ValueError(f"{self.model.__name__} no tiene clave primaria para paginar por clave.")
+        names = [name.lstrip("-") for name in self.order]
+        names += [name for name in keys if name not in names]
+        return replace(self, after=tuple(crud.to_sqlite_param(getattr(last, name)) for name in names), offset=None)
+
+    # --- SQL ---------------------------------------------------------------------
+
+    def _field(self, name: str):
+        for f in fields(self.model):
+            if f.name == name:
+                return f
+        raise ValueError(f"{self.model.__name__} no tiene el campo {name!r}")
+
+    def _column(self, name: str, normalized: bool) -> str:
+        self._field(name)
+        shadows = {field_name: column for column, field_name in crud.shadow_columns(self.model)}
+        return shadows[name] if normalized and name in shadows else name
+
+    def _condition(self, term: list, normalized: bool, params: list) -> str:
+        op, *args = term
+        if op in ("and", "or"):
+            parts = [self._condition(t, normalized, params) for t in args]
+            if not parts:
+                return "1" if op == "and" else "0"
+            return "(" + f" {op.upper()} ".join(parts) + ")"
+        if op == "not":
+            return f"NOT {self._condition(args[0], normalized, params)}"
+        f = self._field(args[0])
+        if op == "null":
+            return f'"{f.name}" IS NULL'
+        if op == "notnull":
+            return f'"{f.name}" IS NOT NULL'
+        if op == "match":
+            mode, text = args[1], str(args[2])
+            column = self._column(f.name, normalized)
+            if column != f.name:
+                text = normalize_search(text)
+            if not text:
+                return "1"
+            clause, values = crud._match_filter(column, mode, text)
+            params.extend(values)
+            return f"({clause})"
+        # Con columna normalizada el valor también se normaliza: eq("nombre", "perez")
+        # encuentra "Pérez", como `match` y el orden
+        column = self._column(f.name, normalized)
+        param = crud._shadow_value if column != f.name else crud.to_sqlite_param
+        if op == "in":
+            values = [param(v) for v in args[1]]
+            if not values:
+                return "0"
+            params.extend(values)
+            return f'"{column}" IN ({", ".join("?" * len(values))})'
+        if op == "between":
+            params.extend([param(args[1]), param(args[2])])
+            return f'"{column}" BETWEEN ? AND ?'
+        if op in COMPARISONS:
+            value = param(args[1])
+            if op == "=" and f.metadata.get(COMPRESS) and isinstance(value, str):
+                # Se acepta el valor comprimido y el texto plano (ver database.codec)
+                params.extend([codec.encode(value), value])
+                return f'"{f.name}" IN (?, ?)'
+            params.append(value)
+            return f'"{column}" {op} ?'
+        raise ValueError(f"Operación de consulta desconocida: {op}")
+
+    def _order(self, normalized: bool, view: bool) -> list[str]:
+        terms = []
+        for name in self.order:
+            descending = name.startswith("-")
+            terms.append(f'"{self._column(name.lstrip("-"), normalized)}"{" DESC" if descending else ""}')
+        # El desempate va en el mismo sentido que el último campo: así el índice de ese
+        # campo (que termina en el rowid) sirve para todo el ORDER BY
+        direction = " DESC" if self.order and self.order[-1].startswith("-") else ""
+        tiebreaker = primary_key(self.model)
+        if not tiebreaker:
+            from database.archive import VIEW_ORDER  # Import local para evitar import circular
+
+            tiebreaker = list(VIEW_ORDER) if view else ["rowid"]
+        ordered = {name.lstrip("-") for name in self.order}
+        terms += [
+            (f'"{name}"' if name != "rowid" else name) + direction for name in tiebreaker if name not in ordered
+        ]
+        return terms
+
+    def _sort_keys(self, normalized: bool) -> list[tuple[str, bool, bool]]:
+        """(columna, descendente, normalizada) del ORDER BY completo, con el desempate."""
+        keys = []
+        for name in self.order:
+            column = self._column(name.lstrip("-"), normalized)
+            keys.append((column, name.startswith("-"), column != name.lstrip("-")))
+        descending = bool(self.order) and self.order[-1].startswith("-")
+        ordered = {name.lstrip("-") for name in self.order}
+        keys += [(name, descending, False) for name in primary_key(self.model) if name not in ordered]
+        return keys
+
+    def _seek_condition(self, normalized: bool, params: list) -> str:
+        keys = self._sort_keys(normalized)
+        values = [
+            normalize_search(value) if shadow and value is not None else value
+            for (_, _, shadow), value in zip(keys, self.after)
+        ]
+        directions = {descending for _, descending, _ in keys}
+        pk = set(primary_key(self.model))
+        if None not in values and (
+            directions == {False} or (directions == {True} and all(column in pk for column, _, _ in keys[1:]))
+        ):
+            # Comparación de filas: SQLite la resuelve como un rango del índice del orden.
+            # En orden descendente los NULL van al final y `NULL < x` nunca es verdadero:
+            # `to_sql` los agrega aparte (ver `_null_tail`); por eso el resto de la clave
+            # tiene que ser la clave primaria, que no admite NULL
+            params.extend(values)
+            columns = ", ".join(f'"{column}"' for column, _, _ in keys)
+            marks = ", ".join("?" * len(keys))
+            return f'({columns}) {"<" if directions == {True} else ">"} ({marks})'
+
+        # Orden mixto, valores NULL (que SQLite ordena primero en ASC y al final en DESC)
+        # o columnas descendentes que pueden ser NULL: se expande campo a campo
+        def after(i: int) -> str:
+            if i == len(keys):
+                return "0"
+            column, descending, _ = keys[i]
+            if values[i] is None:
+                rest = after(i + 1)
+                if descending:
+                    return f'("{column}" IS NULL AND {rest})'
+                return f'(("{column}" IS NULL AND {rest}) OR "{column}" IS NOT NULL)'
+            params.extend([values[i], values[i]])
+            rest = after(i + 1)
+            nulls = f' OR "{column}" IS NULL' if descending else ""
+            return f'("{column}" {"<" if descending else ">"} ? OR ("{column}" = ? AND {rest}){nulls})'
+
+        return after(0)
+
+    def _null_tail(self, normalized: bool) -> Optional[str]:
+        """
+        Columna cuyos NULL quedan fuera de la comparación de filas de `_seek_condition`:
+        la primera del orden cuando todo es descendente, la última clave no es NULL y la
+        columna admite NULL. Esas filas van después de todas las demás.
+        """
+        if self.after is None or not self.order or None in self.after:
+            return None
+        keys = self._sort_keys(normalized)
+        pk = set(primary_key(self.model))
+        if not all(descending for _, descending, _ in keys) or not all(column in pk for column, _, _ in keys[1:]):
+            return None
+        f = self._field(self.order[0].lstrip("-"))
+        if f.name in pk or SQLiteFieldConstraint.NOT_NULL in f.metadata[SQLITE_FLAGS]:
+            return None
+        return keys[0][0]
+
+    def to_sql(self, table_name: Optional[str] = None, view: bool = False) -> tuple[str, list]:
+        """
+        Devuelve (consulta, parámetros). Con `view=True` la tabla es la vista de
+        database.archive: sin columnas normalizadas y, en lugar del rowid, con el
+        archivo de origen y su rowid como desempate (`archive.VIEW_ORDER`).
+        """
+        params: list = []
+        normalized = not view
+        where = self._condition(self.where, normalized, params)
+        if self.columns:
+            columns = ", ".join(f'"{name}"' for name in self.columns)
+        else:
+            columns = crud.select_columns(self.model)
+        table = f'"{table_name or self.model.__name__}"'
+        tail = self._null_tail(normalized)
+        if self.after is not None and tail is not None:
+            # Orden descendente con NULL: las filas que siguen son las menores que la
+            # última (un rango del índice) y después las que tienen NULL. Se unen con
+            # UNION ALL y SQLite mezcla los dos recorridos ya ordenados (MERGE)
+            seek_params: list = []
+            seek = self._seek_condition(normalized, seek_params)
+            keys = self._sort_keys(normalized)
+            hidden = ", ".join(f'"{column}" AS "__orden{i}"' for i, (column, _, _) in enumerate(keys))
+            arms = [
+                f"SELECT {columns}, {hidden} FROM {table} WHERE "
+                + (condition if where == "1" else f"{where} AND {condition}")
+                for condition in (seek, f'"{tail}" IS NULL')
+            ]
+            condition_params = list(params)
+            params.extend(seek_params)
+            if where != "1":
+                params.extend(condition_params)
+            # El ORDER BY y el LIMIT van dentro de la unión para que SQLite mezcle; afuera
+            # se ordena de nuevo solo la página
+            order = ", ".join(f'"__orden{i}" DESC' for i in range(len(keys)))
+            params.extend([-1 if self.limit is None else self.limit, self.offset or 0])
+            return (
+                f"SELECT {columns} FROM ({arms[0]} UNION ALL {arms[1]} ORDER BY {order} LIMIT ? OFFSET ?) ORDER BY {order};",
+                params,
+            )
+        if self.after is not None:
+            seek = self._seek_condition(normalized, params)
+            where = seek if where == "1" else f"{where} AND {seek}"
+        query = f"SELECT {columns} FROM {table}"
+        if where != "1":
+            query += f" WHERE {where}"
+        order = self._order(normalized, view)
+        if order:
+            query += " ORDER BY " + ", ".join(order)
+        if self.limit is not None or self.offset:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([-1 if self.limit is None else self.limit, self.offset or 0])
+        return query + ";", params
+
+    def count_sql(self) -> tuple[str, list]:
+        params: list = []
+        where = self._condition(self.where, True, params)
+        return f'SELECT count(*) FROM "{self.model.__name__}" WHERE {where};', params
+
+    # --- transporte --------------------------------------------------------------
+
+    def to_dict(self) -> dict:
+        return {
+            "model": self.model.__name__,
+            "where": self.where,
+            "order": list(self.order),
+            "columns": list(self.columns) if self.columns else None,
+            "limit": self.limit,
+            "offset": self.offset,
+            "after": list(self.after) if self.after is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, model: type, data: dict) -> "Query":
+        query = cls(model, data.get("where") or ["and"])
+        query = query.order_by(*data.get("order") or ()).select(*data.get("columns") or ())
+        query = query.page(data.get("offset"), data.get("limit"))
+        after = data.get("after")
+        return replace(query, after=tuple(after)) if after is not None else query
+
+
+def _emit(query: Query, callback: Callable[[Any], None]) -> Callable[[tuple], None]:
+    if query.columns:
+        return lambda row: callback(tuple(codec.decode(value) for value in row))
+    return lambda row: callback(crud.from_row(query.model, row))
+
+
+def execute(
+    query: Query,
+    callback: Callable[[Any], None],
+    conn: Optional[sqlite3.Connection] = None,
+    include_archive: bool = False,
+    database: Optional[str] = None,
+) -> None:
+    """
+    Ejecuta la consulta y llama a `callback` con cada fila: una instancia del modelo o,
+    si la consulta tiene proyección (`select`), una tupla con esos campos.
+    Con `include_archive` también se leen los archivos históricos (ver database.archive).
+    """
+    if conn is None and database is None and crud._backend is not None:
+        return crud._backend.query(query, callback, include_archive)
+    if include_archive:
+        from database import archive  # Import local para evitar import circular
+
+        if archive.is_archivable(query.model):
+            return archive.execute(query, callback, database=database)
+    own = conn is None
+    conn = conn or crud.connect(database)
+    try:
+        emit = _emit(query, callback)
+        for row in conn.execute(*query.to_sql()):
+            emit(row)
+    finally:
+        if own:
+            conn.close()
+
+
+def fetch(query: Query, include_archive: bool = False, database: Optional[str] = None) -> list:
+    rows: list = []
+    execute(query, rows.append, include_archive=include_archive, database=database)
+    return rows
+
+
+def count(query: Query, database: Optional[str] = None) -> int:
+    """Filas que cumplen las condiciones (sin tener en cuenta la página)."""
+    conn = crud.connect(database)
+    try:
+        return conn.execute(*query.count_sql()).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def check_seek(query: Query, page_size: int, database: Optional[str] = None) -> bool:
+    """
+    Comprueba que recorrer `query` por páginas con `Query.seek` devuelve las mismas
+    filas, en el mismo orden, que una sola consulta con OFFSET (incluidas las que
+    tienen NULL en el campo del orden).
+    """
+    keys = primary_key(query.model)
+    expected = [tuple(getattr(row, name) for name in keys) for row in fetch(query.page(None, None), database=database)]
+    pages: list = []
+    page = fetch(query.page(None, page_size), database=database)
+    while page:
+        pages.extend(page)
+        page = fetch(query.page(None, page_size).seek(page[-1]), database=database)
+    return [tuple(getattr(row, name) for name in keys) for row in pages] == expected
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    from database import models
+
+    parser = argparse.ArgumentParser(description="Consulta estructurada sobre un modelo.")
+    parser.add_argument("modelo", help="por ejemplo InformacionGeneralPaciente")
+    parser.add_argument("--where", default='["and"]', help='por ejemplo \'["in", "genero", ["Femenino"]]\'')
+    parser.add_argument("--order", nargs="*", default=[], help='campos; "-campo" para descendente')
+    parser.add_argument("--fields", nargs="*", default=[])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--explain", action="store_true", help="muestra el plan de SQLite")
+    parser.add_argument(
+        "--check-seek", action="store_true", help="compara la paginación por clave con OFFSET (páginas de --limit filas)"
+    )
+    args = parser.parse_args()
+
+    model = getattr(models, args.modelo, None)
+    if model is None:
+        raise SystemExit(f"Modelo desconocido: {args.modelo}")
+    q = Query(model, json.loads(args.where)).order_by(*args.order).select(*args.fields).page(args.offset, args.limit)
+    if args.check_seek:
+        print("paginación por clave correcta" if check_seek(q.page(None, None), args.limit, args.database) else "ERROR: las páginas no coinciden con OFFSET")
+        raise SystemExit
+    sql, params = q.to_sql()
+    print(sql, params)
+    if args.explain:
+        conn = crud.connect(args.database)
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            print("   ", row[-1])
+        conn.close()
+    start = time.perf_counter()
+    rows = fetch(q, database=args.database)
+    elapsed = time.perf_counter() - start
+    for row in rows:
+        print(row if q.columns else crud.to_row(row))
+    print(f"{len(rows)} filas, {elapsed * 1000:.1f} ms")
@@ -0,0 +1,186 @@
+from contextlib import closing
+import copy
+from datetime import datetime
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+from database import audit, crud, query
+from database.models import InformacionGeneralPaciente
+
+TABLE = "PacienteReciente"
+
+MAX_RECENT = 10
+""" Pacientes recientes que se guardan por usuario """
+
+_cache: dict[int, InformacionGeneralPaciente] = {}
+""" Registros ya decodificados de los pacientes recientes """
+_order: Optional[list[int]] = None
+""" Ids de los pacientes recientes del usuario, el más reciente primero; None si no se leyó """
+_listeners: list[Callable[[], None]] = []
+_lock = threading.Lock()
+
+
+def create_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{TABLE}" ("usuario" TEXT NOT NULL, "paciente" INTEGER NOT NULL, '
+        '"abierto" TEXT NOT NULL, PRIMARY KEY ("usuario", "paciente")) WITHOUT ROWID;'
+    )
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{TABLE}_paciente" ON "{TABLE}" ("paciente");')
+
+
+def record(conn: sqlite3.Connection, user: str, patient_id: int) -> None:
+    """Registra que `user` abrió al paciente y conserva solo sus MAX_RECENT más recientes."""
+    conn.execute(
+        f'INSERT OR REPLACE INTO "{TABLE}" VALUES (?, ?, ?);',
+        (user, patient_id, datetime.now().isoformat(timespec="microseconds")),
+    )
+    conn.execute(
+        f'DELETE FROM "{TABLE}" WHERE "usuario" = ? AND "paciente" NOT IN '
+        f'(SELECT "paciente" FROM "{TABLE}" WHERE "usuario" = ? ORDER BY "abierto" DESC LIMIT ?);',
+        (user, user, MAX_RECENT),
+    )
+
+
+def ids(conn: sqlite3.Connection, user: str) -> list[int]:
+    return [
+        row[0]
+        for row in conn.execute(
+            f'SELECT "paciente" FROM "{TABLE}" WHERE "usuario" = ? ORDER BY "abierto" DESC LIMIT ?;',
+            (user, MAX_RECENT),
+        )
+    ]
+
+
+def on_write(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    """Hook de crud: un paciente eliminado sale de la lista de todos los usuarios."""
+    if action == "delete" and isinstance(old, InformacionGeneralPaciente):
+        conn.execute(f'DELETE FROM "{TABLE}" WHERE "paciente" = ?;', (old.id,))
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Crea la tabla de pacientes recientes y registra el hook en crud."""
+    conn = crud.connect(database)
+    try:
+        with conn:
+            create_table(conn)
+    finally:
+        conn.close()
+    crud.register_write_hook(on_write)
+
+
+def disable() -> None:
+    crud.unregister_write_hook(on_write)
+
+
+def add_listener(callback: Callable[[], None]) -> None:
+    """`callback` se llama cada vez que cambia la lista de recientes (p. ej. para redibujar un menú)."""
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def _changed() -> None:
+    for callback in _listeners:
+        callback()
+
+
+def _load(database: Optional[str]) -> list[int]:
+    if database is None and crud._backend is not None:
+        return crud._backend.recent()
+    conn = crud.connect(database)
+    try:
+        return ids(conn, audit.current_user())
+    finally:
+        conn.close()
+
+
+def _prune() -> None:
+    """Deja en memoria solo los registros de la lista de recientes."""
+    if _order is not None:
+        for patient_id in set(_cache) - set(_order):
+            del _cache[patient_id]
+
+
+def patients(database: Optional[str] = None) -> list[InformacionGeneralPaciente]:
+    """
+    Pacientes recientes del usuario, el más reciente primero. La lista y los registros
+    se leen de la base de datos solo la primera vez; después salen de la memoria.
+    """
+    global _order
+    with _lock:
+        if _order is None:
+            _order = _load(database)
+        missing = [patient_id for patient_id in _order if patient_id not in _cache]
+    if missing:
+        found: list = []
+        query.execute(
+            query.Query(InformacionGeneralPaciente).filter(query.one_of("id", missing)), found.append, database=database
+        )
+        with _lock:
+            for patient in found:
+                _cache[patient.id] = patient
+            # Los que ya no existen (eliminados por otro usuario) salen de la lista
+            _order = [patient_id for patient_id in _order if patient_id in _cache]
+            _prune()
+    with _lock:
+        return [copy.deepcopy(_cache[patient_id]) for patient_id in _order]
+
+
+def get(patient_id: int) -> Optional[InformacionGeneralPaciente]:
+    """
+    Copia del registro en memoria de un paciente reciente, o None si no está. Reabrir un
+    paciente no hace ninguna consulta: si otro usuario lo modificó mientras tanto, el
+    `crud.update` posterior lo detecta y falla sin sobrescribir sus cambios.
+    """
+    with _lock:
+        patient = _cache.get(patient_id)
+        return copy.deepcopy(patient) if patient is not None else None
+
+
+def opened(patient: Any, database: Optional[str] = None) -> None:
+    """Registra que el usuario abrió un paciente (los demás modelos se ignoran)."""
+    global _order
+    if not isinstance(patient, InformacionGeneralPaciente) or not patient.id:
+        return
+    if database is None and crud._backend is not None:
+        crud._backend.recent_open(patient.id)
+    else:
+        with closing(crud.connect(database)) as conn, conn:
+            record(conn, audit.current_user(), patient.id)
+    with _lock:
+        if _order is not None:
+            _order = ([patient.id] + [patient_id for patient_id in _order if patient_id != patient.id])[:MAX_RECENT]
+        _cache[patient.id] = copy.deepcopy(patient)
+        _prune()
+    _changed()
+
+
+def refresh(patient: Any) -> None:
+    """Reemplaza el registro en memoria de un paciente que el usuario acaba de guardar."""
+    if not isinstance(patient, InformacionGeneralPaciente):
+        return
+    with _lock:
+        if patient.id not in _cache:
+            return
+        _cache[patient.id] = copy.deepcopy(patient)
+    _changed()
+
+
+def forget(patient: Any) -> None:
+    """Quita de la lista en memoria a un paciente que el usuario acaba de eliminar."""
+    global _order
+    if not isinstance(patient, InformacionGeneralPaciente):
+        return
+    with _lock:
+        _cache.pop(patient.id, None)
+        if _order is not None:
+            _order = [patient_id for patient_id in _order if patient_id != patient.id]
+    _changed()
+
+
+def reset() -> None:
+    """Descarta la lista y los registros en memoria (p. ej. al cambiar de usuario o de base de datos)."""
+    global _order
+    with _lock:
+        _order = None
+        _cache.clear()
@@ -0,0 +1,362 @@
+from concurrent.futures import Future
+from dataclasses import is_dataclass
+from datetime import datetime
+import queue
+import socketserver
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+from database import analytics, archive, audit, codec, cohort, crud, dedup, fuzzy, models, phonetic, query, recent, summary, vitals, workload
+from database.protocol import DEFAULT_HOST, DEFAULT_PORT, recv_message, send_message
+
+MODELS = [models.MedicalConsultation, models.InformacionGeneralPaciente]
+""" Tablas que el servidor crea al iniciar """
+
+
+READ_ONLY_MODELS = {audit.AuditEntry.__name__: audit.AuditEntry}
+""" Modelos que los clientes pueden consultar pero no modificar """
+
+
+def resolve_model(name: str, write: bool = False) -> type:
+    """Busca un modelo por nombre en database.models (o en READ_ONLY_MODELS para lecturas)."""
+    model = getattr(models, str(name), None)
+    if model is None and not write:
+        model = READ_ONLY_MODELS.get(str(name))
+    if model is None or not is_dataclass(model):
+        raise ValueError(f"Modelo desconocido: {name}")
+    return model
+
+
+class _WriteBatcher:
+    """
+    Hilo único de escritura. Agrupa las escrituras que llegan al mismo tiempo desde
+    varios clientes en una sola transacción; cada operación va dentro de un SAVEPOINT,
+    de modo que si una falla se deshace solo esa y el resto del lote se confirma.
+    """
+
+    def __init__(self, database: str, max_batch: int = 256):
+        self._database = database
+        self._max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self.__loop, name="crud-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Encola una operación y espera a que su lote sea confirmado."""
+        future: Future = Future()
+        self._queue.put((operation, future))
+        return future.result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def __loop(self):
+        conn = sqlite3.connect(self._database, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 5000;")
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self._max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            results = []
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                for operation, future in batch:
+                    conn.execute("SAVEPOINT op;")
+                    try:
+                        result = operation(conn)
+                        # Lo acumulado por los hooks (auditoría, etc.) se escribe dentro del SAVEPOINT
+                        crud.flush(conn)
+                        results.append((future, result, None))
+                        conn.execute("RELEASE op;")
+                    except Exception as e:
+                        crud.discard(conn)
+                        conn.execute("ROLLBACK TO op;")
+                        conn.execute("RELEASE op;")
+                        results.append((future, None, e))
+                conn.execute("COMMIT;")
+            except Exception as e:
+                crud.discard(conn)
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK;")
+                results = [(future, None, e) for _, future in batch]
+            for future, result, exc in results:
+                if exc is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(exc)
+        conn.close()
+
+
+class _CrudRequestHandler(socketserver.BaseRequestHandler):
+    server: "CrudServer"
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            try:
+                response = self.server.dispatch(request)
+            except Exception as e:
+                response = {"ok": False, "error": str(e), "type": type(e).__name__}
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+class CrudServer(socketserver.ThreadingTCPServer):
+    """
+    Servidor local que es dueño de la base de datos y atiende las operaciones de
+    `database.crud` para varias estaciones de trabajo (ver database.protocol).
+
+    Explicación:
+    -----------------------------------------
+    - Las escrituras (insert, update, delete) pasan por un único hilo escritor que las
+      agrupa en transacciones (ver _WriteBatcher); así no hay errores "database is locked"
+      entre clientes y el costo del COMMIT se reparte entre todas las operaciones del lote.
+    - Las lecturas (search) se atienden con un grupo de conexiones de solo lectura.
+    - La base de datos usa journal_mode=WAL para que los lectores no esperen al escritor.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int] = (DEFAULT_HOST, DEFAULT_PORT),
+        database: Optional[str] = None,
+        readers: int = 4,
+        max_batch: int = 256,
+    ):
+        self.database = database or crud.DATABASE
+        setup = crud.connect(self.database)
+        setup.execute("PRAGMA journal_mode=WAL;")
+        for model in MODELS:
+            setup.execute(crud.create_table_sql(model))
+            crud.migrate_table(setup, model)
+        setup.commit()
+        setup.close()
+        audit.enable(self.database)
+        vitals.enable(self.database)
+        summary.enable(self.database)
+        dedup.enable(self.database)
+        fuzzy.enable(self.database)
+        phonetic.enable(self.database)
+        cohort.enable(self.database)
+        workload.enable(self.database)
+        recent.enable(self.database)
+
+        self._readers: queue.Queue = queue.Queue()
+        for _ in range(max(readers, 1)):
+            conn = sqlite3.connect(self.database, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON;")
+            self._readers.put(conn)
+        self._writer = _WriteBatcher(self.database, max_batch)
+        self._thread: Optional[threading.Thread] = None
+        super().__init__(address, _CrudRequestHandler)
+
+    def dispatch(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "result": "pong"}
+        if op == "cohort_stats":
+            return {"ok": True, "result": analytics.to_rows(analytics.cohort_stats(self.database))}
+        if op == "duplicate_candidates":
+            instance = crud.from_row(models.InformacionGeneralPaciente, request["row"])
+            pairs = dedup.candidates(instance, float(request["threshold"]), self.database)
+            return {"ok": True, "result": dedup.to_rows(pairs)}
+        if op == "find_duplicates":
+            pairs = dedup.find_duplicates(float(request["threshold"]), self.database, request.get("limit"))
+            return {"ok": True, "result": dedup.to_rows(pairs)}
+        if op == "fuzzy_search":
+            rows: list = []
+            scores = fuzzy.search(
+                str(request["text"]),
+                lambda patient: rows.append(crud.to_row(patient)),
+                int(request["limit"]),
+                float(request["min_similarity"]),
+                self.database,
+            )
+            return {"ok": True, "rows": rows, "result": scores}
+        if op == "phonetic_search":
+            rows = []
+            phonetic.search(
+                str(request["text"]),
+                lambda patient: rows.append(crud.to_row(patient)),
+                request.get("limit"),
+                self.database,
+            )
+            return {"ok": True, "rows": rows}
+        if op == "cohort":
+            rows = []
+            total = cohort.search(
+                request["expression"],
+                lambda patient: rows.append(crud.to_row(patient)),
+                int(request.get("offset") or 0),
+                request.get("limit"),
+                self.database,
+            )
+            return {"ok": True, "rows": rows, "result": total}
+        if op == "workload":
+            stats = workload.stats(
+                request.get("start"), request.get("end"), bool(request.get("by_month", True)), database=self.database
+            )
+            return {"ok": True, "result": workload.to_rows(stats)}
+        if op == "recent":
+            conn = self._readers.get()
+            try:
+                return {"ok": True, "result": recent.ids(conn, str(request.get("user")))}
+            finally:
+                self._readers.put(conn)
+        if op == "recent_open":
+            user, patient_id = str(request.get("user")), int(request["patient"])
+            return {"ok": True, "result": self._writer.submit(lambda conn: recent.record(conn, user, patient_id))}
+        if op == "summary":
+            return {"ok": True, "result": summary.counts(self.database)}
+        if op == "vital_series":
+            start, end = (
+                datetime.fromtimestamp(request[key]) if request.get(key) is not None else None
+                for key in ("start", "end")
+            )
+            times, values = vitals.series(
+                int(request["patient"]),
+                str(request["field"]),
+                start,
+                end,
+                request.get("resolution"),
+                self.database,
+            )
+            return {"ok": True, "result": [times.tolist(), values.tolist()]}
+        model = resolve_model(request.get("model"), write=op not in ("search", "query"))
+        user = request.get("user")
+
+        def write(action, *args):
+            def operation(conn):
+                with audit.acting_as(user):
+                    return getattr(crud, action)(*args, conn=conn)
+
+            return {"ok": True, "result": self._writer.submit(operation)}
+
+        match op:
+            case "insert":
+                return write("insert", crud.from_row(model, request["row"]))
+            case "update":
+                return write("update", crud.from_row(model, request["old"]), crud.from_row(model, request["new"]))
+            case "delete":
+                return write("delete", crud.from_row(model, request["row"]))
+            case "search":
+                return {"ok": True, "rows": self.__search(model, request)}
+            case "query":
+                return {"ok": True, "rows": self.__query(model, request)}
+            case _:
+                raise ValueError(f"Operación desconocida: {op}")
+
+    def __search(self, model: type, request: dict) -> list:
+        instance = crud.from_row(model, request["row"])
+        ignore_primary_int = bool(request.get("ignore_primary_int", False))
+        comparator = str(request.get("comparator", "="))
+        if request.get("include_archive") and archive.is_archivable(model):
+            rows: list = []
+            archive.search(
+                instance,
+                lambda item: rows.append(crud.to_row(item)),
+                comparator,
+                ignore_primary_int,
+                request.get("limit_start"),
+                request.get("limit_end"),
+                database=self.database,
+                modes=request.get("modes"),
+            )
+            return rows
+        query, params = crud.to_select_query(
+            instance,
+            ignore_primary_int=ignore_primary_int,
+            comparator=comparator,
+            limit_start=request.get("limit_start"),
+            limit_end=request.get("limit_end"),
+            modes=request.get("modes"),
+        )
+        conn = self._readers.get()
+        try:
+            # Las filas se envían tal como están en SQLite, pero sin comprimir
+            return [[codec.decode(v) for v in row] for row in conn.execute(query, params)]
+        finally:
+            self._readers.put(conn)
+
+    def __query(self, model: type, request: dict) -> list:
+        built = query.Query.from_dict(model, request["query"])
+        if request.get("include_archive") and archive.is_archivable(model):
+            rows: list = []
+            archive.execute(built, lambda item: rows.append(item), database=self.database)
+            return [list(row) if built.columns else crud.to_row(row) for row in rows]
+        conn = self._readers.get()
+        try:
+            return [[codec.decode(v) for v in row] for row in conn.execute(*built.to_sql())]
+        finally:
+            self._readers.put(conn)
+
+    def start(self) -> tuple[str, int]:
+        """Atiende conexiones en un hilo en segundo plano y devuelve la dirección real."""
+        self._thread = threading.Thread(target=self.serve_forever, name="crud-server", daemon=True)
+        self._thread.start()
+        return self.server_address[:2]
+
+    def server_close(self):
+        super().server_close()
+        self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database.backup import BackupScheduler
+
+    parser = argparse.ArgumentParser(description="Servidor compartido de la base de datos.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--backup-interval", type=float, default=3600, help="0 desactiva los respaldos")
+    args = parser.parse_args()
+
+    server = CrudServer((args.host, args.port), args.database, args.readers)
+    scheduler = None
+    if args.backup_interval > 0:
+        scheduler = BackupScheduler(interval=args.backup_interval, database=server.database)
+        scheduler.start()
+    print(f"Escuchando en {args.host}:{server.server_address[1]} ({server.database})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if scheduler:
+            scheduler.stop()
@@ -0,0 +1,149 @@
+from datetime import date
+import sqlite3
+from typing import Optional
+
+from database import analytics, crud
+from database.models import InformacionGeneralPaciente
+
+TABLE = "ResumenPacientes"
+
+NO_DATA = "Sin dato"
+
+DIMENSIONS: dict[str, str] = {
+    "genero": """COALESCE(NULLIF({row}."genero", ''), '{none}')""",
+    "estado_civil": """COALESCE(NULLIF({row}."estado_civil", ''), '{none}')""",
+    "pfnombre": """COALESCE(NULLIF({row}."pfnombre", ''), '{none}')""",
+    # Se resume el año de nacimiento (no cambia con el tiempo); las bandas de edad se calculan al leer
+    "anio_nacimiento": """CASE WHEN typeof({row}."fecha_nacimiento") = 'integer'
+        THEN CAST({row}."fecha_nacimiento" / 10000 AS TEXT) ELSE '{none}' END""",
+}
+""" Dimensiones del resumen y la expresión SQL que da el valor de una fila (`{row}`) """
+
+
+def _value(dimension: str, row: str) -> str:
+    return DIMENSIONS[dimension].format(row=row, none=NO_DATA)
+
+
+def _change(dimension: str, row: str, delta: int) -> str:
+    return (
+        f"""INSERT INTO "{TABLE}" VALUES ('{dimension}', {_value(dimension, row)}, {delta}) """
+        f'ON CONFLICT DO UPDATE SET "n" = "n" + ({delta});'
+    )
+
+
+def install(conn: sqlite3.Connection) -> bool:
+    """
+    Crea la tabla de resumen y los triggers que la mantienen al día.
+
+    Los triggers actualizan el conteo de cada dimensión en la misma transacción que el
+    INSERT, UPDATE o DELETE del paciente, sin importar quién escriba (crud, el servidor u
+    otro programa). Si la tabla no existía se llena una vez a partir de los pacientes
+    actuales.
+
+    Returns:
+        bool: True si se creó (y reconstruyó) el resumen.
+    """
+    table = InformacionGeneralPaciente.__name__
+    created = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (TABLE,)
+    ).fetchone()
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{TABLE}" ("dimension" TEXT NOT NULL, "valor" TEXT NOT NULL, '
+        '"n" INTEGER NOT NULL, PRIMARY KEY ("dimension", "valor")) WITHOUT ROWID;'
+    )
+    columns = ", ".join(f'"{name}"' for name in ("genero", "estado_civil", "pfnombre", "fecha_nacimiento"))
+    triggers = {
+        "insert": (f"AFTER INSERT ON \"{table}\"", [_change(d, "NEW", 1) for d in DIMENSIONS]),
+        "delete": (f"AFTER DELETE ON \"{table}\"", [_change(d, "OLD", -1) for d in DIMENSIONS]),
+        "update": (
+            f"AFTER UPDATE OF {columns} ON \"{table}\"",
+            [_change(d, "OLD", -1) for d in DIMENSIONS] + [_change(d, "NEW", 1) for d in DIMENSIONS],
+        ),
+    }
+    for action, (event, statements) in triggers.items():
+        conn.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "{TABLE}_{action}" {event} BEGIN {" ".join(statements)} END;'
+        )
+    if created:
+        rebuild(conn)
+    return created
+
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """Recalcula el resumen completo desde la tabla de pacientes (para reparar diferencias)."""
+    table = InformacionGeneralPaciente.__name__
+    conn.execute(f'DELETE FROM "{TABLE}";')
+    for dimension in DIMENSIONS:
+        value = _value(dimension, f'"{table}"')
+        conn.execute(
+            f"""INSERT INTO "{TABLE}" SELECT '{dimension}', {value}, count(*) FROM "{table}" GROUP BY 2;"""
+        )
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Instala el resumen en la base de datos (si no está instalado)."""
+    conn = crud.connect(database)
+    try:
+        with conn:
+            install(conn)
+    finally:
+        conn.close()
+
+
+def counts(database: Optional[str] = None) -> dict[str, dict[str, int]]:
+    """
+    Conteo de pacientes por valor de cada dimensión, leído solo de la tabla de resumen.
+    Con un servidor compartido (crud.use_backend) se lee del servidor.
+    """
+    if database is None and crud._backend is not None:
+        return crud._backend.summary()
+    result: dict[str, dict[str, int]] = {dimension: {} for dimension in DIMENSIONS}
+    conn = crud.connect(database)
+    try:
+        for dimension, value, n in conn.execute(
+            f'SELECT "dimension", "valor", "n" FROM "{TABLE}" WHERE "n" > 0 ORDER BY 1, 3 DESC;'
+        ):
+            result.setdefault(dimension, {})[value] = n
+    finally:
+        conn.close()
+    return result
+
+
+def age_bands(birth_years: dict[str, int], today: Optional[date] = None) -> dict[str, int]:
+    """
+    Agrupa el conteo por año de nacimiento en las bandas de edad de database.analytics.
+    La edad se toma como la que se cumple en el año en curso.
+    """
+    today = today or date.today()
+    labels = analytics.band_labels()
+    bands = {label: 0 for label in labels}
+    for year, n in birth_years.items():
+        if not year.isdigit():
+            bands[labels[-1]] += n
+            continue
+        age = today.year - int(year)
+        index = sum(1 for low in analytics.AGE_BANDS[1:] if age >= low) if age >= 0 else len(labels) - 1
+        bands[labels[index]] += n
+    return {label: n for label, n in bands.items() if n}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resumen de pacientes para el panel.")
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--rebuild", action="store_true", help="recalcula el resumen completo")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = crud.connect(args.database)
+        with conn:
+            if not install(conn):
+                rebuild(conn)
+        conn.close()
+    result = counts(args.database)
+    result["edad"] = age_bands(result.pop("anio_nacimiento", {}))
+    for dimension, values in result.items():
+        print(f"{dimension}:")
+        for value, n in values.items():
+            print(f"    {value}: {n}")
@@ -0,0 +1,93 @@
+import re
+import unicodedata
+
+_NOT_WORD = re.compile(r"[^0-9a-z]+")
+_NOT_ALNUM = re.compile(r"[^0-9A-Z]+")
+
+
+def strip_accents(value: str) -> str:
+    """Quita tildes y diéresis (á -> a, ü -> u, ñ -> n)."""
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_name(value) -> str:
+    """
+    Forma canónica de un nombre para comparar: minúsculas, sin tildes, sin signos y con
+    un solo espacio entre palabras. "  José  Pérez-Ruiz" -> "jose perez ruiz".
+    """
+    if value is None:
+        return ""
+    return _NOT_WORD.sub(" ", strip_accents(str(value)).lower()).strip()
+
+
+def name_tokens(value) -> list[str]:
+    return normalize_name(value).split()
+
+
+def normalize_cedula(value) -> str:
+    """
+    Forma canónica de una cédula: solo los dígitos, sin ceros a la izquierda, si los tiene
+    ("V-01.234.567" -> "1234567"); si no, letras y dígitos en mayúsculas.
+    """
+    if value is None:
+        return ""
+    compact = _NOT_ALNUM.sub("", strip_accents(str(value)).upper())
+    digits = "".join(c for c in compact if c.isdigit())
+    if not digits:
+        return compact
+    return digits.lstrip("0") or "0"
+
+
+_PHONETIC_RULES = [
+    # (patrón, reemplazo) en orden; el resultado usa mayúsculas para no volver a coincidir
+    (re.compile(r"^x(?=[aeiou])"), "J"),  # Ximena, Ximénez -> J
+    (re.compile(r"ch"), "C"),
+    (re.compile(r"ll"), "Y"),  # yeísmo: Llesenia = Yesenia
+    (re.compile(r"ph"), "F"),
+    (re.compile(r"qu(?=[ei])"), "K"),
+    (re.compile(r"gu(?=[ei])"), "G"),
+    (re.compile(r"g(?=[ei])"), "J"),  # Giménez = Jiménez
+    (re.compile(r"c(?=[ei])"), "S"),
+    (re.compile(r"[cqk]"), "K"),
+    (re.compile(r"[zs]"), "S"),  # seseo: González = Gonzales
+    (re.compile(r"[vw]"), "B"),
+    (re.compile(r"x"), "KS"),
+    (re.compile(r"y(?=[aeiou])"), "Y"),
+    (re.compile(r"[iy]"), "I"),
+    (re.compile(r"h"), ""),
+]
+_REPEATED = re.compile(r"(.)\1+")
+
+
+def phonetic_key(word) -> str:
+    """
+    Clave fonética de una palabra en español (pronunciación latinoamericana): las
+    grafías que suenan igual dan la misma clave.
+    "Jiménez", "Giménez" y "Ximénez" -> "JIMENES"; "Yesenia" y "Llesenia" -> "YESENIA".
+
+    Se conservan las vocales (en español se escriben como suenan) y, después de las
+    reglas, se unen las letras repetidas: "Anna" es "Ana" y "Guttierrez" es "Gutierrez".
+    La "ll" se lee antes como "y", así que "Mariella" no es "Mariela" ni "Gonzalles" es
+    "Gonzales".
+    """
+    key = normalize_name(word).replace(" ", "")
+    for pattern, replacement in _PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    return _REPEATED.sub(r"\1", key.upper())
+
+
+def phonetic_tokens(value) -> list[str]:
+    """Claves fonéticas de las palabras de un nombre, en orden."""
+    return [key for key in (phonetic_key(word) for word in name_tokens(value)) if key]
+
+
+def normalize_search(value) -> str:
+    """
+    Forma de un texto para buscar sin distinguir mayúsculas ni tildes: "  Pérez  MUÑOZ"
+    -> "perez munoz". A diferencia de `normalize_name` conserva los signos, de modo que
+    los comodines de LIKE ("%", "_") siguen funcionando.
+    """
+    if value is None:
+        return ""
+    return " ".join(strip_accents(str(value)).casefold().split())
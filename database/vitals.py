@@ -0,0 +1,246 @@
+from datetime import datetime, timedelta
+import re
+import sqlite3
+from typing import Any, Optional
+
+import numpy as np
+
+from database import crud
+from database.models import InformacionGeneralPaciente
+
+FIELDS = (
+    "tension_sistolica",
+    "tension_diastolica",
+    "frecuenciac",
+    "temp",
+    "satur",
+    "peso",
+    "imc",
+)
+""" Signos vitales con historial; la posición en la tupla es el código guardado en la tabla """
+
+WEEK = 0
+MONTH = 1
+RESOLUTIONS = {"raw": None, "week": WEEK, "month": MONTH}
+
+MAX_POINTS = 2000
+""" Con resolución automática, cantidad de lecturas a partir de la cual se usan los resúmenes """
+
+TABLE = "SignoVital"
+ROLLUP_TABLE = "SignoVitalResumen"
+
+_TENSION = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*/\s*(\d+(?:[.,]\d+)?)\s*$")
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """
+    Crea la tabla de lecturas y la de resúmenes.
+
+    Ambas son WITHOUT ROWID: las filas se guardan ordenadas por su clave primaria, de modo
+    que las lecturas de un paciente y un signo vital quedan contiguas y una consulta por
+    rango de fechas es una sola búsqueda en el árbol B, sin índices adicionales.
+    """
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{TABLE}" ('
+        '"paciente" INTEGER NOT NULL, "campo" INTEGER NOT NULL, "fecha" INTEGER NOT NULL, '
+        '"valor" REAL NOT NULL, PRIMARY KEY ("paciente", "campo", "fecha")) WITHOUT ROWID;'
+    )
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{ROLLUP_TABLE}" ('
+        '"paciente" INTEGER NOT NULL, "campo" INTEGER NOT NULL, "periodo" INTEGER NOT NULL, '
+        '"inicio" INTEGER NOT NULL, "n" INTEGER NOT NULL, "suma" REAL NOT NULL, '
+        '"minimo" REAL NOT NULL, "maximo" REAL NOT NULL, '
+        'PRIMARY KEY ("paciente", "campo", "periodo", "inicio")) WITHOUT ROWID;'
+    )
+
+
+def is_tracked(dataclass_type: type) -> bool:
+    return dataclass_type is InformacionGeneralPaciente
+
+
+def bucket_start(timestamp: int, period: int) -> int:
+    """Inicio (segundos Unix, hora local) de la semana (lunes) o del mes que contiene `timestamp`."""
+    moment = datetime.fromtimestamp(timestamp)
+    if period == WEEK:
+        start = datetime(moment.year, moment.month, moment.day) - timedelta(days=moment.weekday())
+    else:
+        start = datetime(moment.year, moment.month, 1)
+    return int(start.timestamp())
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+def values_from(instance: Any) -> dict[str, float]:
+    """Signos vitales registrados en un paciente; `tension` ("120/80") se separa en sistólica y diastólica."""
+    values: dict[str, float] = {}
+    match = _TENSION.match(str(getattr(instance, "tension", None) or ""))
+    if match:
+        values["tension_sistolica"] = float(match.group(1).replace(",", "."))
+        values["tension_diastolica"] = float(match.group(2).replace(",", "."))
+    for name in FIELDS[2:]:
+        value = _number(getattr(instance, name, None))
+        if value is not None:
+            values[name] = value
+    return values
+
+
+def record(
+    patient_id: int,
+    values: dict[str, float],
+    when: Optional[datetime] = None,
+    conn: Optional[sqlite3.Connection] = None,
+) -> int:
+    """
+    Registra una lectura de signos vitales y actualiza los resúmenes semanales y mensuales
+    en la misma transacción.
+
+    Returns:
+        int: Cantidad de valores registrados (una lectura repetida con la misma fecha se ignora).
+    """
+    own = conn is None
+    if own:
+        conn = crud.connect()
+    try:
+        timestamp = int((when or datetime.now()).timestamp())
+        rows = [
+            (patient_id, FIELDS.index(name), timestamp, float(value))
+            for name, value in values.items()
+            if name in FIELDS and value is not None
+        ]
+        inserted = []
+        for row in rows:
+            if conn.execute(
+                f'INSERT OR IGNORE INTO "{TABLE}" VALUES (?, ?, ?, ?);', row
+            ).rowcount:
+                inserted.append(row)
+        conn.executemany(
+            f'INSERT INTO "{ROLLUP_TABLE}" VALUES (?, ?, ?, ?, 1, ?, ?, ?) '
+            'ON CONFLICT DO UPDATE SET "n" = "n" + 1, "suma" = "suma" + excluded."suma", '
+            '"minimo" = min("minimo", excluded."minimo"), "maximo" = max("maximo", excluded."maximo");',
+            [
+                (patient, field, period, bucket_start(stamp, period), value, value, value)
+                for patient, field, stamp, value in inserted
+                for period in (WEEK, MONTH)
+            ],
+        )
+        if own:
+            conn.commit()
+        return len(inserted)
+    finally:
+        if own:
+            conn.close()
+
+
+def on_write(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    """Hook de crud: al guardar un paciente se registran los signos vitales que cambiaron."""
+    if not isinstance(new, InformacionGeneralPaciente) or not new.id:
+        return
+    values = values_from(new)
+    if action == "update" and old is not None:
+        previous = values_from(old)
+        values = {name: value for name, value in values.items() if previous.get(name) != value}
+    if values:
+        record(new.id, values, conn=conn)
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Crea las tablas (si no existen) y empieza a registrar los signos vitales guardados con crud."""
+    conn = crud.connect(database)
+    try:
+        with conn:
+            create_tables(conn)
+    finally:
+        conn.close()
+    crud.register_write_hook(on_write)
+
+
+def disable() -> None:
+    crud.unregister_write_hook(on_write)
+
+
+def series(
+    patient_id: int,
+    field: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Optional[str] = None,
+    database: Optional[str] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Serie de tiempo de un signo vital de un paciente, lista para graficar.
+
+    Args:
+        field: Uno de FIELDS.
+        start, end: Rango de fechas (incluidas); None = sin límite.
+        resolution: "raw", "week" o "month" (promedio por período). Con None se usan las
+            lecturas si son a lo sumo MAX_POINTS, y si no el resumen semanal o mensual.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Fechas (segundos Unix) y valores.
+    """
+    if field not in FIELDS:
+        raise ValueError(f"Signo vital desconocido: {field}")
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise ValueError(f"Resolución desconocida: {resolution}")
+    if database is None and crud._backend is not None:
+        return crud._backend.vital_series(
+            patient_id,
+            field,
+            int(start.timestamp()) if start else None,
+            int(end.timestamp()) if end else None,
+            resolution,
+        )
+    low = int(start.timestamp()) if start else -(2**62)
+    high = int(end.timestamp()) if end else 2**62
+    key = (patient_id, FIELDS.index(field))
+
+    conn = crud.connect(database)
+    try:
+        if resolution is None:
+            (count,) = conn.execute(
+                f'SELECT count(*) FROM "{TABLE}" WHERE "paciente" = ? AND "campo" = ? '
+                'AND "fecha" BETWEEN ? AND ?;',
+                (*key, low, high),
+            ).fetchone()
+            resolution = "raw"
+            if count > MAX_POINTS:
+                resolution = "week" if count <= MAX_POINTS * 7 else "month"
+        if resolution == "raw":
+            rows = conn.execute(
+                f'SELECT "fecha", "valor" FROM "{TABLE}" WHERE "paciente" = ? AND "campo" = ? '
+                'AND "fecha" BETWEEN ? AND ? ORDER BY "fecha";',
+                (*key, low, high),
+            ).fetchall()
+        else:
+            period = RESOLUTIONS[resolution]
+            rows = conn.execute(
+                f'SELECT "inicio", "suma" / "n" FROM "{ROLLUP_TABLE}" WHERE "paciente" = ? '
+                'AND "campo" = ? AND "periodo" = ? AND "inicio" BETWEEN ? AND ? ORDER BY "inicio";',
+                (*key, period, bucket_start(low, period) if start else low, high),
+            ).fetchall()
+    finally:
+        conn.close()
+    data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serie de tiempo de un signo vital.")
+    parser.add_argument("paciente", type=int)
+    parser.add_argument("campo", choices=FIELDS)
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS), default=None)
+    parser.add_argument("--database", default=None)
+    args = parser.parse_args()
+
+    times, values = series(args.paciente, args.campo, resolution=args.resolution, database=args.database)
+    for timestamp, value in zip(times, values):
+        print(datetime.fromtimestamp(timestamp).isoformat(sep=" "), round(float(value), 2))
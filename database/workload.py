@@ -0,0 +1,365 @@
+from dataclasses import asdict, dataclass
+from datetime import date
+import glob
+import math
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from database import crud
+from database.archive import ARCHIVE_DIRECTORY
+from database.models import InformacionGeneralPaciente
+
+TABLE = "CargaProfesional"
+
+PRECISION = 14
+""" Bits del hash que eligen el registro: 2**14 registros, error estándar de 0,8 % """
+
+REGISTERS = 1 << PRECISION
+
+RELATIVE_ERROR = 1.04 / math.sqrt(REGISTERS)
+""" Error estándar relativo de la estimación de HyperLogLog """
+
+CONFIDENCE = 2
+""" El margen que se informa es CONFIDENCE errores estándar (aprox. 95 %) """
+
+_pending: dict[int, list[tuple[str, str, int, int]]] = {}
+_lock = threading.Lock()
+
+
+@dataclass
+class WorkloadStat:
+    """
+    Pacientes distintos (aproximados) atendidos por un profesional en un período.
+    """
+
+    profesional: str
+    registro: str
+    periodo: Optional[int]
+    """ Mes AAAAMM; None si se sumaron todos los meses del rango """
+    pacientes: int
+    margen: int
+    """ Error máximo esperado de `pacientes` (± CONFIDENCE errores estándar) """
+
+
+def _hash(ids: np.ndarray) -> np.ndarray:
+    """Hash de 64 bits de los ids (splitmix64): el mismo en todos los procesos."""
+    z = ids.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _ranks(hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Registro (primeros PRECISION bits) y posición del primer 1 en el resto del hash."""
+    index = (hashes >> np.uint64(64 - PRECISION)).astype(np.int64)
+    rest = hashes << np.uint64(PRECISION)
+    zeros = np.zeros(len(hashes), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = (rest >> np.uint64(64 - shift)) == 0
+        zeros += np.where(empty, shift, 0)
+        rest = np.where(empty, rest << np.uint64(shift), rest)
+    zeros += (rest >> np.uint64(63)) == 0
+    return index, np.minimum(zeros + 1, 64 - PRECISION + 1).astype(np.uint8)
+
+
+class Sketch:
+    """
+    Bosquejo HyperLogLog de un conjunto de ids: REGISTERS bytes, sin importar cuántos
+    ids contenga. Dos bosquejos se combinan con el máximo de cada registro, así que la
+    unión de meses o de archivos distintos no cuenta dos veces al mismo paciente.
+    """
+
+    def __init__(self, registers: Optional[np.ndarray] = None):
+        self.registers = registers if registers is not None else np.zeros(REGISTERS, dtype=np.uint8)
+
+    def add(self, ids: Iterable[int]) -> bool:
+        """Agrega ids y devuelve si el bosquejo cambió."""
+        index, rank = _ranks(_hash(np.fromiter(ids, dtype=np.int64)))
+        changed = bool((self.registers[index] < rank).any())
+        if changed:
+            np.maximum.at(self.registers, index, rank)
+        return changed
+
+    def merge(self, other: "Sketch") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Con pocos ids es más exacto contar los registros vacíos (linear counting)
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Sketch":
+        return cls(np.frombuffer(zlib.decompress(data), dtype=np.uint8).copy())
+
+
+def margin(estimate: int) -> int:
+    return math.ceil(CONFIDENCE * RELATIVE_ERROR * estimate)
+
+
+def period_of(when: Optional[date] = None) -> int:
+    when = when or date.today()
+    return when.year * 100 + when.month
+
+
+def professional_key(registro, nombre) -> Optional[tuple[str, str]]:
+    """(registro, nombre) normalizados del profesional, o None si no hay ninguno."""
+    registro = str(registro or "").strip()
+    nombre = " ".join(str(nombre or "").split())
+    return (registro, nombre) if registro or nombre else None
+
+
+def create_table(conn: sqlite3.Connection, schema: Optional[str] = None) -> None:
+    prefix = f'"{schema}".' if schema else ""
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS {prefix}"{TABLE}" ("registro" TEXT NOT NULL, "profesional" TEXT NOT NULL, '
+        '"periodo" INTEGER NOT NULL, "bosquejo" BLOB NOT NULL, '
+        'PRIMARY KEY ("periodo", "registro", "profesional")) WITHOUT ROWID;'
+    )
+
+
+def _add(conn: sqlite3.Connection, entries: list[tuple[str, str, int, int]]) -> None:
+    groups: dict[tuple[str, str, int], list[int]] = {}
+    for registro, nombre, periodo, patient_id in entries:
+        groups.setdefault((registro, nombre, periodo), []).append(patient_id)
+    for (registro, nombre, periodo), ids in groups.items():
+        row = conn.execute(
+            f'SELECT "bosquejo" FROM "{TABLE}" WHERE "periodo" = ? AND "registro" = ? AND "profesional" = ?;',
+            (periodo, registro, nombre),
+        ).fetchone()
+        sketch = Sketch.from_bytes(row[0]) if row else Sketch()
+        if sketch.add(ids) or not row:
+            conn.execute(
+                f'INSERT OR REPLACE INTO "{TABLE}" VALUES (?, ?, ?, ?);',
+                (registro, nombre, periodo, sketch.to_bytes()),
+            )
+
+
+def on_write(conn: sqlite3.Connection, action: str, old: Any, new: Any) -> None:
+    """
+    Hook de crud: cada alta o modificación de un paciente cuenta como una atención de
+    su profesional en el mes en curso. Se acumula en memoria y se escribe en `flush`.
+    """
+    if action == "delete" or not isinstance(new, InformacionGeneralPaciente) or not new.id:
+        return
+    professional = professional_key(new.pfnumero_registro, new.pfnombre)
+    if professional is None:
+        return
+    with _lock:
+        _pending.setdefault(id(conn), []).append((*professional, period_of(), new.id))
+
+
+def flush(conn: sqlite3.Connection) -> None:
+    """Hook de crud: actualiza los bosquejos con las atenciones acumuladas."""
+    with _lock:
+        entries = _pending.pop(id(conn), None)
+    if entries:
+        _add(conn, entries)
+
+
+def discard(conn: sqlite3.Connection) -> None:
+    """Hook de crud: olvida las atenciones acumuladas de una transacción revertida."""
+    with _lock:
+        _pending.pop(id(conn), None)
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """
+    Reconstruye los bosquejos a partir del registro de auditoría (database.audit): cada
+    mes en que se creó o modificó un paciente cuenta para su profesional actual.
+    Devuelve la cantidad de atenciones (paciente, mes) procesadas.
+    """
+    conn.execute(f'DELETE FROM "{TABLE}";')
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'AuditEntry';").fetchone():
+        return 0
+    table = InformacionGeneralPaciente.__name__
+    rows = conn.execute(
+        'SELECT a."registro", a."mes", p."pfnumero_registro", p."pfnombre" FROM '
+        '(SELECT DISTINCT "registro", CAST(substr("fecha", 1, 4) || substr("fecha", 6, 2) AS INTEGER) AS "mes" '
+        "FROM \"AuditEntry\" WHERE \"tabla\" = ? AND \"accion\" IN ('insert', 'update')) a "
+        f'JOIN "{table}" p ON p."id" = a."registro";',
+        (table,),
+    ).fetchall()
+    entries = []
+    for patient_id, periodo, registro, nombre in rows:
+        professional = professional_key(registro, nombre)
+        if professional is not None:
+            entries.append((*professional, periodo, patient_id))
+    _add(conn, entries)
+    return len(entries)
+
+
+def enable(database: Optional[str] = None) -> None:
+    """Crea la tabla de bosquejos (reconstruyéndola desde la auditoría) y registra el hook en crud."""
+    conn = crud.connect(database)
+    try:
+        with conn:
+            created = not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (TABLE,)
+            ).fetchone()
+            create_table(conn)
+            if created:
+                rebuild(conn)
+    finally:
+        conn.close()
+    crud.register_write_hook(on_write, flush, discard)
+
+
+def disable() -> None:
+    crud.unregister_write_hook(on_write, flush, discard)
+
+
+def archive_path(year: int, directory: str = ARCHIVE_DIRECTORY) -> str:
+    return os.path.join(directory, f"{TABLE}_{year}.sqlite")
+
+
+def archive_files(directory: str = ARCHIVE_DIRECTORY) -> list[str]:
+    return sorted(glob.glob(os.path.join(directory, f"{TABLE}_*.sqlite")))
+
+
+def archive_before(
+    periodo: int, directory: str = ARCHIVE_DIRECTORY, database: Optional[str] = None
+) -> int:
+    """
+    Mueve los bosquejos de los meses anteriores a `periodo` (AAAAMM) a un archivo por
+    año, igual que database.archive con las consultas. `stats` los sigue combinando.
+    """
+    os.makedirs(directory, exist_ok=True)
+    conn = crud.connect(database)
+    conn.isolation_level = None
+    moved = 0
+    try:
+        years = [
+            row[0]
+            for row in conn.execute(
+                f'SELECT DISTINCT "periodo" / 100 FROM "{TABLE}" WHERE "periodo" < ? ORDER BY 1;', (periodo,)
+            )
+        ]
+        for year in years:
+            conn.execute("ATTACH DATABASE ? AS archive_year;", (archive_path(year, directory),))
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                try:
+                    create_table(conn, "archive_year")
+                    bounds = (year * 100, min(periodo, (year + 1) * 100))
+                    where = '"periodo" >= ? AND "periodo" < ?'
+                    # Si el archivo ya tenía el mes, se combinan los bosquejos
+                    for registro, nombre, month, data in conn.execute(
+                        f'SELECT * FROM main."{TABLE}" WHERE {where};', bounds
+                    ).fetchall():
+                        sketch = Sketch.from_bytes(data)
+                        row = conn.execute(
+                            f'SELECT "bosquejo" FROM archive_year."{TABLE}" '
+                            'WHERE "periodo" = ? AND "registro" = ? AND "profesional" = ?;',
+                            (month, registro, nombre),
+                        ).fetchone()
+                        if row:
+                            sketch.merge(Sketch.from_bytes(row[0]))
+                        conn.execute(
+                            f'INSERT OR REPLACE INTO archive_year."{TABLE}" VALUES (?, ?, ?, ?);',
+                            (registro, nombre, month, sketch.to_bytes()),
+                        )
+                        moved += 1
+                    conn.execute(f'DELETE FROM main."{TABLE}" WHERE {where};', bounds)
+                    conn.execute("COMMIT;")
+                except Exception:
+                    conn.execute("ROLLBACK;")
+                    raise
+            finally:
+                conn.execute("DETACH DATABASE archive_year;")
+    finally:
+        conn.close()
+    return moved
+
+
+def _read(conn: sqlite3.Connection, start: Optional[int], end: Optional[int]):
+    return conn.execute(
+        f'SELECT "registro", "profesional", "periodo", "bosquejo" FROM "{TABLE}" '
+        'WHERE "periodo" >= ? AND "periodo" <= ?;',
+        (start or 0, end or 999999),
+    )
+
+
+def stats(
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    by_month: bool = True,
+    directory: str = ARCHIVE_DIRECTORY,
+    database: Optional[str] = None,
+) -> list[WorkloadStat]:
+    """
+    Pacientes distintos por profesional entre los meses `start` y `end` (AAAAMM,
+    incluidos), por mes o, con `by_month=False`, en todo el rango. Combina los
+    bosquejos de la base activa y de los archivos históricos de `directory`.
+
+    Solo se leen los bosquejos (unos KB por profesional y mes), así que el tiempo no
+    depende de la cantidad de pacientes.
+    """
+    if database is None and crud._backend is not None:
+        return crud._backend.workload(start, end, by_month)
+    merged: dict[tuple[str, str, Optional[int]], Sketch] = {}
+    sources = [None, *archive_files(directory)]
+    for source in sources:
+        conn = crud.connect(database) if source is None else sqlite3.connect(source)
+        try:
+            if source is not None and not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (TABLE,)
+            ).fetchone():
+                continue
+            for registro, nombre, periodo, data in _read(conn, start, end):
+                key = (registro, nombre, periodo if by_month else None)
+                sketch = Sketch.from_bytes(data)
+                if key in merged:
+                    merged[key].merge(sketch)
+                else:
+                    merged[key] = sketch
+        finally:
+            conn.close()
+    result = []
+    for (registro, nombre, periodo), sketch in merged.items():
+        estimate = sketch.estimate()
+        result.append(WorkloadStat(nombre, registro, periodo, estimate, margin(estimate)))
+    result.sort(key=lambda stat: (-(stat.periodo or 0), -stat.pacientes, stat.profesional))
+    return result
+
+
+def to_rows(items: list[WorkloadStat]) -> list[dict]:
+    return [asdict(stat) for stat in items]
+
+
+def from_rows(rows: list[dict]) -> list[WorkloadStat]:
+    return [WorkloadStat(**row) for row in rows]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pacientes distintos por profesional y mes (aproximado).")
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--desde", type=int, default=None, help="mes AAAAMM")
+    parser.add_argument("--hasta", type=int, default=None, help="mes AAAAMM")
+    parser.add_argument("--total", action="store_true", help="combina todos los meses del rango")
+    parser.add_argument("--rebuild", action="store_true", help="reconstruye desde la auditoría")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = crud.connect(args.database)
+        with conn:
+            create_table(conn)
+            print(f"{rebuild(conn)} atenciones")
+        conn.close()
+    for stat in stats(args.desde, args.hasta, not args.total, database=args.database):
+        print(f"{stat.periodo or 'total'}  {stat.registro:>10}  {stat.profesional:<30} {stat.pacientes} ± {stat.margen}")
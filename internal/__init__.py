@@ -1,4 +1,4 @@
-from dataclasses import MISSING, Field, field
+from dataclasses import MISSING, Field, dataclass, field
 from enum import Enum, Flag, auto
 import sqlite3
 from typing import Callable, Optional, TypeAlias
@@ -62,6 +62,32 @@ Empty = ""
 LISTMODEL = "designer_model"
 """ Modelo de datos asociado al campo, se usa para campos tipo lista """
 
+COMPRESS = "sqlite_compress"
+""" Comprimir el valor de la columna al guardarlo si supera el umbral de tamaño """
+
+SORTINDEX = "sqlite_sortindex"
+""" Crear un índice para ordenar las tablas de resultados por este campo """
+
+INSERT_DEFAULT = "sqlite_insert_default"
+""" Función que da el valor del campo al insertar un registro que no lo tiene """
+
+DERIVED = "derived"
+""" Campo calculado a partir de otros campos (ver Derived) """
+
+
+@dataclass(frozen=True)
+class Derived:
+    """
+    Declara cómo se calcula un campo a partir de otros campos del mismo modelo.
+
+    `compute` recibe los valores de `sources` en ese orden, como números (las fechas como
+    AAAAMMDD) y debe funcionar igual con escalares y con arreglos NumPy, ya que se usa al
+    guardar un registro y también para recalcular la tabla completa por bloques.
+    """
+
+    sources: tuple[str, ...]
+    compute: Callable
+
 
 def flags(
     *,
@@ -74,7 +100,11 @@ def flags(
     required: bool = False,
     items: Optional[list] = None,
     searchable: bool = False,
-    showintable: bool = True
+    showintable: bool = True,
+    compress: bool = False,
+    derived: Optional[Derived] = None,
+    sortindex: bool = False,
+    insert_default: Optional[Callable] = None,
 ):
     """
     Crea un campo personalizado para modelos de datos, agregando metadatos útiles para integración con SQLite y widgets de entrada.
@@ -89,6 +119,10 @@ def flags(
         items (list, opcional): Lista de opciones para campos tipo selección. Por defecto es None.
         searchable (bool, opcional): Indica si el campo es buscable. Por defecto es False.
         showintable (bool, opcional): Indica si el campo se muestra en tablas. Por defecto es True.
+        compress (bool, opcional): Indica si el valor se guarda comprimido cuando es grande. Por defecto es False.
+        derived (Derived, opcional): Cómo se calcula el campo a partir de otros. Por defecto es None.
+        sortindex (bool, opcional): Indica si la columna lleva un índice para ordenar los resultados. Por defecto es False.
+        insert_default (callable, opcional): Valor que recibe el campo vacío al insertar (y en las filas existentes al migrar). Por defecto es None.
     Retorna:
         Un campo configurado con los metadatos especificados, listo para ser usado en modelos de datos.
     """
@@ -104,6 +138,10 @@ def flags(
             ITEMS: items or [],
             SEARCHABLE: searchable,
             SHOWINTABLE: showintable,
+            COMPRESS: compress,
+            DERIVED: derived,
+            SORTINDEX: sortindex,
+            INSERT_DEFAULT: insert_default,
         },
     )
 
@@ -119,7 +157,9 @@ def flagsv2(
     required: bool = False,
     items: Optional[list] = None,
     searchable: bool = False,
-    showintable: bool = True
+    showintable: bool = True,
+    compress: bool = False,
+    derived: Optional[Derived] = None,
 ):
     """
     Crea un campo personalizado para modelos de datos, agregando metadatos útiles para integración con SQLite y widgets de entrada.
@@ -133,6 +173,8 @@ def flagsv2(
         items (list, opcional): Lista de opciones para campos tipo selección. Por defecto es None.
         searchable (bool, opcional): Indica si el campo es buscable. Por defecto es False.
         showintable (bool, opcional): Indica si el campo se muestra en tablas. Por defecto es True.
+        compress (bool, opcional): Indica si el valor se guarda comprimido cuando es grande. Por defecto es False.
+        derived (Derived, opcional): Cómo se calcula el campo a partir de otros. Por defecto es None.
     Retorna:
         Un campo configurado con los metadatos especificados, listo para ser usado en modelos de datos.
     """
@@ -147,6 +189,8 @@ def flagsv2(
             ITEMS: items or [],
             SEARCHABLE: searchable,
             SHOWINTABLE: showintable,
+            COMPRESS: compress,
+            DERIVED: derived,
             LISTMODEL:model
         },
     )
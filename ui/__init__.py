@@ -1,6 +1,10 @@
+import argparse
 import dearpygui.dearpygui as dpg
 import os
-from database import crud
+import threading
+from database import audit, cohort, crud, dedup, fuzzy, phonetic, recent, summary, vitals, workload
+from database.backup import BackupScheduler
+from database.client import CrudClient
 from database.models import (
     InformacionGeneralPaciente,
     MedicalConsultation,
@@ -11,8 +15,10 @@ from ui import message
 from ui.designer import  SearcherFlag, regtexture
 from ui.designer.detail import FormDetailDesigner
 from ui.designer.searcher import FormSearcherDesigner
+from ui.reports import CohortBuilder, CohortReport, Dashboard, DuplicatesReport, WorkloadReport
 from ui.events_application import (
     DbBasicComand,
+    error,
     
 )
 
@@ -20,7 +26,7 @@ from ui.events_application import (
 class Application:
 
     def __callback_patient_insert(self, sender):
-        dlg = FormDetailDesigner(
+        dlg = FormDetailDesigner.acquire(
             InformacionGeneralPaciente(),
             "Insertar Paciente",
             save_callback=DbBasicComand.ui_insert,
@@ -51,8 +57,93 @@ class Application:
         )
         dlg.show()
 
+    def __callback_recent(self, sender, app_data, patient_id):
+        # El registro sale de la memoria de database.recent: no hay consulta
+        patient = recent.get(patient_id)
+        if patient is None:
+            return
+        FormDetailDesigner.acquire(
+            patient, "Actualizar Paciente", update_callback=DbBasicComand.ui_update
+        ).show()
+        recent.opened(patient)
+
+    def __refresh_recent(self):
+        """Vuelve a llenar el menú de pacientes recientes."""
+        dpg.delete_item(self._recent_menu, children_only=True)
+        patients = recent.patients()
+        for patient in patients:
+            dpg.add_menu_item(
+                label=f"{patient.nombre_completo} ({patient.cedula or 's/c'})",
+                callback=self.__callback_recent,
+                user_data=patient.id,
+                parent=self._recent_menu,
+            )
+        if not patients:
+            dpg.add_menu_item(label="(ninguno)", enabled=False, parent=self._recent_menu)
+
+    def __callback_dashboard(self, sender):
+        Dashboard().show()
+
+    def __callback_duplicates(self, sender):
+        DuplicatesReport().show()
+
+    def __callback_cohort_report(self, sender):
+        CohortReport().show()
+
+    def __callback_cohort_builder(self, sender):
+        CohortBuilder().show()
+
+    def __callback_workload(self, sender):
+        WorkloadReport().show()
+
+    def __backup_now(self):
+        try:
+            path = self._backup.run_once()
+            message.show(
+                "Respaldo",
+                f"Respaldo creado y verificado:\n{path}",
+                message.MessageBoxButtons.OK,
+                None,
+            )
+        except Exception as e:
+            error(e)
+
+    def __callback_backup_now(self, sender):
+        if self._backup is None:
+            message.show(
+                "Respaldo",
+                "Los respaldos se realizan en el servidor compartido.",
+                message.MessageBoxButtons.OK,
+                None,
+            )
+            return
+        # El respaldo avanza por pasos en otro hilo para no congelar la interfaz
+        threading.Thread(target=self.__backup_now, daemon=True).start()
+
 
     def __init__(self, cli_args: list[str]):
+        parser = argparse.ArgumentParser(prog="cronicahealth")
+        parser.add_argument(
+            "--server",
+            default=None,
+            help="host:puerto de un servidor compartido (python -m database.server)",
+        )
+        parser.add_argument(
+            "--usuario",
+            default=None,
+            help="nombre que se registra en la auditoría (por defecto el usuario del sistema)",
+        )
+        args, _ = parser.parse_known_args(cli_args)
+        if args.usuario:
+            audit.set_user(args.usuario)
+        self._backup = None
+        if args.server:
+            host, _, port = args.server.rpartition(":")
+            crud.use_backend(CrudClient(host or "127.0.0.1", int(port)))
+        else:
+            # Con servidor compartido los respaldos los hace el servidor
+            self._backup = BackupScheduler(interval=3600, keep=7)
+
         dpg.create_context()
 
         with dpg.font_registry():
@@ -75,6 +166,30 @@ class Application:
                 dpg.add_menu_item(
                     label="Consultar", callback=self.__callback_patient_consult
                 )
+            with dpg.menu(label="Recientes") as self._recent_menu:
+                pass
+            with dpg.menu(label="Reportes"):
+                dpg.add_menu_item(
+                    label="Panel de Pacientes", callback=self.__callback_dashboard
+                )
+                dpg.add_menu_item(
+                    label="Signos Vitales por Cohorte",
+                    callback=self.__callback_cohort_report,
+                )
+                dpg.add_menu_item(
+                    label="Constructor de Cohortes",
+                    callback=self.__callback_cohort_builder,
+                )
+                dpg.add_menu_item(
+                    label="Pacientes por Profesional", callback=self.__callback_workload
+                )
+                dpg.add_menu_item(
+                    label="Posibles Duplicados", callback=self.__callback_duplicates
+                )
+            with dpg.menu(label="Base de Datos"):
+                dpg.add_menu_item(
+                    label="Respaldar Ahora", callback=self.__callback_backup_now
+                )
 
 
 
@@ -149,6 +264,20 @@ class Application:
                 InformacionGeneralPaciente,
             ]
         )
+        if self._backup:
+            # Modo local: la auditoría se registra en esta máquina
+            audit.enable()
+            vitals.enable()
+            summary.enable()
+            dedup.enable()
+            fuzzy.enable()
+            phonetic.enable()
+            cohort.enable()
+            workload.enable()
+            recent.enable()
+            self._backup.start()
+        recent.add_listener(self.__refresh_recent)
+        self.__refresh_recent()
         with dpg.theme() as global_theme:
             with dpg.theme_component(dpg.mvAll):
                 """
@@ -264,4 +393,6 @@ class Application:
         dpg.show_viewport(maximized=True)
 
         dpg.start_dearpygui()
+        if self._backup:
+            self._backup.stop(timeout=5)
         dpg.destroy_context()
\ No newline at end of file
@@ -191,6 +191,14 @@ class DesignerBuilder:
             tbid,
         )
 
+    def set_list(self, id: Union[str, int], items: Optional[list]):
+        """Reemplaza las filas de una tabla de `add_input_list` (al reutilizar el formulario)."""
+        dpg.delete_item(id, children_only=True, slot=1)
+        self._ids_table_v2[id] = {}
+        self._current_model.pop(id, None)
+        for data in items or []:
+            self.__add_row(id, data)
+
     def __btn_callback(self, sender):
         
         dpg.disable_item(sender)
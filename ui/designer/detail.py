@@ -6,6 +6,8 @@ import dearpygui.dearpygui as dpg
 from internal.ext import align_items
 from ui import designer
 from ui.designer.builder import DesignerBuilder
+from ui.designer.trend import VitalsTrendPlot
+from database import vitals
 import ui.message as msgbox
 from internal import (
     CONTROL,
@@ -23,6 +25,15 @@ from internal import (
 )
 from ui.message import MessageBoxButtons
 
+MAX_POOLED = 4
+""" Ventanas de detalle ocultas que se conservan para reutilizar (ver `FormDetailDesigner.acquire`) """
+
+BLANK_DATE = {"year": 20, "month": 5, "month_day": 14}
+""" Valor inicial de dpg.add_date_picker cuando el campo no tiene fecha """
+
+_pool: dict[tuple, list["FormDetailDesigner"]] = {}
+""" Ventanas libres por (modelo, modo) """
+
 
 class FormDetailDesigner:
 
@@ -95,7 +106,7 @@ class FormDetailDesigner:
                     user_data(old_model, self.model)
 
             if self._closeonexec:
-                dpg.delete_item(self._window_id)
+                self.__close_window()
         except ValueError as e:
             msgbox.show("Error", str(e), MessageBoxButtons.OK, on_close=None)
             pass
@@ -109,8 +120,123 @@ class FormDetailDesigner:
     def _onclose(self, sender):
         if self.__close:
             self.__close()
+        if self._pool_key is not None:
+            self.__release()
         pass
 
+    @staticmethod
+    def _mode(model, save_callback, update_callback, delete_callback, closeonexec, is_readonly) -> tuple:
+        """Lo que determina los controles de la ventana: dos ventanas con el mismo modo son intercambiables."""
+        return (
+            type(model),
+            save_callback is not None,
+            update_callback is not None,
+            delete_callback is not None,
+            closeonexec,
+            is_readonly,
+            vitals.is_tracked(type(model)) and bool(getattr(model, "id", 0)),
+        )
+
+    @classmethod
+    def acquire(
+        cls,
+        model,
+        title: str,
+        save_callback: ActionDesigner = None,
+        update_callback: ActionDesigner = None,
+        delete_callback: ActionDesigner = None,
+        closeonexec=True,
+        is_readonly=False,
+        orig=None,
+    ) -> "FormDetailDesigner":
+        """
+        Igual que crear el formulario, pero reutiliza una ventana libre del mismo modelo y
+        modo si la hay: en lugar de construir de nuevo todos los controles solo se
+        cargan los valores de `model`. Al cerrarse, la ventana vuelve al grupo (hasta
+        MAX_POOLED ventanas; las demás se eliminan).
+        """
+        key = cls._mode(model, save_callback, update_callback, delete_callback, closeonexec, is_readonly)
+        free = _pool.get(key, [])
+        while free:
+            form = free.pop()
+            if dpg.does_item_exist(form._window_id):
+                form.bind(model, title, save_callback, update_callback, delete_callback, orig)
+                return form
+        form = cls(model, title, save_callback, update_callback, delete_callback, closeonexec, is_readonly, orig)
+        form._pool_key = key
+        return form
+
+    def bind(
+        self,
+        model,
+        title: str,
+        save_callback: ActionDesigner = None,
+        update_callback: ActionDesigner = None,
+        delete_callback: ActionDesigner = None,
+        orig=None,
+    ):
+        """Carga en los controles existentes los valores de otra instancia del mismo modelo."""
+        self.model = model
+        self._title = title
+        self._orig = orig
+        self.__close = None
+        self._save_callback = save_callback
+        self._update_callback = update_callback
+        self._delete_callback = delete_callback
+        self.missing_fields = Empty
+        dpg.configure_item(self._window_id, label=title)
+        for name, callback in (
+            ("save", save_callback),
+            ("update", update_callback),
+            ("delete", delete_callback),
+        ):
+            if name in self._buttons:
+                dpg.set_item_user_data(self._buttons[name], callback)
+        for f in fields(self.model):
+            if f.name in self.attrs:
+                self.__load_control(f)
+        if self._trend is not None:
+            self._trend.bind(self.model.id)
+
+    def __load_control(self, f):
+        """Pone en el control del campo el valor del modelo, con el mismo formato que `makecontrol`."""
+        readonly = True if self.__is_readonly else f.metadata[READONLY]
+        (_, id), _ = self.attrs[f.name]
+        value = getattr(self.model, f.name)
+        match f.metadata[CONTROL]:
+            case InputWidgetType.INPUT_INT:
+                dpg.set_value(id, str(value) if readonly else int(value or 0))
+            case InputWidgetType.INPUT_FLOAT:
+                dpg.set_value(id, str(value) if readonly else float(value or 0))
+            case InputWidgetType.INPUT_TEXT | InputWidgetType.INPUT_TEXT_RICH | InputWidgetType.COMBO:
+                dpg.set_value(id, value if value else "")
+            case InputWidgetType.LIST:
+                self.builder.set_list(id, value)
+            case InputWidgetType.DATE_PICKER:
+                if readonly:
+                    dpg.set_value(id, value if isinstance(value, str) else value.strftime("%d/%m/%Y") if value else "")
+                elif value:
+                    dpg.set_value(id, {"year": value.year - 1900, "month": value.month - 1, "month_day": value.day})
+                else:
+                    dpg.set_value(id, BLANK_DATE)
+            case InputWidgetType.MODEL:
+                dpg.set_item_user_data(id, (f.name, value))
+
+    def __release(self):
+        if self._pool_key is None or self in _pool.get(self._pool_key, []):
+            return
+        if sum(len(free) for free in _pool.values()) >= MAX_POOLED:
+            dpg.delete_item(self._window_id)
+            return
+        dpg.hide_item(self._window_id)
+        _pool.setdefault(self._pool_key, []).append(self)
+
+    def __close_window(self):
+        if self._pool_key is not None:
+            self.__release()
+        else:
+            dpg.delete_item(self._window_id)
+
     def __init__(
         self,
         model,
@@ -154,6 +280,10 @@ class FormDetailDesigner:
         self.attrs: dict[str, tuple[ControlID, InputWidgetType]] = {}
         self.attrs_required: list[str] = []
         self.missing_fields = Empty
+        self._pool_key: Optional[tuple] = None
+        """ Modo de la ventana si se obtuvo con `acquire`; al cerrarse vuelve al grupo """
+        self._buttons: dict[str, Union[int, str]] = {}
+        self._trend: Optional[VitalsTrendPlot] = None
         self.__create_ui()
 
     def mark_required(self, value, required) -> str:
@@ -229,6 +359,11 @@ class FormDetailDesigner:
                         for f in chunk:
                             self.makecontrol(just, f)
 
+            if vitals.is_tracked(self.model_type) and getattr(self.model, "id", 0):
+                with dpg.collapsing_header(label="Tendencias", default_open=False):
+                    self._trend = VitalsTrendPlot(self.model.id)
+                    self._trend.build()
+
             count_callbacks = sum(
                 cb is not None
                 for cb in [
@@ -242,19 +377,19 @@ class FormDetailDesigner:
 
                 with align_items(0, count_callbacks):  # Alinea los botones a la derecha
                     if self._save_callback:
-                        dpg.add_image_button(
+                        self._buttons["save"] = dpg.add_image_button(
                             texture_tag="ico_save",
                             callback=self.__btn_callback,
                             user_data=self._save_callback,
                         )
                     if self._update_callback:
-                        dpg.add_image_button(
+                        self._buttons["update"] = dpg.add_image_button(
                             texture_tag="ico_update",
                             callback=self.__btn_callback,
                             user_data=self._update_callback,
                         )
                     if self._delete_callback:
-                        dpg.add_image_button(
+                        self._buttons["delete"] = dpg.add_image_button(
                             texture_tag="ico_delete",
                             callback=self.__btn_callback,
                             user_data=self._delete_callback,
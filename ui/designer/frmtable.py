@@ -1,7 +1,9 @@
 from dataclasses import fields
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Iterable, Optional
 import dearpygui.dearpygui as dpg
 
+from database import query, recent
+
 from internal import (
     CONTROL,
     ITEMS,
@@ -15,6 +17,33 @@ from ui import designer
 from ui.designer import SearcherFlag
 from ui.designer.detail import FormDetailDesigner
 
+PAGE_SIZE = 200
+""" Filas que se leen por página al mostrar el resultado de una consulta """
+
+VISIBLE_ROWS = 12
+""" Filas que crea la tabla virtual; se reutilizan al desplazarse por el resultado """
+
+WHEEL_STEP = 3
+""" Filas que avanza la tabla virtual por cada paso de la rueda del ratón """
+
+_columns: dict[tuple[type, tuple[str, ...]], list] = {}
+
+
+def table_columns(model_type: type, designer_fields: list[str]) -> list:
+    """Campos que se muestran en la tabla de un modelo; se calculan una sola vez por modelo."""
+    key = (model_type, tuple(designer_fields))
+    if key not in _columns:
+        _columns[key] = [
+            f
+            for f in fields(model_type)
+            if all(name in f.metadata for name in designer_fields) and f.metadata[SHOWINTABLE]
+        ]
+    return _columns[key]
+
+
+def _label(value: Any) -> str:
+    return "" if value is None else str(value)
+
 
 class FormTableBase:
     def __init__(
@@ -24,7 +53,14 @@ class FormTableBase:
         args: tuple[SearcherFlag, ActionDesigner],
         custom_target: Optional[type] = None,
         custom_show: Optional[Callable] = None,
+        virtual: bool = False,
     ) -> None:
+        """
+        Con `virtual=True` la tabla crea solo VISIBLE_ROWS filas de controles y las
+        reutiliza al desplazarse: el resultado se guarda como tuplas de valores y cada
+        fila se dibuja cuando entra en la vista, de modo que la cantidad de controles no
+        depende del tamaño del resultado.
+        """
         self._title = title
         self._model = model
         self._custom_target = custom_target
@@ -40,53 +76,196 @@ class FormTableBase:
         ]
 
         self._current_model: Optional[object] = None
-        self._num_columns = sum(
-            1
-            for f in fields(self._model)
-            if all(key in f.metadata for key in self._designer_fields)
-            and f.metadata[SHOWINTABLE]
-        )
+        self._columns = table_columns(type(model), self._designer_fields)
+        self._num_columns = len(self._columns)
         self._on_selected: Callable = lambda: None
         self._ids_table: dict[int | str, list] = {}
+        self._selected_row: Optional[int | str] = None
+        """ Fila seleccionada de la tabla no virtual: al cambiar se desmarca solo esa """
+        self._virtual = virtual
+        self._model_type = type(model)
+        self._names = [f.name for f in fields(self._model_type)]
+        self._rows: list[tuple] = []
+        """ Valores de las filas cargadas (en el orden de los campos del modelo), en el orden de la tabla """
+        self._offset = 0
+        """ Primera fila visible de la tabla virtual """
+        self._selected: Optional[int] = None
+        """ Fila seleccionada de la tabla virtual """
+        self._slots: list[tuple[int | str, list]] = []
+        """ Filas de controles de la tabla virtual: (fila, selectables) """
+        self._view_id: Optional[int | str] = None
+        self._scroll_id: Optional[int | str] = None
+        self._status_id: Optional[int | str] = None
+        self._handlers_id: Optional[int | str] = None
+        self._column_indexes: list[int] = []
+        """ Posición en las tuplas de `_rows` de cada columna de la tabla """
+        self._query: Optional[query.Query] = None
+        """ Consulta que llena la tabla (ver `set_query`); None si las filas se agregan con `add_row` """
+        self._include_archive = False
+        self._more_id: Optional[int | str] = None
 
     def add_row(self, data: Any):
-        columns = [
-            f
-            for f in fields(self._model)
-            if all(key in f.metadata for key in self._designer_fields)
-            and f.metadata[SHOWINTABLE]
-        ]
+        self.add_rows((data,))
 
-        with dpg.table_row(parent=self._table_id) as rowid:
-            self._ids_table[rowid] = []
-            for f in columns:
-                selectable = dpg.add_selectable(
-                    label=getattr(data, f.name),
-                    span_columns=True,
-                    callback=self.__row_clicked,
-                )
-                dpg.set_item_user_data(selectable, (rowid, data))
-                self._ids_table[rowid].append(selectable)
-        pass
+    def add_rows(self, rows: Iterable[Any]):
+        """Agrega varias filas de una vez: la tabla se actualiza una sola vez por lote."""
+        self.__append([tuple(getattr(data, name) for name in self._names) for data in rows])
+
+    def __append(self, values: list[tuple]):
+        start = len(self._rows)
+        self._rows.extend(values)
+        if self._virtual:
+            self.__update_scroll()
+            if start < self._offset + VISIBLE_ROWS:
+                self.__render()
+            return
+        # Un solo bloqueo del hilo de dibujo para todo el lote
+        with dpg.mutex():
+            for index in range(start, len(self._rows)):
+                row = self._rows[index]
+                with dpg.table_row(parent=self._table_id) as rowid:
+                    self._ids_table[rowid] = [
+                        dpg.add_selectable(
+                            label=_label(row[column]),
+                            span_columns=True,
+                            callback=self.__row_clicked,
+                            user_data=(rowid, index),
+                        )
+                        for column in self._column_indexes
+                    ]
 
     def clear_table(self):
         self._ids_table.clear()
-        children_to_delete = dpg.get_item_children(
-            self._table_id, 1
-        )  # 1 para la ranura "children"
-        if children_to_delete:
-            for child in children_to_delete:
-                dpg.delete_item(child)
+        self._selected_row = None
+        self._rows.clear()
+        self._query = None
+        if self._more_id is not None:
+            dpg.configure_item(self._more_id, show=False)
+        if self._virtual:
+            self._offset = 0
+            self._selected = None
+            self._current_model = None
+            self.__update_scroll()
+            self.__render()
+            return
+        # Todas las filas (ranura 1) en una sola llamada; las columnas (ranura 0) se conservan
+        dpg.delete_item(self._table_id, children_only=True, slot=1)
+
+    def set_query(self, source: query.Query, include_archive: bool = False):
+        """Llena la tabla con la primera página de `source`; el resto se lee a pedido."""
+        self.clear_table()
+        self._query = source
+        self._include_archive = include_archive
+        self.__load_page()
+
+    def __load_page(self):
+        """
+        Lee la página siguiente de la consulta. Si el modelo tiene clave primaria se
+        continúa desde la última fila (`Query.seek`), que usa el índice del orden en lugar
+        de saltar filas con OFFSET.
+        """
+        page = self._query.page(None, PAGE_SIZE)
+        if self._rows:
+            if query.primary_key(self._query.model):
+                page = page.seek(self.__record(len(self._rows) - 1))
+            else:
+                page = page.page(len(self._rows), PAGE_SIZE)
+        rows: list = []
+        query.execute(page, rows.append, include_archive=self._include_archive)
+        self.add_rows(rows)
+        if self._more_id is not None:
+            dpg.configure_item(self._more_id, show=len(rows) == PAGE_SIZE)
+
+    def __sort(self, sender, sort_specs):
+        """
+        Ordena por la columna elegida. Si la tabla muestra una consulta se vuelve a
+        consultar con ese ORDER BY (con índice si el campo está en `crud.sort_columns`);
+        si las filas se agregaron con `add_row` se reordenan en memoria.
+        """
+        if not sort_specs:
+            return
+        column, direction = sort_specs[0]
+        name = dpg.get_item_user_data(column)
+        if self._query is not None:
+            self.set_query(self._query.order_by(name if direction > 0 else f"-{name}"), self._include_archive)
+            return
+        index = self._names.index(name)
+        rows = sorted(self._rows, key=lambda row: (row[index] is not None, row[index]), reverse=direction < 0)
+        self.clear_table()
+        self.__append(rows)
+
+    def __record(self, index: int) -> Any:
+        """Instancia del modelo de una fila cargada."""
+        return self._model_type(*self._rows[index])
+
+    def __update_scroll(self):
+        if self._scroll_id is None:
+            return
+        top = max(len(self._rows) - VISIBLE_ROWS, 0)
+        self._offset = min(self._offset, top)
+        # El deslizador vertical tiene el mínimo abajo: se invierte para que 0 sea la primera fila
+        dpg.configure_item(self._scroll_id, max_value=top, show=top > 0)
+        dpg.set_value(self._scroll_id, top - self._offset)
+        self.__update_status()
+
+    def __render(self):
+        """Dibuja en las filas de controles las filas del resultado que están en la vista."""
+        for slot, (row_id, selectables) in enumerate(self._slots):
+            index = self._offset + slot
+            if index >= len(self._rows):
+                dpg.configure_item(row_id, show=False)
+                continue
+            values = self._rows[index]
+            for selectable, column in zip(selectables, self._column_indexes):
+                dpg.configure_item(selectable, label=_label(values[column]))
+                dpg.set_value(selectable, index == self._selected)
+            dpg.configure_item(row_id, show=True)
+        self.__update_status()
+
+    def __update_status(self):
+        if self._status_id is not None:
+            last = min(self._offset + VISIBLE_ROWS, len(self._rows))
+            dpg.set_value(self._status_id, f"{self._offset + 1 if last else 0}-{last} de {len(self._rows)}")
+
+    def __scrolled(self, sender, value):
+        self._offset = dpg.get_item_configuration(self._scroll_id)["max_value"] - value
+        self.__render()
+
+    def __wheel(self, sender, delta):
+        # Las tablas no informan si el ratón está encima; el grupo que las contiene sí
+        if not dpg.does_item_exist(self._view_id) or not dpg.get_item_state(self._view_id).get("hovered"):
+            return
+        top = max(len(self._rows) - VISIBLE_ROWS, 0)
+        offset = min(max(self._offset - int(delta) * WHEEL_STEP, 0), top)
+        if offset != self._offset:
+            self._offset = offset
+            dpg.set_value(self._scroll_id, top - offset)
+            self.__render()
+
+    def __slot_clicked(self, sender, value, slot):
+        """Selección en la tabla virtual: se guarda el índice de la fila, no el control."""
+        index = self._offset + slot
+        if index >= len(self._rows):
+            return
+        self._selected = index
+        self._current_model = self.__record(index)
+        self.__render()
+
+    def close_handlers(self):
+        """Elimina el manejador de la rueda del ratón de la tabla virtual."""
+        if self._handlers_id is not None and dpg.does_item_exist(self._handlers_id):
+            dpg.delete_item(self._handlers_id)
+        self._handlers_id = None
 
     def __row_clicked(self, sender, value, user_data):
         """Maneja el evento de selección de una fila en la tabla."""
         if value:
-            rowid, data = user_data
-            for rid, selectables in self._ids_table.items():
-                if rid != rowid:
-                    for selectable in selectables:
-                        dpg.set_value(selectable, False)
-            self._current_model = data
+            rowid, index = user_data
+            if self._selected_row is not None and self._selected_row != rowid:
+                for selectable in self._ids_table.get(self._selected_row, ()):
+                    dpg.set_value(selectable, False)
+            self._selected_row = rowid
+            self._current_model = self.__record(index)
 
     def __show_selection(self, sender):
         self._on_selected()
@@ -96,17 +275,17 @@ class FormTableBase:
             else:
                 match self._args[0]:
                     case SearcherFlag.UPDATE:
-                        FormDetailDesigner(
+                        FormDetailDesigner.acquire(
                             self._current_model,
                             title=self._title,
                             update_callback=self._args[1],
                         ).show()
                     case SearcherFlag.CONSULT:
-                        FormDetailDesigner(
+                        FormDetailDesigner.acquire(
                             self._current_model, title=self._title, is_readonly=True
                         ).show()
                     case SearcherFlag.DELETE:
-                        FormDetailDesigner(
+                        FormDetailDesigner.acquire(
                             self._current_model,
                             title=self._title,
                             delete_callback=self._args[1],
@@ -114,16 +293,32 @@ class FormTableBase:
                         ).show()
                     case SearcherFlag.INSERT:
                         if self._custom_target:
-                            FormDetailDesigner(
+                            FormDetailDesigner.acquire(
                                 self._custom_target(),
                                 title=self._title,
                                 save_callback=self._args[1],
                                 is_readonly=False,
                                 orig=self._current_model,
                             ).show()
+            if self._args[0] != SearcherFlag.DELETE:
+                recent.opened(self._current_model)
 
     def build(self):
         dpg.add_image_button("ico_info", callback=self.__show_selection)
+        with dpg.group(horizontal=True) as self._view_id:
+            self.__build_table()
+            if self._virtual:
+                self._scroll_id = dpg.add_slider_int(
+                    vertical=True, height=300, width=20, min_value=0, max_value=0, show=False, callback=self.__scrolled
+                )
+        if self._virtual:
+            self._status_id = dpg.add_text("")
+            with dpg.handler_registry() as self._handlers_id:
+                dpg.add_mouse_wheel_handler(callback=self.__wheel)
+            self.__render()
+        self._more_id = dpg.add_button(label="Más resultados", show=False, callback=lambda: self.__load_page())
+
+    def __build_table(self):
         with dpg.table(
             height=300,
             row_background=True,
@@ -133,15 +328,20 @@ class FormTableBase:
             borders_innerV=True,
             borders_outerV=True,
             clipper=True,
+            sortable=True,
+            sort_tristate=False,
+            callback=self.__sort,
         ) as self._table_id:
-            columns = [
-                f
-                for f in fields(self._model)
-                if all(key in f.metadata for key in self._designer_fields)
-                and f.metadata[SHOWINTABLE]
-            ]
-            for f in columns:
-                dpg.add_table_column(label=f.metadata[TITLE])
+            for f in self._columns:
+                dpg.add_table_column(label=f.metadata[TITLE], user_data=f.name)
+            self._column_indexes = [self._names.index(f.name) for f in self._columns]
+            for slot in range(VISIBLE_ROWS if self._virtual else 0):
+                with dpg.table_row(show=False) as row_id:
+                    selectables = [
+                        dpg.add_selectable(span_columns=True, user_data=slot, callback=self.__slot_clicked)
+                        for _ in self._columns
+                    ]
+                self._slots.append((row_id, selectables))
 
 
 class FormTableShow(FormTableBase):
@@ -150,6 +350,7 @@ class FormTableShow(FormTableBase):
         dpg.show_item(self._window_id)
 
     def close(self):
+        self.close_handlers()
         dpg.delete_item(self._window_id)
 
     def __init__(
@@ -159,8 +360,9 @@ class FormTableShow(FormTableBase):
         args: tuple[SearcherFlag, ActionDesigner],
         custom_target: Optional[type] = None,
         custom_show: Optional[Callable] = None,
+        virtual: bool = True,
     ) -> None:
-        super().__init__(title, model, args, custom_target, custom_show)
+        super().__init__(title, model, args, custom_target, custom_show, virtual)
         self._on_selected = self.close
         self._window_id: Union[int, str] = None  # type: ignore
         self.__create_ui()
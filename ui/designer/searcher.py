@@ -1,48 +1,78 @@
-import copy
 from dataclasses import fields, is_dataclass
 from datetime import date
 from typing import Callable, Optional, Union
 import dearpygui.dearpygui as dpg
 
-from database import crud
+from database import archive, crud, fuzzy, phonetic, query
 from internal import CONTROL, ITEMS, READONLY, SEARCHABLE, SHOWINTABLE, TITLE, ActionDesigner, ControlID, InputWidgetType
 from internal.ext import align_items
 from ui import designer
 from ui.designer import SearcherFlag
 from ui.designer.builder import DesignerBuilder
 from ui.designer.frmtable import FormTableShow
-class FormSearcherDesigner:
 
-    def __read_row(self, data):
-        self._table_show.add_row(data)
+MATCH_MODES = {
+    "Contiene": crud.MATCH_CONTAINS,
+    "Empieza con": crud.MATCH_PREFIX,
+    "Exacto": crud.MATCH_EXACT,
+}
+""" Modos de comparación de los campos de texto; "Empieza con" usa el índice """
+
+NAME_MODES = ["Aproximado (tolera errores)", "Suena como"]
+""" Modos adicionales del nombre del paciente (ver database.fuzzy y database.phonetic) """
+
+MAX_RESULTS = 1000
+""" Pacientes que se muestran como máximo en la búsqueda "suena como" """
+
+
+class FormSearcherDesigner:
 
     def __search(self):
-        clone = copy.deepcopy(self.model)
+        terms = []
         for key, (id, typ) in self.attrs.items():
             if typ == InputWidgetType.DATE_PICKER:
                 date_value = dpg.get_value(id[1])
                 if date_value:
-                    setattr(
-                        clone,
-                        key,
-                        date(
-                            year=date_value["year"] + 1900,
-                            month=date_value["month"] + 1,
-                            day=date_value["month_day"],
-                        ),
+                    terms.append(
+                        query.eq(
+                            key,
+                            date(
+                                year=date_value["year"] + 1900,
+                                month=date_value["month"] + 1,
+                                day=date_value["month_day"],
+                            ),
+                        )
                     )
+            elif key in self._modes:
+                value = dpg.get_value(id[1]).strip()
+                mode = dpg.get_value(self._modes[key])
+                if value and mode in NAME_MODES:
+                    # Solo se busca por el nombre; los demás filtros no se aplican
+                    self._table_show.clear_table()
+                    rows: list = []
+                    if mode == NAME_MODES[0]:
+                        fuzzy.search(value, rows.append)
+                    else:
+                        phonetic.search(value, rows.append, MAX_RESULTS)
+                    self._table_show.add_rows(rows)
+                    dpg.delete_item(self._window_id)
+                    self._table_show.show()
+                    return
+                if value:
+                    terms.append(query.match(key, MATCH_MODES.get(mode, crud.MATCH_CONTAINS), value))
             else:
                 value = dpg.get_value(id[1])
                 if isinstance(value, str):
-                    setattr(clone, key, f"%{value}%")
+                    if value:
+                        terms.append(query.match(key, crud.MATCH_CONTAINS, value))
                 elif isinstance(value, int) or isinstance(value, float):
                     if value > 0:
-                        setattr(clone, key, value)
-        query, params = crud.to_select_query(
-            clone, ignore_primary_int=True, comparator="Like"
+                        terms.append(query.eq(key, value))
+        include_archive = bool(self._include_archive and dpg.get_value(self._include_archive))
+        self._table_show.set_query(
+            query.Query(self.model_type).filter(*terms).order_by(*self._order),
+            include_archive=include_archive,
         )
-        self._table_show.clear_table()
-        crud.execute_select(self.model_type, query, self.__read_row, params)
         dpg.delete_item(self._window_id)
         self._table_show.show()
 
@@ -86,6 +116,13 @@ class FormSearcherDesigner:
         self.args = args
         self.attrs: dict[str, tuple[ControlID, InputWidgetType]] = {}
         self.model_type = type(model)
+        self._include_archive: Union[int, str, None] = None
+        self._modes: dict[str, Union[int, str]] = {}
+        """ Combo del modo de comparación de cada campo de texto """
+        self._order: tuple[str, ...] = tuple(
+            f.name for f in fields(self.model_type) if f.metadata.get(SHOWINTABLE)
+        )[:1]
+        """ Orden de los resultados: la primera columna de la tabla """
         self.builder = DesignerBuilder()
         self._table_show = FormTableShow(
             self._title, self.model, self.args, self._custom_target, self._custom_show
@@ -138,6 +175,15 @@ class FormSearcherDesigner:
                                     ),
                                     InputWidgetType.INPUT_TEXT,
                                 )
+                                items = list(MATCH_MODES)
+                                if fuzzy.is_indexed(self.model_type) and f.name == fuzzy.FIELD:
+                                    items += NAME_MODES
+                                self._modes[f.name] = dpg.add_combo(
+                                    items,
+                                    default_value=items[0],
+                                    width=200,
+                                    parent=dpg.get_item_parent(self.attrs[f.name][0][1]),
+                                )
                             case InputWidgetType.INPUT_FLOAT:
                                 self.attrs[f.name] = (
                                     self.builder.add_input_float(
@@ -169,6 +215,11 @@ class FormSearcherDesigner:
                             case _:
                                 pass
 
+                if archive.is_archivable(self.model_type):
+                    self._include_archive = dpg.add_checkbox(
+                        label="Incluir archivo histórico", default_value=False
+                    )
+
                 dpg.add_separator()
                 with align_items(0, 1):
                     dpg.add_image_button("ico_search", callback=self.__search)
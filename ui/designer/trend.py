@@ -0,0 +1,74 @@
+import dearpygui.dearpygui as dpg
+
+from database import vitals
+
+
+class VitalsTrendPlot:
+    """
+    Gráfica de tendencia de los signos vitales de un paciente (ver database.vitals).
+    Se agrega al contenedor actual. Con resolución "Automatica" se grafican las lecturas
+    o, si son demasiadas, los promedios semanales o mensuales ya calculados.
+    """
+
+    TITLES = {
+        "tension_sistolica": "Tension Sistolica",
+        "tension_diastolica": "Tension Diastolica",
+        "frecuenciac": "Frecuencia Cardiaca",
+        "temp": "Temperatura",
+        "satur": "Saturacion",
+        "peso": "Peso",
+        "imc": "IMC",
+    }
+
+    RESOLUTIONS = {
+        "Automatica": None,
+        "Lecturas": "raw",
+        "Semanal": "week",
+        "Mensual": "month",
+    }
+
+    def __init__(self, patient_id: int):
+        self._patient_id = patient_id
+        self._combo_id = None
+        self._resolution_id = None
+        self._x_axis = None
+        self._y_axis = None
+        self._series_id = None
+        self._count_id = None
+
+    def build(self, width: int = -1, height: int = 250):
+        names = {title: name for name, title in self.TITLES.items()}
+        with dpg.group(horizontal=True):
+            self._combo_id = dpg.add_combo(
+                items=list(names),
+                default_value=self.TITLES[vitals.FIELDS[0]],
+                width=200,
+                user_data=names,
+                callback=lambda: self.refresh(),
+            )
+            self._resolution_id = dpg.add_combo(
+                items=list(self.RESOLUTIONS),
+                default_value="Automatica",
+                width=120,
+                callback=lambda: self.refresh(),
+            )
+            self._count_id = dpg.add_text("")
+        with dpg.plot(width=width, height=height, no_title=True):
+            self._x_axis = dpg.add_plot_axis(dpg.mvXAxis, time=True)
+            self._y_axis = dpg.add_plot_axis(dpg.mvYAxis)
+            self._series_id = dpg.add_line_series([], [], parent=self._y_axis)
+        self.refresh()
+
+    def refresh(self):
+        field = dpg.get_item_user_data(self._combo_id)[dpg.get_value(self._combo_id)]
+        resolution = self.RESOLUTIONS[dpg.get_value(self._resolution_id)]
+        times, values = vitals.series(self._patient_id, field, resolution=resolution)
+        dpg.set_value(self._count_id, f"{len(times)} puntos")
+        dpg.set_value(self._series_id, [times.tolist(), values.tolist()])
+        dpg.fit_axis_data(self._x_axis)
+        dpg.fit_axis_data(self._y_axis)
+
+    def bind(self, patient_id: int):
+        """Muestra otro paciente en la misma gráfica (al reutilizar el formulario)."""
+        self._patient_id = patient_id
+        self.refresh()
@@ -1,5 +1,5 @@
 from typing import Any
-from database.crud import execute, execute_select, to_delete_sql, to_insert_sql, to_select_query, to_update_sql
+from database import crud, dedup, recent
 
 from database.models import  InformacionGeneralPaciente
 from internal import ActionDesigner
@@ -34,16 +34,50 @@ class DbBasicComand(object):
     @staticmethod
     def ui_insert(old, new):
         try:
-            execute(to_insert_sql(new))
+            if isinstance(new, InformacionGeneralPaciente):
+                pairs = dedup.candidates(new)
+                if pairs:
+                    DbBasicComand.__confirm_duplicate(new, pairs)
+                    return
+            crud.insert(new)
             godjob()
         except Exception as e:
             error(e)
         pass
 
+    @staticmethod
+    def __confirm_duplicate(new, pairs: list):
+        """Advierte antes de guardar un paciente que parece estar ya registrado."""
+        lines = "\n".join(
+            f" - #{pair.duplicado} {pair.nombres[1]} ({', '.join(pair.motivos) or 'similar'})"
+            for pair in pairs[:5]
+        )
+
+        def on_close(result):
+            if result == ui.message.DialogResult.YES:
+                try:
+                    crud.insert(new)
+                    godjob()
+                except Exception as e:
+                    error(e)
+            else:
+                # Se vuelve a abrir el formulario con los datos para corregirlos
+                FormDetailDesigner.acquire(
+                    new, "Insertar Paciente", save_callback=DbBasicComand.ui_insert
+                ).show()
+
+        ui.message.show(
+            "Posible Duplicado",
+            f"El paciente parece estar ya registrado:\n\n{lines}\n\n¿Guardar de todos modos?",
+            ui.message.MessageBoxButtons.YES_NO,
+            on_close,
+        )
+
     @staticmethod
     def ui_delete(old, new):
         try:
-            execute(to_delete_sql(new))
+            crud.delete(new)
+            recent.forget(new)
             godjob()
         except Exception as e:
             error(e)
@@ -52,7 +86,8 @@ class DbBasicComand(object):
     @staticmethod
     def ui_update(old, new):
         try:
-            execute(to_update_sql(old, new))
+            crud.update(old, new)
+            recent.refresh(new)
             godjob()
         except Exception as e:
             error(e)
@@ -0,0 +1,395 @@
+from dataclasses import fields
+import threading
+import dearpygui.dearpygui as dpg
+
+from database import analytics, cohort, dedup, summary, workload
+from database.models import InformacionGeneralPaciente
+from internal import ITEMS, TITLE
+from ui.designer import SearcherFlag
+from ui.designer.frmtable import FormTableShow
+from ui.events_application import error
+
+
+class CohortReport:
+    """
+    Ventana con las estadísticas de signos vitales por género y banda de edad
+    (ver database.analytics). El cálculo se hace en otro hilo para no congelar la interfaz.
+    """
+
+    COLUMNS = [
+        ("genero", "Genero"),
+        ("banda", "Edad"),
+        ("campo", "Signo"),
+        ("validos", "N"),
+        ("media", "Media"),
+        ("p25", "P25"),
+        ("p50", "P50"),
+        ("p75", "P75"),
+        ("p95", "P95"),
+        ("fuera_de_rango", "% Fuera de Rango"),
+    ]
+
+    def __init__(self, title: str = "Signos Vitales por Cohorte"):
+        self._title = title
+        self._window_id = None
+        self._table_id = None
+        self._status_id = None
+        self._field_id = None
+        self._stats: list[analytics.CohortStat] = []
+
+    def show(self):
+        with dpg.window(
+            label=self._title,
+            width=900,
+            height=500,
+            on_close=lambda: dpg.delete_item(self._window_id),
+        ) as self._window_id:
+            with dpg.group(horizontal=True):
+                dpg.add_text("Signo:")
+                self._field_id = dpg.add_combo(
+                    items=["Todos", *analytics.VITAL_FIELDS],
+                    default_value="Todos",
+                    width=150,
+                    callback=lambda: self.__fill_table(),
+                )
+                dpg.add_button(label="Actualizar", callback=lambda: self.refresh())
+                self._status_id = dpg.add_text("")
+            with dpg.table(
+                header_row=True,
+                resizable=True,
+                borders_innerH=True,
+                borders_outerH=True,
+                borders_innerV=True,
+                borders_outerV=True,
+                scrollY=True,
+                row_background=True,
+            ) as self._table_id:
+                for _, label in self.COLUMNS:
+                    dpg.add_table_column(label=label)
+        self.refresh()
+
+    def refresh(self):
+        dpg.set_value(self._status_id, "Calculando...")
+        threading.Thread(target=self.__compute, daemon=True).start()
+
+    def __compute(self):
+        try:
+            self._stats = analytics.cohort_stats()
+        except Exception as e:
+            dpg.set_value(self._status_id, "")
+            error(e)
+            return
+        patients = sum(
+            stat.pacientes for stat in self._stats if stat.campo == analytics.VITAL_FIELDS[0]
+        )
+        dpg.set_value(self._status_id, f"{patients} pacientes")
+        self.__fill_table()
+
+    def __fill_table(self):
+        for child in dpg.get_item_children(self._table_id, 1) or []:
+            dpg.delete_item(child)
+        selected = dpg.get_value(self._field_id)
+        for stat in self._stats:
+            if selected != "Todos" and stat.campo != selected:
+                continue
+            with dpg.table_row(parent=self._table_id):
+                for name, _ in self.COLUMNS:
+                    value = getattr(stat, name)
+                    if name == "fuera_de_rango" and value is not None:
+                        value = f"{value * 100:.1f}"
+                    dpg.add_text("" if value is None else str(value))
+
+
+class Dashboard:
+    """
+    Panel con el conteo de pacientes por género, estado civil, edad y profesional.
+    Lee solo la tabla de resumen (ver database.summary), por lo que abre de inmediato
+    sin importar el tamaño de la base de datos.
+    """
+
+    SECTIONS = [
+        ("genero", "Genero"),
+        ("estado_civil", "Estado Civil"),
+        ("edad", "Edad"),
+        ("pfnombre", "Profesional"),
+    ]
+
+    def __init__(self, title: str = "Panel de Pacientes"):
+        self._title = title
+        self._window_id = None
+        self._content_id = None
+
+    def show(self):
+        with dpg.window(
+            label=self._title,
+            width=600,
+            height=500,
+            on_close=lambda: dpg.delete_item(self._window_id),
+        ) as self._window_id:
+            dpg.add_button(label="Actualizar", callback=lambda: self.refresh())
+            self._content_id = dpg.add_group()
+        self.refresh()
+
+    def refresh(self):
+        try:
+            counts = summary.counts()
+        except Exception as e:
+            error(e)
+            return
+        counts["edad"] = summary.age_bands(counts.pop("anio_nacimiento", {}))
+        dpg.delete_item(self._content_id, children_only=True)
+        total = sum(counts.get("genero", {}).values())
+        dpg.add_text(f"Total de pacientes: {total}", parent=self._content_id)
+        for key, label in self.SECTIONS:
+            with dpg.collapsing_header(label=label, default_open=True, parent=self._content_id):
+                with dpg.table(header_row=False, borders_innerH=True, row_background=True):
+                    dpg.add_table_column()
+                    dpg.add_table_column()
+                    dpg.add_table_column()
+                    for value, n in counts.get(key, {}).items():
+                        with dpg.table_row():
+                            dpg.add_text(value)
+                            dpg.add_text(str(n))
+                            dpg.add_progress_bar(default_value=n / total if total else 0)
+
+
+class WorkloadReport:
+    """
+    Ventana con los pacientes distintos atendidos por cada profesional, por mes o en un
+    rango de meses. Los conteos son aproximados (HyperLogLog, ver database.workload) y
+    se muestran con su margen de error; abren de inmediato sin importar el tamaño del
+    historial.
+    """
+
+    COLUMNS = ["Mes", "Profesional", "Registro", "Pacientes (aprox.)", "Margen (±)"]
+    GROUPING = ["Por mes", "Total del rango"]
+
+    def __init__(self, title: str = "Pacientes por Profesional"):
+        self._title = title
+        self._window_id = None
+        self._table_id = None
+        self._status_id = None
+        self._grouping_id = None
+        self._start_id = None
+        self._end_id = None
+
+    def show(self):
+        with dpg.window(
+            label=self._title,
+            width=800,
+            height=500,
+            on_close=lambda: dpg.delete_item(self._window_id),
+        ) as self._window_id:
+            with dpg.group(horizontal=True):
+                self._grouping_id = dpg.add_combo(
+                    items=self.GROUPING, default_value=self.GROUPING[0], width=150, callback=lambda: self.refresh()
+                )
+                self._start_id = dpg.add_input_text(hint="desde AAAAMM", decimal=True, width=110)
+                self._end_id = dpg.add_input_text(hint="hasta AAAAMM", decimal=True, width=110)
+                dpg.add_button(label="Actualizar", callback=lambda: self.refresh())
+                self._status_id = dpg.add_text("")
+            with dpg.table(
+                header_row=True,
+                resizable=True,
+                borders_innerH=True,
+                borders_outerH=True,
+                borders_innerV=True,
+                borders_outerV=True,
+                scrollY=True,
+                row_background=True,
+            ) as self._table_id:
+                for label in self.COLUMNS:
+                    dpg.add_table_column(label=label)
+        self.refresh()
+
+    def refresh(self):
+        start, end = (dpg.get_value(item).strip() for item in (self._start_id, self._end_id))
+        try:
+            stats = workload.stats(
+                int(start) if start else None,
+                int(end) if end else None,
+                dpg.get_value(self._grouping_id) == self.GROUPING[0],
+            )
+        except Exception as e:
+            error(e)
+            return
+        for child in dpg.get_item_children(self._table_id, 1) or []:
+            dpg.delete_item(child)
+        for stat in stats:
+            with dpg.table_row(parent=self._table_id):
+                dpg.add_text("Rango" if stat.periodo is None else f"{stat.periodo // 100}-{stat.periodo % 100:02d}")
+                dpg.add_text(stat.profesional)
+                dpg.add_text(stat.registro)
+                dpg.add_text(str(stat.pacientes))
+                dpg.add_text(str(stat.margen))
+        dpg.set_value(
+            self._status_id,
+            f"Error estándar {workload.RELATIVE_ERROR * 100:.1f} %; margen de {workload.CONFIDENCE} errores estándar",
+        )
+
+
+class DuplicatesReport:
+    """
+    Ventana con los pares de pacientes que probablemente son la misma persona, del más
+    al menos probable (ver database.dedup), para revisarlos.
+    """
+
+    COLUMNS = ["Puntaje", "Paciente", "Nombre", "Posible Duplicado", "Nombre", "Motivos"]
+
+    def __init__(self, title: str = "Posibles Duplicados", limit: int = 500):
+        self._title = title
+        self._limit = limit
+        self._window_id = None
+        self._table_id = None
+        self._status_id = None
+
+    def show(self):
+        with dpg.window(
+            label=self._title,
+            width=900,
+            height=500,
+            on_close=lambda: dpg.delete_item(self._window_id),
+        ) as self._window_id:
+            with dpg.group(horizontal=True):
+                dpg.add_button(label="Actualizar", callback=lambda: self.refresh())
+                self._status_id = dpg.add_text("")
+            with dpg.table(
+                header_row=True,
+                resizable=True,
+                borders_innerH=True,
+                borders_outerH=True,
+                borders_innerV=True,
+                borders_outerV=True,
+                scrollY=True,
+                row_background=True,
+            ) as self._table_id:
+                for label in self.COLUMNS:
+                    dpg.add_table_column(label=label)
+        self.refresh()
+
+    def refresh(self):
+        dpg.set_value(self._status_id, "Buscando...")
+        threading.Thread(target=self.__compute, daemon=True).start()
+
+    def __compute(self):
+        try:
+            pairs = dedup.find_duplicates(limit=self._limit)
+        except Exception as e:
+            dpg.set_value(self._status_id, "")
+            error(e)
+            return
+        for child in dpg.get_item_children(self._table_id, 1) or []:
+            dpg.delete_item(child)
+        for pair in pairs:
+            with dpg.table_row(parent=self._table_id):
+                dpg.add_text(f"{pair.puntaje:.2f}")
+                dpg.add_text(str(pair.paciente))
+                dpg.add_text(pair.nombres[0])
+                dpg.add_text(str(pair.duplicado))
+                dpg.add_text(pair.nombres[1])
+                dpg.add_text(", ".join(pair.motivos))
+        dpg.set_value(self._status_id, f"{len(pairs)} pares")
+
+
+class CohortBuilder:
+    """
+    Ventana para armar una cohorte combinando criterios (género, estado civil, edad,
+    control programado el próximo mes) y ver cuántos pacientes la forman al instante.
+    Los valores marcados de un mismo campo se combinan con O y los campos con Y
+    (ver database.cohort).
+    """
+
+    PAGE_SIZE = 200
+
+    def __init__(self, title: str = "Constructor de Cohortes"):
+        self._title = title
+        self._window_id = None
+        self._status_id = None
+        self._checks: dict[str, dict[str, int]] = {}
+        self._age_low = None
+        self._age_high = None
+        self._next_month = None
+        self._exclude = None
+        self._offset = 0
+        self._table: FormTableShow = None  # type: ignore
+
+    def show(self):
+        with dpg.window(
+            label=self._title,
+            width=600,
+            height=420,
+            on_close=lambda: dpg.delete_item(self._window_id),
+        ) as self._window_id:
+            for f in fields(InformacionGeneralPaciente):
+                if f.name not in cohort.CATEGORICAL:
+                    continue
+                dpg.add_text(f.metadata.get(TITLE, f.name))
+                with dpg.group(horizontal=True):
+                    self._checks[f.name] = {
+                        item: dpg.add_checkbox(label=item, callback=lambda: self.refresh())
+                        for item in f.metadata.get(ITEMS, [])
+                    }
+            dpg.add_text("Edad")
+            with dpg.group(horizontal=True):
+                self._age_low = dpg.add_input_text(
+                    hint="desde", decimal=True, width=80, callback=lambda: self.refresh()
+                )
+                self._age_high = dpg.add_input_text(
+                    hint="hasta", decimal=True, width=80, callback=lambda: self.refresh()
+                )
+            self._next_month = dpg.add_checkbox(
+                label="Con control programado el próximo mes", callback=lambda: self.refresh()
+            )
+            self._exclude = dpg.add_checkbox(
+                label="Excluir (pacientes que NO cumplen los criterios)", callback=lambda: self.refresh()
+            )
+            with dpg.group(horizontal=True):
+                dpg.add_button(label="Ver pacientes", callback=lambda: self.__open_table(0))
+                dpg.add_button(label="<", callback=lambda: self.__open_table(self._offset - self.PAGE_SIZE))
+                dpg.add_button(label=">", callback=lambda: self.__open_table(self._offset + self.PAGE_SIZE))
+            self._status_id = dpg.add_text("")
+        self.refresh()
+
+    def expression(self) -> list:
+        terms = []
+        for name, checks in self._checks.items():
+            chosen = [cohort.eq(name, item) for item, check in checks.items() if dpg.get_value(check)]
+            if chosen:
+                terms.append(cohort.any_of(*chosen))
+        low, high = (dpg.get_value(item).strip() for item in (self._age_low, self._age_high))
+        if low or high:
+            terms.append(cohort.age(int(float(low)) if low else None, int(float(high)) if high else None))
+        if dpg.get_value(self._next_month):
+            terms.append(cohort.followup_next_month())
+        result = cohort.all_of(*terms)
+        return cohort.negate(result) if dpg.get_value(self._exclude) else result
+
+    def refresh(self):
+        dpg.set_value(self._status_id, "Contando...")
+        threading.Thread(target=self.__count, daemon=True).start()
+
+    def __count(self):
+        try:
+            total = cohort.count(self.expression())
+        except Exception as e:
+            dpg.set_value(self._status_id, "")
+            error(e)
+            return
+        dpg.set_value(self._status_id, f"{total} pacientes")
+
+    def __open_table(self, offset: int):
+        self._offset = max(offset, 0)
+        # La tabla se cierra con su propia ventana (FormTableShow.close la elimina)
+        if self._table is None or not dpg.does_item_exist(self._table._window_id):
+            self._table = FormTableShow(self._title, InformacionGeneralPaciente(), (SearcherFlag.CONSULT, None))
+        self._table.clear_table()
+        rows: list = []
+        try:
+            total = cohort.search(self.expression(), rows.append, self._offset, self.PAGE_SIZE)
+        except Exception as e:
+            error(e)
+            return
+        self._table.add_rows(rows)
+        end = min(self._offset + self.PAGE_SIZE, total)
+        dpg.set_value(self._status_id, f"{total} pacientes (mostrando {min(self._offset + 1, end)}-{end})")
+        self._table.show()